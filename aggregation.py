@@ -0,0 +1,344 @@
+#This file contains a streaming aggregator of the simulated tables
+#It keeps histograms of positions, points and goal differences so that memory does not grow with the number of trials
+
+import numpy as np
+
+#95% confidence intervals
+CONFIDENCE_Z = 1.96
+#last positions of the round of 16 and of the knockout play-off
+QUALIFICATION_POSITIONS = (8, 24)
+
+class TrialHistograms:
+    """
+    Running histograms of the final tables of the trials.
+
+    Attributes:
+        team_names (list): Team names, the index of a team in this list is its row in the team histograms
+        trials (int): Number of trials aggregated so far
+        position (numpy.ndarray): Counts of shape (teams, positions), position[team, p - 1] counts the trials
+            where the team finished at position p
+        team_points (numpy.ndarray): Counts of shape (teams, points), team_points[team, x] counts the trials
+            where the team finished with x points
+        position_points (numpy.ndarray): Counts of shape (positions, points) of the points of the team at each position
+        team_goal_difference (numpy.ndarray): Counts of shape (teams, goal differences), the first column
+            is the goal difference goal_difference_min
+        position_goal_difference (numpy.ndarray): Counts of shape (positions, goal differences)
+        goal_difference_min (int): Goal difference of the first column of the goal difference histograms
+    """
+    def __init__(self, team_names):
+        teams = len(team_names)
+        self.team_names = list(team_names)
+        self.trials = 0
+        self.position = np.zeros((teams, teams), dtype=np.int64)
+        self.team_points = np.zeros((teams, 1), dtype=np.int64)
+        self.position_points = np.zeros((teams, 1), dtype=np.int64)
+        self.team_goal_difference = np.zeros((teams, 1), dtype=np.int64)
+        self.position_goal_difference = np.zeros((teams, 1), dtype=np.int64)
+        self.goal_difference_min = 0
+
+    def update(self, batch):
+        """
+        Add a batch of trials to the histograms.
+
+        Args:
+            batch (dict): Arrays of shape (trials, teams) indexed by team with keys 'position', 'points' and
+                'goals_difference', as returned by simulation.simulate_batch
+        """
+        position = batch['position'] - 1
+        points = batch['points']
+        goal_difference = batch['goals_difference']
+        teams = position.shape[1]
+        team = np.broadcast_to(np.arange(teams), position.shape)
+
+        goal_difference_min = min(self.goal_difference_min, int(goal_difference.min()))
+        if goal_difference_min < self.goal_difference_min:
+            padding = ((0, 0), (self.goal_difference_min - goal_difference_min, 0))
+            self.team_goal_difference = np.pad(self.team_goal_difference, padding)
+            self.position_goal_difference = np.pad(self.position_goal_difference, padding)
+            self.goal_difference_min = goal_difference_min
+        goal_difference = goal_difference - self.goal_difference_min
+
+        self.position += _count(team, position, teams, teams)
+        self.team_points = _add(self.team_points, _count(team, points, teams))
+        self.position_points = _add(self.position_points, _count(position, points, teams))
+        self.team_goal_difference = _add(self.team_goal_difference, _count(team, goal_difference, teams))
+        self.position_goal_difference = _add(self.position_goal_difference, _count(position, goal_difference, teams))
+        self.trials += position.shape[0]
+
+    def merge(self, other):
+        """
+        Add the histograms of another aggregator of the same teams.
+
+        Args:
+            other (TrialHistograms): Aggregator to merge into this one
+        """
+        shift = other.goal_difference_min - self.goal_difference_min
+        if shift < 0:
+            padding = ((0, 0), (-shift, 0))
+            self.team_goal_difference = np.pad(self.team_goal_difference, padding)
+            self.position_goal_difference = np.pad(self.position_goal_difference, padding)
+            self.goal_difference_min = other.goal_difference_min
+            shift = 0
+        padding = ((0, 0), (shift, 0))
+        self.position += other.position
+        self.team_points = _add(self.team_points, other.team_points)
+        self.position_points = _add(self.position_points, other.position_points)
+        self.team_goal_difference = _add(self.team_goal_difference, np.pad(other.team_goal_difference, padding))
+        self.position_goal_difference = _add(self.position_goal_difference, np.pad(other.position_goal_difference, padding))
+        self.trials += other.trials
+
+    def save(self, path):
+        """
+        Save the histograms to a numpy .npz file.
+
+        Args:
+            path (str): Path of the file
+        """
+        with open(path, "wb") as file:
+            np.savez(file, **self.arrays())
+
+    def arrays(self):
+        """
+        Get the histograms as arrays, the format of save().
+
+        Returns:
+            dict: Array of each attribute
+        """
+        return {'team_names': np.array(self.team_names), 'trials': self.trials, 'position': self.position,
+                'team_points': self.team_points, 'position_points': self.position_points,
+                'team_goal_difference': self.team_goal_difference, 'position_goal_difference': self.position_goal_difference,
+                'goal_difference_min': self.goal_difference_min}
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load histograms saved with save().
+
+        Args:
+            path (str): Path of the file
+
+        Returns:
+            TrialHistograms: Loaded histograms
+        """
+        with np.load(path) as data:
+            return cls.from_arrays(data)
+
+    @classmethod
+    def from_arrays(cls, data):
+        """
+        Create histograms from the arrays of arrays().
+
+        Args:
+            data (dict): Array of each attribute, such as a loaded .npz file
+
+        Returns:
+            TrialHistograms: Histograms
+        """
+        histograms = cls(data['team_names'].tolist())
+        histograms.trials = int(data['trials'])
+        histograms.goal_difference_min = int(data['goal_difference_min'])
+        for key in ('position', 'team_points', 'position_points', 'team_goal_difference', 'position_goal_difference'):
+            setattr(histograms, key, data[key])
+        return histograms
+
+    def position_probability(self, position):
+        """
+        Get the probability of every team to finish at a given position.
+
+        Args:
+            position (int): Position, 1 is first
+
+        Returns:
+            numpy.ndarray: Probability of each team
+        """
+        return self.position[:, position - 1] / self.trials
+
+    def top_probability(self, position):
+        """
+        Get the probability of every team to finish at a given position or better.
+
+        Args:
+            position (int): Position, 1 is first
+
+        Returns:
+            numpy.ndarray: Probability of each team
+        """
+        return self.position[:, :position].sum(axis=1) / self.trials
+
+    def tracked_probabilities(self):
+        """
+        Get the probabilities tracked by the adaptive mode.
+
+        Returns:
+            dict: Probability of each team to finish 'first', in the 'top_8', in the 'top_24' and 'last'
+        """
+        return {'first': self.position_probability(1),
+                'top_8': self.top_probability(8),
+                'top_24': self.top_probability(24),
+                'last': self.position_probability(len(self.team_names))}
+
+    def error(self, probability, z=CONFIDENCE_Z):
+        """
+        Get the half width of the Wilson confidence interval of probabilities estimated from the trials.
+
+        Args:
+            probability (numpy.ndarray): Probabilities estimated from the trials
+            z (float): Quantile of the normal distribution of the confidence level, 1.96 for 95%
+
+        Returns:
+            numpy.ndarray: Half width of the confidence interval of each probability
+        """
+        return wilson_half_width(probability, self.trials, z)
+
+    def max_error(self, z=CONFIDENCE_Z):
+        """
+        Get the largest confidence interval half width of the tracked probabilities.
+
+        Args:
+            z (float): Quantile of the normal distribution of the confidence level
+
+        Returns:
+            float: Largest half width over all teams and tracked probabilities
+        """
+        return max(float(self.error(probability, z).max()) for probability in self.tracked_probabilities().values())
+
+def tracked_indicators(position):
+    """
+    Get the trials where each team reaches the tracked probabilities of TrialHistograms.tracked_probabilities.
+
+    Args:
+        position (numpy.ndarray): Positions of shape (..., teams), 1 is first
+
+    Returns:
+        dict: Boolean arrays of the shape of position, for 'first', 'top_8', 'top_24' and 'last'
+    """
+    return {'first': position == 1,
+            'top_8': position <= 8,
+            'top_24': position <= 24,
+            'last': position == position.shape[-1]}
+
+class ReplicateVariance:
+    """
+    Variance of the tracked probabilities between replicates of trials, to measure the variance reduction of
+    a sampling mode.
+
+    The trials of each batch are split into replicates of replicate_size consecutive trials, which the sampling
+    modes of random_generators balance independently of each other. The variance of the estimates of the
+    replicates is compared with p (1 - p) / replicate_size, the variance of plain Monte Carlo estimates.
+
+    Args:
+        team_names (list): Team names
+        replicate_size (int): Number of trials of each replicate, the trials of a batch after its last
+            complete replicate are not measured
+    """
+    def __init__(self, team_names, replicate_size):
+        self.team_names = list(team_names)
+        self.replicate_size = replicate_size
+        self.replicates = 0
+        self.sums = {}
+        self.squares = {}
+
+    def update(self, batch):
+        """
+        Add the replicates of a batch of trials.
+
+        Args:
+            batch (dict): Arrays of shape (trials, teams) with the key 'position', as returned by
+                simulation.simulate_batch
+        """
+        position = batch['position']
+        replicates = len(position) // self.replicate_size
+        if replicates == 0:
+            return
+        position = position[:replicates * self.replicate_size].reshape(replicates, self.replicate_size, -1)
+        for key, indicator in tracked_indicators(position).items():
+            estimates = indicator.mean(axis=1)
+            self.sums[key] = self.sums.get(key, 0) + estimates.sum(axis=0)
+            self.squares[key] = self.squares.get(key, 0) + (estimates**2).sum(axis=0)
+        self.replicates += replicates
+
+    def arrays(self):
+        """
+        Get the sums of the replicates as arrays, to save them with the histograms.
+
+        Returns:
+            dict: Array of each attribute
+        """
+        keys = list(self.sums)
+        teams = len(self.team_names)
+        return {'team_names': np.array(self.team_names), 'replicate_size': self.replicate_size, 'replicates': self.replicates,
+                'keys': np.array(keys, dtype=str),
+                'sums': np.array([self.sums[key] for key in keys]).reshape(len(keys), teams),
+                'squares': np.array([self.squares[key] for key in keys]).reshape(len(keys), teams)}
+
+    @classmethod
+    def from_arrays(cls, data):
+        """
+        Create the sums of the replicates from the arrays of arrays().
+
+        Args:
+            data (dict): Array of each attribute
+
+        Returns:
+            ReplicateVariance: Sums of the replicates
+        """
+        replicates = cls(data['team_names'].tolist(), int(data['replicate_size']))
+        replicates.replicates = int(data['replicates'])
+        for i, key in enumerate(data['keys'].tolist()):
+            replicates.sums[key] = data['sums'][i]
+            replicates.squares[key] = data['squares'][i]
+        return replicates
+
+    def variance_reduction(self):
+        """
+        Get the variance reduction of each tracked probability: the variance of plain Monte Carlo divided by the
+        measured variance, so that the sampling mode reaches the precision of plain Monte Carlo with that many
+        times fewer trials.
+
+        Returns:
+            dict: For each tracked probability, 'teams' the reduction of each team, nan where the probability
+                or its variance is 0, and 'pooled' the ratio of the sums over the teams, None with fewer than
+                two replicates
+        """
+        if self.replicates < 2:
+            return None
+        reductions = {}
+        for key in self.sums:
+            mean = self.sums[key] / self.replicates
+            variance = np.maximum(self.squares[key] - self.replicates * mean**2, 0) / (self.replicates - 1)
+            plain_variance = mean * (1 - mean) / self.replicate_size
+            with np.errstate(divide='ignore', invalid='ignore'):
+                teams = np.where((plain_variance > 0) & (variance > 0), plain_variance / variance, np.nan)
+            pooled = float(plain_variance.sum() / variance.sum()) if variance.sum() > 0 else float('nan')
+            reductions[key] = {'teams': teams, 'pooled': pooled}
+        return reductions
+
+def wilson_half_width(probability, trials, z=CONFIDENCE_Z):
+    """
+    Half width of the Wilson score interval of a binomial proportion.
+
+    Unlike the normal approximation, the interval does not collapse when the estimated probability is 0 or 1.
+
+    Args:
+        probability (numpy.ndarray): Estimated proportions
+        trials (int): Number of trials
+        z (float): Quantile of the normal distribution of the confidence level
+
+    Returns:
+        numpy.ndarray: Half width of the interval
+    """
+    return z / (1 + z**2 / trials) * np.sqrt(probability * (1 - probability) / trials + z**2 / (4 * trials**2))
+
+def _count(rows, values, n_rows, width=None):
+    #2d histogram of values per row, with np.bincount on the flattened (row, value) index
+    if width is None:
+        width = int(values.max()) + 1
+    counts = np.bincount((rows * width + values).ravel(), minlength=n_rows * width)
+    return counts.reshape(n_rows, width)
+
+def _add(histogram, counts):
+    #add two histograms with the same rows, padding the narrower one with zero columns
+    width = max(histogram.shape[1], counts.shape[1])
+    histogram = np.pad(histogram, ((0, 0), (0, width - histogram.shape[1])))
+    histogram[:, :counts.shape[1]] += counts
+    return histogram
@@ -0,0 +1,288 @@
+#This file contains the batch runner of the simulations of several leagues
+#The jobs of a manifest share one process pool: the blocks of trials of every job are interleaved on the pool,
+#and the plots of a job are rendered on the same pool as soon as its trials are done.
+#Every job writes its outputs and the alias cache of its team names to <output_dir>/<job name>/ and the throughput of each job is reported.
+#Usage: python3 batch_runner.py manifest.json --workers 8
+#
+#Manifest example, the inputs of a job are either csv paths or a dataset of datasets.py:
+#{
+#  "output_dir": "runs",
+#  "defaults": {"trials": 100000, "seed": 1, "sampling": "stratified", "dpi": 100},
+#  "jobs": [
+#    {"name": "cl-2024-25", "competition": "champions_league", "season": "2024-25"},
+#    {"name": "custom", "wiki_matches": "other/wiki_matches.csv", "predicd_odds": "other/predicd_odds.csv", "trials": 20000}
+#  ]
+#}
+
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import json
+import math
+import os
+import time
+
+import numpy as np
+
+from aggregation import TrialHistograms, ReplicateVariance
+from datasets import dataset_dir, DATA_DIR
+from game_parser import create_matches_list
+from name_resolution import ALIAS_CACHE_FILE
+from plots import plot_jobs, DEFAULT_DPI
+from result_cache import ResultCache, result_key, usable_trials
+from simulation import make_baseline, simulate_block, trial_blocks, get_team_names, REPLICATE_SIZE
+from trial_store import resume_trial_store, open_trial_store, export_csv
+
+#options of a job and their default values
+JOB_DEFAULTS = {'trials': 10000, 'seed': None, 'sampling': 'plain', 'cache': True, 'csv': False, 'plots': True, 'dpi': DEFAULT_DPI, 'format': 'png'}
+
+def load_manifest(path):
+    """
+    Load a manifest of jobs, the options missing from a job are taken from the defaults of the manifest
+    and then from JOB_DEFAULTS.
+
+    Args:
+        path (str): Path of the json manifest
+
+    Returns:
+        dict: Manifest with 'output_dir' and 'jobs', each job has a name, its input paths and every option
+
+    Raises:
+        ValueError: If a job has no name, has the name of another job or has no inputs
+    """
+    with open(path, "r", encoding='utf-8') as file:
+        manifest = json.load(file)
+    defaults = {**JOB_DEFAULTS, **manifest.get('defaults', {})}
+    data_dir = manifest.get('data_dir', DATA_DIR)
+    jobs = []
+    for entry in manifest['jobs']:
+        job = {**defaults, **entry}
+        if 'name' not in job:
+            raise ValueError(f"A job of {path} has no name")
+        if 'competition' in job and 'season' in job:
+            directory = dataset_dir(job['competition'], job['season'], data_dir)
+            job.setdefault('wiki_matches', os.path.join(directory, "wiki_matches.csv"))
+            job.setdefault('predicd_odds', os.path.join(directory, "predicd_odds.csv"))
+        if 'wiki_matches' not in job or 'predicd_odds' not in job:
+            raise ValueError(f"The job {job['name']} has neither csv paths nor a competition and a season")
+        jobs.append(job)
+    names = [job['name'] for job in jobs]
+    if len(set(names)) != len(names):
+        raise ValueError(f"The job names of {path} are not unique")
+    return {'output_dir': manifest.get('output_dir', "runs"), 'jobs': jobs}
+
+def _timed_block(baseline, matches_to_generate_predicd, trials, seed, block, sampling):
+    #the processor time of the worker gives the throughput of a job independently of the other jobs
+    begin = time.process_time()
+    batch = simulate_block(baseline, matches_to_generate_predicd, trials, seed, block, sampling)
+    return batch, time.process_time() - begin
+
+class BatchJob:
+    """
+    State of a job of the batch runner: its inputs, its blocks still to submit, its blocks in flight and its results.
+
+    Args:
+        job (dict): Job of the manifest
+        output_dir (str): Directory of the outputs of the job
+    """
+    def __init__(self, job, output_dir):
+        self.job = job
+        self.name = job['name']
+        self.output_dir = output_dir
+        os.makedirs(output_dir, exist_ok=True)
+        #every job has its own alias cache, so that the aliases of a league are not used for another league
+        self.matches_list, self.matches_to_generate_predicd = create_matches_list(False, job['wiki_matches'], job['predicd_odds'],
+                                                                                  os.path.join(output_dir, ALIAS_CACHE_FILE))
+        self.team_names = get_team_names(self.matches_list, self.matches_to_generate_predicd)
+        self.seed = job['seed'] if job['seed'] is not None else np.random.SeedSequence().entropy
+        self.trials = job['trials']
+        self.histograms = TrialHistograms(self.team_names)
+        self.replicates = ReplicateVariance(self.team_names, REPLICATE_SIZE)
+
+        first_trial = 0
+        self.cache = None
+        self.cache_key = result_key(self.matches_list, self.matches_to_generate_predicd, self.seed, sampling=job['sampling'])
+        if job['seed'] is not None and job['cache']:
+            self.cache = ResultCache()
+            cached = self.cache.get(self.cache_key)
+            first_trial = usable_trials(cached, self.trials)
+            if first_trial > 0:
+                self.histograms = cached
+        self.cached_trials = first_trial
+
+        self.store = None
+        if first_trial < self.trials:
+            self.store = resume_trial_store(os.path.join(output_dir, "statistics"), self.team_names, self.seed,
+                                            [job['wiki_matches'], job['predicd_odds']], first_trial, self.cache_key)
+        self.baseline = make_baseline(self.matches_list, self.matches_to_generate_predicd)
+        self.blocks = deque(trial_blocks(self.trials, first_trial=first_trial))
+        self.pending = deque()
+        self.begin_time = None
+        self.end_time = None
+        self.worker_seconds = 0.0
+        self.plot_errors = []
+
+    def done(self):
+        return not self.blocks and not self.pending
+
+    def submit(self, executor):
+        """
+        Submit the next block of trials of the job to the pool.
+
+        Args:
+            executor (ProcessPoolExecutor): Shared pool
+        """
+        if self.begin_time is None:
+            self.begin_time = time.time()
+        block, size = self.blocks.popleft()
+        self.pending.append(executor.submit(_timed_block, self.baseline, self.matches_to_generate_predicd, size, self.seed, block, self.job['sampling']))
+
+    def collect(self):
+        """
+        Add the finished blocks at the head of the queue to the results, so that the blocks are stored in order.
+
+        Returns:
+            int: Number of collected blocks
+        """
+        collected = 0
+        while self.pending and self.pending[0].done():
+            batch, seconds = self.pending.popleft().result()
+            if self.store is not None:
+                self.store.append(batch)
+            self.histograms.update(batch)
+            self.replicates.update(batch)
+            self.worker_seconds += seconds
+            collected += 1
+        if self.done() and self.end_time is None:
+            self.end_time = time.time()
+        return collected
+
+    def finish(self, executor):
+        """
+        Save the results of the job and submit its plots to the pool.
+
+        Args:
+            executor (ProcessPoolExecutor): Shared pool
+
+        Returns:
+            list: Futures of the plots
+        """
+        if self.store is not None:
+            self.store.close()
+        if self.cache is not None:
+            self.cache.put(self.cache_key, self.histograms)
+        self.histograms.save(os.path.join(self.output_dir, "histograms.npz"))
+        if self.job['csv'] and self.store is not None:
+            export_csv(open_trial_store(os.path.join(self.output_dir, "statistics")), os.path.join(self.output_dir, "statistics.csv"))
+        if not self.job['plots']:
+            return []
+        return [executor.submit(plot, *args) for plot, args in plot_jobs(self.histograms, self.job['dpi'], self.job['format'], self.output_dir)]
+
+    def collect_plots(self, futures):
+        """
+        Wait for the plots of the job, a failed plot is recorded in the report of the job instead of stopping the batch.
+
+        Args:
+            futures (list): Futures of the plots returned by finish
+        """
+        for future in futures:
+            try:
+                future.result()
+            except Exception as error:
+                self.plot_errors.append(f"{type(error).__name__}: {error}")
+
+    def report(self):
+        """
+        Get the summary and throughput of the job.
+
+        Returns:
+            dict: Trials, seed, sampling mode, timings, throughput, the tracked probabilities of each team,
+                their measured variance reduction against plain Monte Carlo, pooled over the teams, and the
+                errors of the plots
+        """
+        simulated = self.histograms.trials - self.cached_trials
+        wall_seconds = (self.end_time - self.begin_time) if self.begin_time is not None else 0.0
+        probabilities = self.histograms.tracked_probabilities()
+        reduction = self.replicates.variance_reduction()
+        return {
+            'name': self.name,
+            'seed': self.seed,
+            'sampling': self.job['sampling'],
+            'trials': self.histograms.trials,
+            'cached_trials': self.cached_trials,
+            'simulated_trials': simulated,
+            'wall_seconds': wall_seconds,
+            'worker_seconds': self.worker_seconds,
+            'trials_per_second': simulated / wall_seconds if wall_seconds > 0 else None,
+            'trials_per_worker_second': simulated / self.worker_seconds if self.worker_seconds > 0 else None,
+            'probabilities': {key: dict(zip(self.team_names, map(_finite_or_none, values.tolist()))) for key, values in probabilities.items()},
+            'variance_reduction': {key: _finite_or_none(value['pooled']) for key, value in reduction.items()} if reduction else None,
+            'plot_errors': self.plot_errors,
+        }
+
+def _finite_or_none(value):
+    #nan and infinity are not valid json
+    return value if math.isfinite(value) else None
+
+def run_batch(manifest, workers=None):
+    """
+    Run the jobs of a manifest on one shared process pool.
+
+    The blocks of the jobs are submitted in turn, with at most two blocks per worker in flight, so that every
+    job progresses and the pool stays busy until the last block. The results of each job are the same as the
+    results of game_parser with the same seed and number of trials.
+
+    Args:
+        manifest (dict): Manifest as returned by load_manifest
+        workers (int, optional): Number of processes of the pool, the number of cpus by default
+
+    Returns:
+        list: Report of each job, see BatchJob.report
+    """
+    workers = workers or os.cpu_count() or 1
+    jobs = [BatchJob(job, os.path.join(manifest['output_dir'], job['name'])) for job in manifest['jobs']]
+    #futures of the plots of each finished job
+    plot_futures = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        running = list(jobs)
+        turn = 0
+        while running:
+            #fill the pool, one block per job in turn
+            in_flight = sum(len(job.pending) for job in running)
+            submittable = [job for job in running if job.blocks]
+            while in_flight < 2 * workers and submittable:
+                job = submittable[turn % len(submittable)]
+                job.submit(executor)
+                in_flight += 1
+                turn += 1
+                submittable = [job for job in running if job.blocks]
+            pending = [future for job in running for future in job.pending]
+            if pending:
+                wait(pending, return_when=FIRST_COMPLETED)
+            for job in running:
+                job.collect()
+                if job.done():
+                    plot_futures.append((job, job.finish(executor)))
+            running = [job for job in running if not job.done()]
+        for job, futures in plot_futures:
+            job.collect_plots(futures)
+    return [job.report() for job in jobs]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate the leagues of a manifest on one shared process pool")
+    parser.add_argument("manifest", help="json manifest of the jobs")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes of the pool, the number of cpus by default")
+    args = parser.parse_args()
+
+    begin_time = time.time()
+    manifest = load_manifest(args.manifest)
+    reports = run_batch(manifest, args.workers)
+    os.makedirs(manifest['output_dir'], exist_ok=True)
+    with open(os.path.join(manifest['output_dir'], "batch_report.json"), "w", encoding='utf-8') as file:
+        json.dump(reports, file, indent=1)
+    for report in reports:
+        rate = f"{report['trials_per_second']:.0f} trials/s, {report['trials_per_worker_second']:.0f} trials/s per worker" if report['simulated_trials'] else "from the cache"
+        print(f"{report['name']}: {report['trials']} trials, {report['wall_seconds']:.3f} s, {rate}")
+        for error in report['plot_errors']:
+            print(f"{report['name']}: a plot failed, {error}")
+    print("Time elapsed: ", round(time.time() - begin_time, 3), "seconds")
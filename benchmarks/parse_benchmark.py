@@ -0,0 +1,177 @@
+#This script times the parsing of the scraped pages and the writing of their csv files
+#It runs against saved html pages, by default benchmarks/fixtures/wiki.html and benchmarks/fixtures/predicd.html.
+#Missing pages are taken from the http cache if a run fetched them, and are otherwise generated with the structure
+#the scrapers read, so that the benchmark runs offline.
+#Usage: python3 benchmarks/parse_benchmark.py [--repeat 5] [--wiki page.html] [--predicd page.html]
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+
+from fetch_predictions import parse_predicd_win_probabilities, get_match_info, PREDICD_ODDS_HEADER
+from http_cache import HTTP_CACHE_DIR, _entry_paths
+from scraping import write_csv_atomic
+from wiki_parser import parse_champions_league_matches, WIKI_MATCHES_HEADER
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+WIKI_URL = "https://en.wikipedia.org/wiki/2024%E2%80%9325_UEFA_Champions_League_league_phase"
+PREDICD_URL = "https://www.predicd.com/en/football/league/4480/"
+
+def synthetic_wiki_page(teams=36, matchdays=8, filler=400):
+    """
+    Generate a page with the match tables of the Wikipedia page among unrelated content.
+
+    Args:
+        teams (int): Number of teams
+        matchdays (int): Number of matchdays, the first half is played
+        filler (int): Number of unrelated paragraphs and tables
+
+    Returns:
+        str: Html of the page
+    """
+    parts = ["<html><body><div id='content'>"]
+    parts += [f"<p>Paragraph {i} <a href='/wiki/{i}'>link</a> <b>bold</b></p><table class='wikitable'><tr><td>{i}</td><td>x</td></tr></table>"
+              for i in range(filler)]
+    for matchday in range(matchdays):
+        for i in range(0, teams, 2):
+            home, away = (i + matchday) % teams, (i + 1 + 3 * matchday) % teams
+            score = f"<th class='fscore'>{(i + matchday) % 4}–{i % 3}</th>" if matchday < matchdays // 2 else "<th class='fscore'><a href='#'>v</a></th>"
+            parts.append(f"<table class='fevent'><tr><th class='fhome'><span itemprop='name'><a href='#'>Team {home}</a></span></th>"
+                         f"{score}<th class='faway'><span itemprop='name'><a href='#'>Team {away}</a></span></th></tr>"
+                         f"<tr><td>Stadium {i}</td></tr></table>")
+    parts.append("</div></body></html>")
+    return "".join(parts)
+
+def synthetic_predicd_page(teams=36, matchdays=10, filler=400):
+    """
+    Generate a page with the matchday carousel of predicd among unrelated content.
+
+    Args:
+        teams (int): Number of teams
+        matchdays (int): Number of matchdays, the scrapers skip the ones after the 8th
+        filler (int): Number of unrelated blocks
+
+    Returns:
+        str: Html of the page
+    """
+    parts = ["<html><body>"]
+    parts += [f"<div class='news'><h3>News {i}</h3><p>Text {i}</p><span class='tag'>tag</span></div>" for i in range(filler)]
+    for matchday in range(1, matchdays + 1):
+        parts.append(f"<span id='matchDayCarouselItem'><section matchday='{matchday}'><span style='word-spacing: 100vw;'>Day {matchday} 21:00</span>"
+                     "<table><tbody>")
+        for i in range(0, teams, 2):
+            parts.append("<tr><td><div class='col-12 matchStats'>"
+                         f"<div class='progress-bar homeWin_Progressbar' aria-valuenow='{40 + i % 20}'></div>"
+                         f"<div class='progress-bar draw_Progressbar' aria-valuenow='{25}'></div>"
+                         f"<div class='progress-bar awayWin_Progressbar' aria-valuenow='{35 - i % 20}'></div></div>"
+                         f"<div class='col-xs-12 col-sm-6 matchStats'><h5 class='card-title matchStatsCardTitle underline-home'>FC {i}</h5></div>"
+                         f"<div class='col-xs-12 col-sm-6 matchStats'><h5 class='card-title matchStatsCardTitle underline-away'>FC {i + 1}</h5></div>"
+                         "</td></tr>")
+        parts.append("</tbody></table></section></span>")
+    parts.append("</body></html>")
+    return "".join(parts)
+
+def load_page(path, url, generate):
+    #use the saved page, or the page of the http cache, or a generated page, and save it as a fixture
+    if not os.path.isfile(path):
+        meta_path, body_path = _entry_paths(HTTP_CACHE_DIR, url)
+        if os.path.isfile(body_path):
+            with open(body_path, "rb") as file:
+                text = file.read().decode('utf-8')
+        else:
+            text = generate()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding='utf-8') as file:
+            file.write(text)
+    with open(path, "r", encoding='utf-8') as file:
+        return file.read()
+
+def full_tree_wiki(text):
+    #former parsing path, the whole page is built with html.parser
+    rows = []
+    for table in BeautifulSoup(text, 'html.parser').find_all('table', class_='fevent'):
+        score_element = table.find('th', class_='fscore')
+        score = score_element.contents[0] if score_element else "N/A"
+        team_names = table.find_all('span', attrs={'itemprop': 'name'})
+        if len(team_names) >= 2:
+            rows.append([score, team_names[0].get_text(strip=True), team_names[1].get_text(strip=True)])
+    return rows
+
+def full_tree_predicd(text):
+    #former parsing path, the whole page is built with html.parser and the date is searched for every row
+    rows = []
+    date_match = ""
+    for daily_games in BeautifulSoup(text, 'html.parser').find_all('span', id="matchDayCarouselItem"):
+        section = daily_games.find('section')
+        if section and (int(section['matchday']) > 8 or int(section['matchday']) <= 0):
+            continue
+        table = daily_games.find('tbody')
+        if not table:
+            continue
+        for tr in table.find_all('tr'):
+            day_match_element = daily_games.find('span', style="word-spacing: 100vw;")
+            if day_match_element:
+                date_match = day_match_element.text.strip()
+            flag, mi = get_match_info(tr.find('div', class_='col-12 matchStats'), tr.find_all('div', class_='col-xs-12 col-sm-6 matchStats'))
+            if flag:
+                rows.append([date_match, mi['home_team'], mi['away_team'], mi['pwin'], mi['pdraw'], mi['ploss']])
+    return rows
+
+def append_per_row(path, header, rows):
+    #former writing path, the file is opened again for every row
+    with open(path, "w", encoding='utf-8') as file:
+        file.write("".join(line + "\n" for line in header))
+    for row in rows:
+        with open(path, "a", encoding='utf-8') as file:
+            file.write(";".join(str(value) for value in row) + "\n")
+
+def best_time(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+def available_parsers():
+    parsers = ['html.parser']
+    try:
+        import lxml
+        parsers.append('lxml')
+    except ImportError:
+        pass
+    return parsers
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the parsing and csv writing of the scrapers")
+    parser.add_argument("--repeat", type=int, default=5, help="number of runs, the best time is reported")
+    parser.add_argument("--wiki", default=os.path.join(FIXTURES_DIR, "wiki.html"), help="saved Wikipedia page")
+    parser.add_argument("--predicd", default=os.path.join(FIXTURES_DIR, "predicd.html"), help="saved predicd page")
+    args = parser.parse_args()
+
+    pages = [
+        ("wiki", load_page(args.wiki, WIKI_URL, synthetic_wiki_page), full_tree_wiki, parse_champions_league_matches, WIKI_MATCHES_HEADER),
+        ("predicd", load_page(args.predicd, PREDICD_URL, synthetic_predicd_page), full_tree_predicd, parse_predicd_win_probabilities, PREDICD_ODDS_HEADER),
+    ]
+    with tempfile.TemporaryDirectory() as directory:
+        for name, text, full_tree, strained, header in pages:
+            print(f"{name}: {len(text) / 1e3:.0f} kB")
+            reference_time, reference_rows = best_time(lambda: full_tree(text), args.repeat)
+            print(f"  full tree, html.parser: {reference_time * 1e3:8.2f} ms, {len(reference_rows)} rows")
+            for backend in available_parsers():
+                elapsed, rows = best_time(lambda: strained(text, backend), args.repeat)
+                #lxml may repair broken markup differently, only the html.parser rows are required to be identical
+                if backend == 'html.parser':
+                    assert [list(map(str, row)) for row in rows] == [list(map(str, row)) for row in reference_rows], "strained parsing changed the rows"
+                print(f"  strained, {backend:<11}: {elapsed * 1e3:8.2f} ms, {len(rows)} rows, {reference_time / elapsed:5.1f}x")
+            path = os.path.join(directory, name + ".csv")
+            append_time, _ = best_time(lambda: append_per_row(path, header, reference_rows), args.repeat)
+            atomic_time, _ = best_time(lambda: write_csv_atomic(path, header, reference_rows), args.repeat)
+            print(f"  csv append per row    : {append_time * 1e3:8.2f} ms")
+            print(f"  csv atomic            : {atomic_time * 1e3:8.2f} ms, {append_time / atomic_time:5.1f}x")
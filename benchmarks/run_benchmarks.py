@@ -0,0 +1,278 @@
+#This script times the hot paths of the pipeline on synthetic leagues of 36, 100 and 1000 teams
+#Every case runs a number of times with the garbage collector disabled and keeps the best and median times.
+#The results are saved as json and compared with a stored baseline, cases slower than the baseline by more
+#than the tolerance are flagged, and the exit status is 1 if any case is flagged.
+#Usage: python3 benchmarks/run_benchmarks.py [--repeat 5] [--filter make_ranking] [--output results.json]
+#       python3 benchmarks/run_benchmarks.py --save-baseline    (store the results as the new baseline)
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from aggregation import TrialHistograms
+from fixture_store import FixtureStore
+from game_parser import correct_missmatched_names, missing_matches, create_matches_list, get_ranks
+from plots import plot_probability_first_position, plot_probability_last_position, plot_position_distribution, \
+    plot_position_heatmap, plot_8th_and_24th_position_distribution, PREVIEW_DPI
+from random_generators import get_random_result, geometric, ModelGame
+from simulation import simulate, get_team_names
+from statistics_and_rankings import MakeStatistics, MakeRanking
+from synthetic_league import synthetic_league, write_league_csvs
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(BENCHMARKS_DIR, "baseline.json")
+#a case is flagged when its best time exceeds the baseline by more than this share
+TOLERANCE = 0.25
+TEAM_COUNTS = (36, 100, 1000)
+MATCHDAYS = 8
+#played matchdays of the leagues, from the start of the season to its last matchday
+PLAYED_MATCHDAYS = (1, 4, 7)
+#the name matching and the plots are quadratic or worse in the number of teams, they stop at 100 teams
+SMALL_TEAM_COUNTS = (36, 100)
+#trials and batch size of the trial loop for each number of teams, so that a batch fits in memory
+LOOP_TRIALS = {36: (20000, 10000), 100: (10000, 10000), 1000: (2000, 500)}
+REFERENCE_LOOP_TRIALS = 100
+
+_leagues = {}
+
+def league(teams, played=4):
+    #leagues are generated once and shared by the cases
+    key = (teams, played)
+    if key not in _leagues:
+        _leagues[key] = synthetic_league(teams, MATCHDAYS, played, seed=teams)
+    return _leagues[key]
+
+def _histograms(teams):
+    league_data = league(teams)
+    matches_list, remaining = league_data['matches_list'], league_data['matches_to_generate_predicd']
+    histograms = TrialHistograms(get_team_names(matches_list, remaining))
+    for batch in simulate(matches_list, remaining, 10000, seed=0):
+        histograms.update(batch)
+    return histograms
+
+def _reference_rank_statistics(results_list):
+    #statistics of a trial in the original script, kept here as the reference of the batched trial loop
+    stats_tracked = {}
+    ranks = get_ranks(results_list)
+    for index, rank in enumerate(ranks):
+        stats_tracked[rank['name'] + "_points"] = rank['points']
+        stats_tracked[rank['name'] + "_goaldifference"] = rank['goals_difference']
+        stats_tracked[rank['name'] + "_position"] = index + 1
+    for i in range(1, len(ranks)+1):
+        stats_tracked[str(i) + "_position_points"] = ranks[i-1]['points']
+        stats_tracked[str(i) + "_position_goaldifference"] = ranks[i-1]['goals_difference']
+    return stats_tracked
+
+def _reference_trial_loop(matches_list, remaining, trials):
+    #trial loop of the original script, one python ranking per trial, which the program no longer runs
+    for _ in range(trials):
+        new_results = []
+        for game in remaining:
+            home_score, away_score = get_random_result(game['wprob'], game['dprob'], game['lprob'])
+            new_results.append([game['home-team'], game['away-team'], home_score, away_score])
+        _reference_rank_statistics(matches_list + new_results)
+
+def _trial_loop(matches_list, remaining, trials, batch_size):
+    histograms = TrialHistograms(get_team_names(matches_list, remaining))
+    for batch in simulate(matches_list, remaining, trials, seed=0, batch_size=batch_size):
+        histograms.update(batch)
+
+def _missing_matches_setup(teams):
+    #a fresh store with the odds source fixtures only, so that missing_matches has the others to model
+    league_data = league(teams)
+    store = FixtureStore()
+    for _, home, away in league_data['fixtures']:
+        store.add_fixture(home, away)
+    for match in league_data['matches_list']:
+        store.set_result(match[0], match[1], (match[2], match[3]))
+    covered = {(game['home-team'], game['away-team']) for game in league_data['source_odds']}
+    for game in league_data['matches_to_generate_predicd']:
+        if (game['home-team'], game['away-team']) in covered:
+            store.set_odds(game['home-team'], game['away-team'], game['wprob'], game['dprob'], game['lprob'], 'predicd')
+    return store, MakeStatistics(league_data['matches_list'])
+
+def benchmark_cases(directory):
+    """
+    Get the benchmark cases.
+
+    Args:
+        directory (str): Temporary directory for the files written by the cases
+
+    Yields:
+        tuple: (name, setup, function, extra) where setup returns the arguments of function, or is None,
+            and extra computes additional results from the best time, or is None
+    """
+    for teams in TEAM_COUNTS:
+        for played in PLAYED_MATCHDAYS:
+            matches_list = league(teams, played)['matches_list']
+            yield f"make_statistics/{teams}t/{played}of{MATCHDAYS}", None, lambda m=matches_list: MakeStatistics(m), None
+            stats = MakeStatistics(matches_list)
+            yield f"make_ranking/{teams}t/{played}of{MATCHDAYS}", None, lambda s=stats: MakeRanking(s), None
+
+    rng = random.Random(0)
+    calls = 100000
+    yield f"get_random_result/{calls}", None, lambda: [get_random_result(0.45, 0.25, 0.3, rng) for _ in range(calls)], \
+        lambda best: {'per_call_us': best / calls * 1e6}
+    yield f"geometric/{calls}", None, lambda: [geometric(0.3, rng) for _ in range(calls)], \
+        lambda best: {'per_call_us': best / calls * 1e6}
+
+    for teams in TEAM_COUNTS:
+        league_data = league(teams)
+        stats = MakeStatistics(league_data['matches_list'])
+        pairs = [(stats[game['home-team']], stats[game['away-team']]) for game in league_data['matches_to_generate_predicd']]
+        yield f"model_game/{teams}t", None, lambda p=pairs: [ModelGame(home, away) for home, away in p], None
+        yield f"missing_matches/{teams}t", lambda t=teams: _missing_matches_setup(t), missing_matches, None
+
+    for teams in SMALL_TEAM_COUNTS:
+        league_data = league(teams)
+        wiki_names, source_names = set(league_data['names']), set(league_data['source_names'])
+        #a missing alias cache for every run, so that every name goes through the matching
+        counter = iter(range(10**9))
+        yield f"correct_missmatched_names/{teams}t", lambda: (os.path.join(directory, f"aliases_{next(counter)}.json"),), \
+            lambda path, w=wiki_names, s=source_names: correct_missmatched_names(w, s, path), None
+
+    for teams in TEAM_COUNTS:
+        trials, batch_size = LOOP_TRIALS[teams]
+        for played in PLAYED_MATCHDAYS:
+            league_data = league(teams, played)
+            yield f"trial_loop/{teams}t/{played}of{MATCHDAYS}/{trials}", None, \
+                lambda l=league_data, n=trials, b=batch_size: _trial_loop(l['matches_list'], l['matches_to_generate_predicd'], n, b), \
+                lambda best, n=trials: {'trials_per_second': n / best}
+    league_data = league(36)
+    yield f"reference_trial_loop/36t/{REFERENCE_LOOP_TRIALS}", None, \
+        lambda: _reference_trial_loop(league_data['matches_list'], league_data['matches_to_generate_predicd'], REFERENCE_LOOP_TRIALS), \
+        lambda best: {'trials_per_second': REFERENCE_LOOP_TRIALS / best}
+
+    for teams in SMALL_TEAM_COUNTS:
+        histograms = _histograms(teams)
+        names = histograms.team_names
+        classifications = list(range(1, len(names) + 1))
+        path = os.path.join(directory, "plot.png")
+        yield f"plot_probability_first_position/{teams}t", None, lambda h=histograms: plot_probability_first_position(h, h.team_names, path, PREVIEW_DPI), None
+        yield f"plot_probability_last_position/{teams}t", None, lambda h=histograms: plot_probability_last_position(h, h.team_names, path, PREVIEW_DPI), None
+        yield f"plot_position_distribution/{teams}t", None, lambda h=histograms, c=classifications: plot_position_distribution(h, c, h.team_names, path, PREVIEW_DPI), None
+        yield f"plot_position_heatmap/{teams}t", None, lambda h=histograms, c=classifications: plot_position_heatmap(h, c, h.team_names, path, PREVIEW_DPI), None
+        yield f"plot_8th_and_24th_position_distribution/{teams}t", None, lambda h=histograms: plot_8th_and_24th_position_distribution(h, path, PREVIEW_DPI), None
+
+    #end to end from the csv files, parsing, name matching, odds and trials
+    for teams in SMALL_TEAM_COUNTS:
+        league_directory = os.path.join(directory, f"league_{teams}")
+        os.makedirs(league_directory, exist_ok=True)
+        wiki_path, predicd_path = write_league_csvs(league(teams), league_directory)
+        trials, batch_size = LOOP_TRIALS[teams]
+
+        def end_to_end(alias_cache, wiki_path=wiki_path, predicd_path=predicd_path, trials=trials, batch_size=batch_size):
+            matches_list, remaining = create_matches_list(False, wiki_path, predicd_path, alias_cache)
+            _trial_loop(matches_list, remaining, trials, batch_size)
+        #a missing alias cache for every run, in the temporary directory and not in the working directory
+        counter = iter(range(10**9))
+        yield f"end_to_end/{teams}t/{trials}", lambda d=league_directory: (os.path.join(d, f"aliases_{next(counter)}.json"),), end_to_end, None
+
+def measure(setup, function, repeat):
+    """
+    Time a function, with the garbage collector disabled like timeit and its prints discarded.
+
+    Args:
+        setup (callable): Function returning the arguments of function, run before every repetition and not timed,
+            or None
+        function (callable): Function to time
+        repeat (int): Number of repetitions
+
+    Returns:
+        dict: Best and median times in seconds, and the number of repetitions
+    """
+    times = []
+    for _ in range(repeat):
+        args = setup() if setup is not None else ()
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                begin = time.perf_counter()
+                function(*args)
+                times.append(time.perf_counter() - begin)
+        finally:
+            if gc_enabled:
+                gc.enable()
+    return {'best': min(times), 'median': statistics.median(times), 'repeat': repeat}
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """
+    Compare results with a baseline.
+
+    Args:
+        results (dict): Results of each case
+        baseline (dict): Results of each case of the baseline
+        tolerance (float): Share of slowdown above which a case is flagged
+
+    Returns:
+        list: (name, ratio, flagged) of each case of both results and baseline, ratio is the best time
+            divided by the best time of the baseline
+    """
+    rows = []
+    for name, result in results.items():
+        if name in baseline:
+            ratio = result['best'] / baseline[name]['best']
+            rows.append((name, ratio, ratio > 1 + tolerance))
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks of the hot paths on synthetic leagues")
+    parser.add_argument("--repeat", type=int, default=5, help="number of repetitions of each case")
+    parser.add_argument("--filter", default=None, help="only run the cases whose name contains this text")
+    parser.add_argument("--output", default=None, help="json file of the results")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="json file of the baseline results")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="slowdown above which a case is flagged")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, setup, function, extra in benchmark_cases(directory):
+            if args.filter is not None and args.filter not in name:
+                continue
+            result = measure(setup, function, args.repeat)
+            if extra is not None:
+                result.update(extra(result['best']))
+            results[name] = result
+            print(f"{name:<60} best {result['best'] * 1e3:10.3f} ms, median {result['median'] * 1e3:10.3f} ms")
+
+    report = {
+        'created': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpus': os.cpu_count(),
+        'results': results,
+    }
+    if args.output is not None:
+        with open(args.output, "w", encoding='utf-8') as file:
+            json.dump(report, file, indent=1)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding='utf-8') as file:
+            json.dump(report, file, indent=1)
+        print(f"Baseline saved to {args.baseline}")
+    elif os.path.isfile(args.baseline):
+        with open(args.baseline, "r", encoding='utf-8') as file:
+            baseline = json.load(file)
+        rows = compare(results, baseline['results'], args.tolerance)
+        flagged = [row for row in rows if row[2]]
+        print(f"Compared with the baseline of {baseline['created']}, {len(flagged)} of {len(rows)} cases slower by more than {args.tolerance:.0%}")
+        for name, ratio, _ in flagged:
+            print(f"  REGRESSION {name}: {ratio:.2f}x the baseline time")
+        if flagged:
+            sys.exit(1)
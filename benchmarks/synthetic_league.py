@@ -0,0 +1,120 @@
+#This file contains generators of synthetic leagues for the benchmarks
+#A league has any number of teams playing a number of matchdays without repeated pairings, the first matchdays
+#are played and the others have odds, and the team names of the odds source are variants of the league names
+#so that the name matching has work to do. The same arguments always give the same league.
+
+import os
+import random
+
+SYLLABLES = ["ba", "ro", "ven", "ta", "li", "mar", "sko", "del", "ni", "ka", "tor", "ens", "bru", "gal", "po", "sal", "ri", "mon", "ze", "lu"]
+SUFFIXES = ["City", "United", "Athletic", "Rovers", "Sporting", "Dynamo", "Olympic", "Real"]
+PREFIXES = ["FC", "AC", "SK", "FK", "AS", "SC"]
+
+def team_names(teams, seed=0):
+    """
+    Generate distinct team names and the names an odds source would use for them.
+
+    Args:
+        teams (int): Number of teams
+        seed (int): Seed of the generator
+
+    Returns:
+        tuple: (names, source_names) lists of the league names and of the matching odds source names
+    """
+    rng = random.Random(seed)
+    names, source_names, seen = [], [], set()
+    while len(names) < teams:
+        stem = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+        if stem in seen:
+            continue
+        seen.add(stem)
+        names.append(f"{stem} {rng.choice(SUFFIXES)}")
+        source_names.append(f"{rng.choice(PREFIXES)} {stem}")
+    return names, source_names
+
+def fixtures(names, matchdays, seed=0):
+    """
+    Schedule matchdays where every team plays once, without repeated pairings (circle method).
+
+    Args:
+        names (list): Team names, an even number of them
+        matchdays (int): Number of matchdays, at most len(names) - 1
+        seed (int): Seed of the generator
+
+    Returns:
+        list: (matchday, home team, away team) tuples, matchdays starting at 1
+    """
+    rng = random.Random(seed)
+    order = list(names)
+    rng.shuffle(order)
+    fixed, rotating = order[0], order[1:]
+    schedule = []
+    for matchday in range(1, matchdays + 1):
+        round_teams = [fixed] + rotating
+        half = len(round_teams) // 2
+        for home, away in zip(round_teams[:half], reversed(round_teams[half:])):
+            if rng.random() < 0.5:
+                home, away = away, home
+            schedule.append((matchday, home, away))
+        rotating = rotating[-1:] + rotating[:-1]
+    return schedule
+
+def synthetic_league(teams=36, matchdays=8, played=5, odds_coverage=0.8, seed=0):
+    """
+    Generate a league in the formats of create_matches_list.
+
+    Args:
+        teams (int): Number of teams, even
+        matchdays (int): Number of matchdays
+        played (int): Number of matchdays already played
+        odds_coverage (float): Share of the remaining fixtures with odds from the odds source
+        seed (int): Seed of the generator
+
+    Returns:
+        dict: League with keys 'names', 'source_names', 'fixtures', 'matches_list' (played matches
+            [home, away, home_score, away_score]), 'matches_to_generate_predicd' (remaining fixtures with odds)
+            and 'source_odds' (remaining fixtures covered by the odds source, with the source names)
+    """
+    rng = random.Random(seed)
+    names, source_names = team_names(teams, seed)
+    source_name = dict(zip(names, source_names))
+    schedule = fixtures(names, matchdays, seed)
+    matches_list, matches_to_generate_predicd, source_odds = [], [], []
+    for matchday, home, away in schedule:
+        if matchday <= played:
+            matches_list.append([home, away, rng.randint(0, 4), rng.randint(0, 3)])
+            continue
+        w = rng.randint(20, 60) / 100
+        d = rng.randint(15, 30) / 100
+        game = {'home-team': home, 'away-team': away, 'wprob': w, 'dprob': d, 'lprob': 1 - w - d}
+        matches_to_generate_predicd.append(game)
+        if rng.random() < odds_coverage:
+            source_odds.append({**game, 'home-team': source_name[home], 'away-team': source_name[away]})
+    return {'names': names, 'source_names': source_names, 'fixtures': schedule, 'matches_list': matches_list,
+            'matches_to_generate_predicd': matches_to_generate_predicd, 'source_odds': source_odds}
+
+def write_league_csvs(league, directory):
+    """
+    Write a league as the csv files of the scrapers, wiki_matches.csv and predicd_odds.csv.
+
+    Args:
+        league (dict): League as returned by synthetic_league
+        directory (str): Directory of the files
+
+    Returns:
+        tuple: (wiki_path, predicd_path) paths of the files
+    """
+    scores = {(match[0], match[1]): match for match in league['matches_list']}
+    wiki_path = os.path.join(directory, "wiki_matches.csv")
+    predicd_path = os.path.join(directory, "predicd_odds.csv")
+    with open(wiki_path, "w", encoding='utf-8') as file:
+        file.write("Sep=;\nscore;home team;away team\n")
+        for _, home, away in league['fixtures']:
+            match = scores.get((home, away))
+            score = f"{match[2]}–{match[3]}" if match else "v"
+            file.write(f"{score};{home};{away}\n")
+    with open(predicd_path, "w", encoding='utf-8') as file:
+        file.write("Sep=;\nDate and Time;Home team;Away team;Pwin;Pdraw;Ploss\n")
+        for game in league['source_odds']:
+            file.write(f"day;{game['home-team']};{game['away-team']};{game['wprob'] * 100:.0f};{game['dprob'] * 100:.0f};{game['lprob'] * 100:.0f}\n")
+    return wiki_path, predicd_path
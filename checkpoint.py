@@ -0,0 +1,67 @@
+#This file contains the checkpoints of long simulation runs
+#A checkpoint holds the histograms and the replicate sums of the trials done so far and the settings of the run.
+#The random streams are derived from the seed and the index of each block of trials (simulation.block_rng), so the
+#state of the random generator is the index of the next block, and a resumed run draws exactly the trials that the
+#interrupted run would have drawn. Checkpoints are written to a temporary file and renamed.
+
+import json
+import os
+
+import numpy as np
+
+from aggregation import TrialHistograms, ReplicateVariance
+
+CHECKPOINT_VERSION = 1
+
+def save_checkpoint(path, histograms, replicates, run):
+    """
+    Save a checkpoint of a run, atomically.
+
+    Args:
+        path (str): Path of the checkpoint
+        histograms (TrialHistograms): Histograms of the trials done so far
+        replicates (ReplicateVariance): Replicate sums of the same trials
+        run (dict): Settings of the run, such as its key, seed, number of trials and sampling mode, saved as json
+    """
+    arrays = {'histograms_' + key: value for key, value in histograms.arrays().items()}
+    arrays.update({'replicates_' + key: value for key, value in replicates.arrays().items()})
+    run = {**run, 'version': CHECKPOINT_VERSION, 'trials_done': histograms.trials}
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as file:
+        np.savez(file, run=np.array(json.dumps(run)), **arrays)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_path, path)
+
+def load_checkpoint(path):
+    """
+    Load a checkpoint saved with save_checkpoint.
+
+    Args:
+        path (str): Path of the checkpoint
+
+    Returns:
+        tuple: (histograms, replicates, run), None if there is no checkpoint
+
+    Raises:
+        ValueError: If the checkpoint was written by another version
+    """
+    if not os.path.isfile(path):
+        return None
+    with np.load(path) as data:
+        run = json.loads(str(data['run']))
+        if run.get('version') != CHECKPOINT_VERSION:
+            raise ValueError(f"The checkpoint {path} has version {run.get('version')}, expected {CHECKPOINT_VERSION}")
+        histograms = TrialHistograms.from_arrays({key[len('histograms_'):]: data[key] for key in data.files if key.startswith('histograms_')})
+        replicates = ReplicateVariance.from_arrays({key[len('replicates_'):]: data[key] for key in data.files if key.startswith('replicates_')})
+    return histograms, replicates, run
+
+def remove_checkpoint(path):
+    """
+    Remove the checkpoint of a finished run.
+
+    Args:
+        path (str): Path of the checkpoint
+    """
+    if os.path.isfile(path):
+        os.remove(path)
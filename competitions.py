@@ -0,0 +1,81 @@
+#This file contains the sources of each competition the scrapers know
+#The Wikipedia page of a season is built from the page names of the competition, and the predicd page from its
+#league id. predicd only shows the current season, so older seasons only have their Wikipedia matches.
+
+from urllib.parse import quote
+
+CURRENT_SEASON = "2024-25"
+
+#wiki_pages gives the page name used from each first season on, predicd_league is None if predicd has no odds
+COMPETITIONS = {
+    'champions_league': {
+        'wiki_pages': [("2000-01", "{season} UEFA Champions League group stage"),
+                       ("2024-25", "{season} UEFA Champions League league phase")],
+        'predicd_league': 4480,
+    },
+    'europa_league': {
+        'wiki_pages': [("2009-10", "{season} UEFA Europa League group stage"),
+                       ("2024-25", "{season} UEFA Europa League league phase")],
+        'predicd_league': None,
+    },
+}
+
+def season_range(last_season, count):
+    """
+    Get consecutive seasons ending with a season.
+
+    Args:
+        last_season (str): Last season, such as "2024-25"
+        count (int): Number of seasons
+
+    Returns:
+        list: Seasons from the oldest to last_season, such as ["2023-24", "2024-25"]
+    """
+    last_year = int(last_season.split("-")[0])
+    return [f"{year}-{(year + 1) % 100:02d}" for year in range(last_year - count + 1, last_year + 1)]
+
+def wiki_url(competition, season=CURRENT_SEASON):
+    """
+    Get the url of the Wikipedia page of the matches of a season.
+
+    Args:
+        competition (str): Key of COMPETITIONS
+        season (str): Season, such as "2024-25"
+
+    Returns:
+        str: Url of the page
+
+    Raises:
+        ValueError: If the competition is unknown or has no page for the season
+    """
+    if competition not in COMPETITIONS:
+        raise ValueError(f"Unknown competition {competition}")
+    page = None
+    for first_season, name in COMPETITIONS[competition]['wiki_pages']:
+        if season >= first_season:
+            page = name
+    if page is None:
+        raise ValueError(f"No Wikipedia page of {competition} for the season {season}")
+    #Wikipedia writes seasons with an en dash
+    title = page.format(season=season.replace("-", "–")).replace(" ", "_")
+    return "https://en.wikipedia.org/wiki/" + quote(title)
+
+def predicd_url(competition):
+    """
+    Get the url of the predicd page of a competition, which shows the current season.
+
+    Args:
+        competition (str): Key of COMPETITIONS
+
+    Returns:
+        str: Url of the page, None if predicd has no odds for the competition
+
+    Raises:
+        ValueError: If the competition is unknown
+    """
+    if competition not in COMPETITIONS:
+        raise ValueError(f"Unknown competition {competition}")
+    league = COMPETITIONS[competition]['predicd_league']
+    if league is None:
+        return None
+    return f"https://www.predicd.com/en/football/league/{league}/"
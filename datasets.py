@@ -0,0 +1,115 @@
+#This file contains the concurrent fetch driver of the scrapers
+#Every source of every configured competition and season is fetched at once on a bounded thread pool, with retries,
+#into a dataset directory per season: data/<competition>/<season>/wiki_matches.csv and predicd_odds.csv
+#Usage: python3 datasets.py --competitions champions_league --history 10 --workers 8
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+from competitions import COMPETITIONS, CURRENT_SEASON, predicd_url, season_range
+from fetch_predictions import fetch_predicd_win_probabilities
+from http_cache import DEFAULT_TTL
+from wiki_parser import fetch_champions_league_matches
+
+DATA_DIR = "data"
+#concurrent requests, the pooled session keeps up to 8 connections per host
+FETCH_WORKERS = 4
+FETCH_RETRIES = 3
+
+def dataset_dir(competition, season, root=DATA_DIR):
+    """
+    Get the directory of the dataset of a season.
+
+    Args:
+        competition (str): Key of competitions.COMPETITIONS
+        season (str): Season, such as "2024-25"
+        root (str): Directory of the datasets
+
+    Returns:
+        str: Directory of the dataset
+    """
+    return os.path.join(root, competition, season)
+
+def run_fetches(fetches, workers=FETCH_WORKERS):
+    """
+    Run fetches concurrently on a bounded thread pool.
+
+    Args:
+        fetches (dict): Functions without arguments returning True on success, by name
+        workers (int): Maximum number of fetches running at once
+
+    Returns:
+        dict: Result of each fetch, by name
+    """
+    if not fetches:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(workers, len(fetches))) as executor:
+        futures = {name: executor.submit(fetch) for name, fetch in fetches.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+def dataset_fetches(competitions, seasons, root=DATA_DIR, ttl=DEFAULT_TTL, refresh=False, retries=FETCH_RETRIES):
+    """
+    Get the fetches of the datasets of some seasons of some competitions.
+
+    Args:
+        competitions (list): Keys of competitions.COMPETITIONS
+        seasons (list): Seasons, such as "2024-25"
+        root (str): Directory of the datasets
+        ttl (float): Age in seconds under which a cached page is used without any request
+        refresh (bool): Revalidate the cached pages even if they are younger than ttl
+        retries (int): Number of retries of failed requests
+
+    Returns:
+        dict: Fetches for run_fetches, named "<competition>/<season>/<file>"
+    """
+    fetches = {}
+    for competition in competitions:
+        for season in seasons:
+            directory = dataset_dir(competition, season, root)
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, "wiki_matches.csv")
+            fetches[f"{competition}/{season}/wiki_matches.csv"] = lambda season=season, competition=competition, path=path: \
+                fetch_champions_league_matches(ttl, refresh, season, competition, path, retries)
+            #predicd only shows the current season
+            if season == CURRENT_SEASON and predicd_url(competition) is not None:
+                path = os.path.join(directory, "predicd_odds.csv")
+                fetches[f"{competition}/{season}/predicd_odds.csv"] = lambda competition=competition, path=path: \
+                    fetch_predicd_win_probabilities(ttl, refresh, competition, path, retries)
+    return fetches
+
+def fetch_datasets(competitions, seasons, root=DATA_DIR, workers=FETCH_WORKERS, ttl=DEFAULT_TTL, refresh=False, retries=FETCH_RETRIES):
+    """
+    Fetch the datasets of some seasons of some competitions concurrently.
+
+    Args:
+        competitions (list): Keys of competitions.COMPETITIONS
+        seasons (list): Seasons, such as "2024-25"
+        root (str): Directory of the datasets
+        workers (int): Maximum number of requests running at once
+        ttl (float): Age in seconds under which a cached page is used without any request
+        refresh (bool): Revalidate the cached pages even if they are younger than ttl
+        retries (int): Number of retries of failed requests
+
+    Returns:
+        dict: True for each file that is up to date and False for each file that could not be fetched,
+            named "<competition>/<season>/<file>"
+    """
+    return run_fetches(dataset_fetches(competitions, seasons, root, ttl, refresh, retries), workers)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch the matches and odds of several competitions and seasons")
+    parser.add_argument("--competitions", nargs="+", default=['champions_league'], choices=sorted(COMPETITIONS))
+    parser.add_argument("--seasons", nargs="+", default=[CURRENT_SEASON], help="seasons such as 2024-25")
+    parser.add_argument("--history", type=int, default=0, help="also fetch this many seasons before the last given season")
+    parser.add_argument("--root", default=DATA_DIR, help="directory of the datasets")
+    parser.add_argument("--workers", type=int, default=FETCH_WORKERS, help="maximum number of requests running at once")
+    parser.add_argument("--retries", type=int, default=FETCH_RETRIES, help="number of retries of failed requests")
+    parser.add_argument("--refresh", action="store_true", help="revalidate the cached pages")
+    parser.add_argument("--ttl", type=float, default=DEFAULT_TTL, help="age in seconds under which a cached page is reused without any request")
+    args = parser.parse_args()
+
+    seasons = sorted(set(args.seasons) | set(season_range(max(args.seasons), args.history + 1)))
+    results = fetch_datasets(args.competitions, seasons, args.root, args.workers, args.ttl, args.refresh, args.retries)
+    for name, ok in sorted(results.items()):
+        print(f"{name}: {'ok' if ok else 'failed'}")
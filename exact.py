@@ -0,0 +1,137 @@
+#This file contains an analysis of the remaining matches without Monte Carlo trials
+#The points of each team are computed exactly by convolution over its remaining fixtures. The points-only rank
+#and the points of the team at a given position are then computed by dynamic programming over the other teams,
+#treating the final points of different teams as independent, which they are not exactly since teams play each other.
+
+import numpy as np
+
+from aggregation import QUALIFICATION_POSITIONS
+from simulation import make_baseline
+
+def points_distributions(matches_list, matches_to_generate_predicd):
+    """
+    Compute the exact distribution of the final points of every team.
+
+    Args:
+        matches_list (list): List of completed matches with scores
+        matches_to_generate_predicd (list): List of future matches with predictions
+
+    Returns:
+        tuple: (team_names, pmf) where pmf[team, x] is the probability that the team finishes with x points
+    """
+    baseline = make_baseline(matches_list, matches_to_generate_predicd)
+    points = baseline['points']
+    remaining = np.zeros(len(baseline.names), dtype=int)
+    for game in matches_to_generate_predicd:
+        remaining[baseline.index[game['home-team']]] += 1
+        remaining[baseline.index[game['away-team']]] += 1
+
+    pmf = np.zeros((len(baseline.names), int((points + 3 * remaining).max()) + 1))
+    pmf[np.arange(len(baseline.names)), points] = 1
+    for game in matches_to_generate_predicd:
+        #the loss probability is what is left by wprob and dprob, as in the simulation
+        wprob, dprob = game['wprob'], game['dprob']
+        lprob = 1 - wprob - dprob
+        for team, gained in ((game['home-team'], (lprob, dprob, 0, wprob)), (game['away-team'], (wprob, dprob, 0, lprob))):
+            row = baseline.index[team]
+            pmf[row] = np.convolve(pmf[row], gained)[:pmf.shape[1]]
+    return baseline.names, pmf
+
+def _count_distribution(probabilities):
+    #Poisson binomial distribution of the number of successes of independent events, along the last axis
+    counts = np.zeros(probabilities.shape[:-1] + (probabilities.shape[-1] + 1,))
+    counts[..., 0] = 1
+    for k in range(probabilities.shape[-1]):
+        p = probabilities[..., k:k+1]
+        counts[..., 1:] = counts[..., 1:] * (1 - p) + counts[..., :-1] * p
+        counts[..., :1] = counts[..., :1] * (1 - p)
+    return counts
+
+def rank_probabilities(pmf):
+    """
+    Compute the distribution of the points-only position of every team.
+
+    Teams level on points can finish in any order, so two distributions are returned: 'best' ranks a team ahead
+    of every team level on points with it, 'worst' behind them. The real position is between the two.
+
+    Args:
+        pmf (numpy.ndarray): Points distributions as returned by points_distributions
+
+    Returns:
+        dict: Arrays 'best' and 'worst' of shape (teams, positions), [team, p - 1] is the probability
+            that the team finishes at position p
+    """
+    teams = pmf.shape[0]
+    survival = pmf[:, ::-1].cumsum(axis=1)[:, ::-1]
+    greater_equal = survival
+    greater = np.concatenate([survival[:, 1:], np.zeros((teams, 1))], axis=1)
+    ranks = {}
+    for key, above in (('best', greater), ('worst', greater_equal)):
+        distribution = np.zeros((teams, teams))
+        for team in range(teams):
+            others = np.delete(above, team, axis=0).T
+            #counts[x, k] is the probability that k other teams are above a team with x points
+            counts = _count_distribution(others)
+            distribution[team] = pmf[team] @ counts
+        ranks[key] = distribution
+    return ranks
+
+def position_points_distribution(pmf, position):
+    """
+    Compute the distribution of the points of the team finishing at a given position.
+
+    Args:
+        pmf (numpy.ndarray): Points distributions as returned by points_distributions
+        position (int): Position, 1 is first
+
+    Returns:
+        numpy.ndarray: Probability of each number of points
+    """
+    survival = pmf[:, ::-1].cumsum(axis=1)[:, ::-1]
+    #the team at the position has at least x points when at least position teams have at least x points
+    counts = _count_distribution(survival.T)
+    at_least = counts[:, position:].sum(axis=1)
+    return at_least - np.append(at_least[1:], 0)
+
+def compare_with_histograms(pmf, histograms):
+    """
+    Compare the exact analysis with the histograms of Monte Carlo trials.
+
+    Args:
+        pmf (numpy.ndarray): Points distributions as returned by points_distributions
+        histograms (TrialHistograms): Histograms of the trials, with the same teams
+
+    Returns:
+        dict: Total variation distance between the exact and Monte Carlo distributions: 'team_points' is the
+            largest over all teams, '8_position_points' and '24_position_points' are for the points at those positions,
+            if the league has them
+    """
+    def total_variation(p, counts):
+        width = max(len(p), len(counts))
+        return 0.5 * np.abs(np.pad(p, (0, width - len(p))) - np.pad(counts / histograms.trials, (0, width - len(counts)))).sum()
+
+    distances = {'team_points': max(total_variation(pmf[team], histograms.team_points[team]) for team in range(pmf.shape[0]))}
+    for position in [position for position in QUALIFICATION_POSITIONS if position <= pmf.shape[0]]:
+        distances[f'{position}_position_points'] = total_variation(position_points_distribution(pmf, position), histograms.position_points[position - 1])
+    return distances
+
+def print_exact_analysis(team_names, pmf):
+    """
+    Print the expected points, points-only top 8 and top 24 probabilities and the points at 8th and 24th positions.
+
+    Args:
+        team_names (list): Team names, in the order of the rows of pmf
+        pmf (numpy.ndarray): Points distributions as returned by points_distributions
+    """
+    ranks = rank_probabilities(pmf)
+    mean_points = pmf @ np.arange(pmf.shape[1])
+    print("Exact points distributions, positions by points only assuming independent teams, [level on points ahead, behind]")
+    for i in np.argsort(-mean_points, kind='stable'):
+        columns = []
+        for label, top in (('top 8', 8), ('top 24', 24)):
+            columns.append(f"{label}: [{ranks['best'][i, :top].sum():.3f}, {ranks['worst'][i, :top].sum():.3f}]")
+        print(f"{team_names[i]}: pt: {mean_points[i]:.2f}, " + ", ".join(columns))
+    for position in [position for position in QUALIFICATION_POSITIONS if position <= pmf.shape[0]]:
+        distribution = position_points_distribution(pmf, position)
+        points = np.nonzero(distribution > 0.001)[0]
+        print(f"{position}th position points: " + ", ".join(f"{x}: {distribution[x]:.3f}" for x in points))
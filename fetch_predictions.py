@@ -1,39 +1,69 @@
+import os
+
 import requests
-from bs4 import BeautifulSoup
+from bs4 import SoupStrainer
+
+from competitions import predicd_url
+from http_cache import fetch, DEFAULT_TTL
+from scraping import parse_html, write_csv_atomic
 
 #This script fetches the win probabilities from predicd.com
 #And writes them on a csv file called "predicd_win_probabilities.csv"
 #It exposes a function called fetch_predicd_win_probabilities for that effect
 
-def fetch_predicd_win_probabilities():
+PREDICD_ODDS_HEADER = ["Sep=;", "Date and Time;Home team;Away team;Pwin;Pdraw;Ploss"]
+
+def fetch_predicd_win_probabilities(ttl=DEFAULT_TTL, refresh=False, competition='champions_league', path='predicd_odds.csv', retries=0):
     """
     Fetch match win probabilities from predicd.com and save them to a CSV file.
 
-    Scrapes probability data for matches and writes them to 'predicd_odds.csv' in the format:
+    Scrapes probability data for the matches of the current season of the competition and writes them to path in the format:
     Sep=;
     Date and Time;Home team;Away team;Pwin;Pdraw;Ploss
 
+    The page goes through the http cache, the CSV file is only rewritten if the page changed.
+
+    Args:
+        ttl (float): Age in seconds under which the cached page is used without any request
+        refresh (bool): Revalidate the cached page even if it is younger than ttl
+        competition (str): Key of competitions.COMPETITIONS
+        path (str): Path of the csv file
+        retries (int): Number of retries of failed requests, see http_cache.fetch
+
+    Returns:
+        bool: True if the csv file is up to date, False if the page could not be fetched
+
     Raises:
         requests.RequestException: If there is an error fetching data from predicd.com
+        ValueError: If predicd has no odds for the competition
     """
-    url = "https://www.predicd.com/en/football/league/4480/"
-    response = ""
+    url = predicd_url(competition)
+    if url is None:
+        raise ValueError(f"predicd has no odds for {competition}")
     try:
         # Send GET request to the website
-        response = requests.get(url)
-        response.raise_for_status()
-        
+        text, modified = fetch(url, ttl, refresh, retries=retries)
     except requests.RequestException as e:
         print(f"Error fetching data: {e}")
-        return
-    # Write the predictions to a file for debugging
-    with open('predicd_odds.csv', 'w', encoding='utf-8') as f:
-        f.write("Sep=;\n")
-        f.write("Date and Time;Home team;Away team;Pwin;Pdraw;Ploss\n")
-        f.close()
-
-    # Parse the HTML content
-    soup = BeautifulSoup(response.text, 'html.parser')
+        return False
+    if not modified and os.path.isfile(path):
+        return True
+    write_csv_atomic(path, PREDICD_ODDS_HEADER, parse_predicd_win_probabilities(text))
+    return True
+
+def parse_predicd_win_probabilities(text, parser=None):
+    """
+    Parse the win probabilities of the predicd page, only the matchday carousel items are built.
+
+    Args:
+        text (str): Html of the page
+        parser (str, optional): BeautifulSoup parser backend, see scraping.parse_html
+
+    Returns:
+        list: Rows [date and time, home team, away team, pwin, pdraw, ploss]
+    """
+    rows = []
+    soup = parse_html(text, SoupStrainer('span', id="matchDayCarouselItem"), parser)
     daily_games_span = soup.find_all('span', id="matchDayCarouselItem")
     date_match = ""
     for daily_games in daily_games_span:
@@ -45,22 +75,21 @@ def fetch_predicd_win_probabilities():
         table = daily_games.find('tbody')
         if not table:   
             continue
-        
+
+        #get day of the matches if the matchday contains a date, it is the same for every row
+        day_match_element = daily_games.find('span', style="word-spacing: 100vw;")
+        if day_match_element:
+            date_match = day_match_element.text.strip()
+
         for tr in table.find_all('tr'):
-            #get day of match if tr element is one that contains a date
-            day_match_element = daily_games.find('span', style="word-spacing: 100vw;")
-            if day_match_element:
-                date_match = day_match_element.text.strip()
-            
             #Get the match info
             div1 = tr.find('div', class_='col-12 matchStats')
             divs_stats = tr.find_all('div', class_='col-xs-12 col-sm-6 matchStats')
 
             flag, mi = get_match_info(div1, divs_stats)
             if flag:
-                with open('predicd_odds.csv', 'a', encoding='utf-8') as f:
-                    f.write(f"{date_match};{mi['home_team']};{mi['away_team']};{mi['pwin']};{mi['pdraw']};{mi['ploss']}\n")
-                    f.close()
+                rows.append([date_match, mi['home_team'], mi['away_team'], mi['pwin'], mi['pdraw'], mi['ploss']])
+    return rows
 
 
 def get_match_info(div1, divs_stats):
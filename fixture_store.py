@@ -0,0 +1,144 @@
+#This file contains an in-memory store of the fixtures of a league
+#Fixtures are keyed by (home team, away team) and indexed by team and by matchday, with their result,
+#their odds and where the odds come from. A league plays each pairing at most once, a repeated pairing is an error
+#rather than merged, so that no match is silently dropped from the simulation.
+
+class FixtureStore:
+    """
+    Fixtures of a league with their results and odds.
+
+    Each fixture is a dictionary with the keys 'home-team', 'away-team', 'matchday', 'score' (a (home, away)
+    tuple, None if not played), 'wprob', 'dprob', 'lprob' (None if unknown) and 'source' of the odds
+    ('predicd' or 'model').
+    """
+    def __init__(self):
+        self.fixtures = {}
+        self.by_team = {}
+        self.by_matchday = {}
+
+    def __len__(self):
+        return len(self.fixtures)
+
+    def __contains__(self, key):
+        return key in self.fixtures
+
+    def __getitem__(self, key):
+        return self.fixtures[key]
+
+    def teams(self):
+        """
+        Get the names of the teams of the league.
+
+        Returns:
+            set: Team names
+        """
+        return set(self.by_team)
+
+    def add_fixture(self, home_team, away_team, score=None, matchday=None):
+        """
+        Add a fixture to the store.
+
+        Args:
+            home_team (str): Home team name
+            away_team (str): Away team name
+            score (tuple, optional): (home_score, away_score) if the match was played
+            matchday (int, optional): Matchday of the fixture, if not given every team is assumed to play once
+                per matchday in the order the fixtures are added
+
+        Returns:
+            dict: The fixture
+
+        Raises:
+            ValueError: If the store already has a fixture between these home and away teams
+        """
+        key = (home_team, away_team)
+        if key in self.fixtures:
+            raise ValueError(f"The fixture {home_team} - {away_team} appears twice, a pairing can only be played once")
+        if matchday is None:
+            matchday = max(len(self.by_team.get(home_team, ())), len(self.by_team.get(away_team, ()))) + 1
+        fixture = {'home-team': home_team, 'away-team': away_team, 'matchday': matchday, 'score': score,
+                   'wprob': None, 'dprob': None, 'lprob': None, 'source': None}
+        self.fixtures[key] = fixture
+        self.by_team.setdefault(home_team, []).append(key)
+        self.by_team.setdefault(away_team, []).append(key)
+        self.by_matchday.setdefault(matchday, []).append(key)
+        return fixture
+
+    def set_result(self, home_team, away_team, score):
+        """
+        Record the result of a fixture, for instance when a new result lands.
+
+        Args:
+            home_team (str): Home team name
+            away_team (str): Away team name
+            score (tuple): (home_score, away_score)
+        """
+        self.fixtures[(home_team, away_team)]['score'] = tuple(score)
+
+    def set_odds(self, home_team, away_team, wprob, dprob, lprob, source):
+        """
+        Record the odds of a fixture.
+
+        Args:
+            home_team (str): Home team name
+            away_team (str): Away team name
+            wprob (float): Probability of home team winning
+            dprob (float): Probability of draw
+            lprob (float): Probability of away team winning
+            source (str): Where the odds come from, 'predicd' or 'model'
+        """
+        fixture = self.fixtures[(home_team, away_team)]
+        fixture['wprob'], fixture['dprob'], fixture['lprob'] = wprob, dprob, lprob
+        fixture['source'] = source
+
+    def team_fixtures(self, team):
+        """
+        Get the fixtures of a team.
+
+        Args:
+            team (str): Team name
+
+        Returns:
+            list: Fixtures of the team
+        """
+        return [self.fixtures[key] for key in self.by_team.get(team, ())]
+
+    def matchday_fixtures(self, matchday):
+        """
+        Get the fixtures of a matchday.
+
+        Args:
+            matchday (int): Matchday
+
+        Returns:
+            list: Fixtures of the matchday
+        """
+        return [self.fixtures[key] for key in self.by_matchday.get(matchday, ())]
+
+    def played(self):
+        """
+        Get the completed matches in the format of MakeStatistics.
+
+        Returns:
+            list: Matches [hometeam, awayteam, hometeam_score, awayteam_score]
+        """
+        return [[f['home-team'], f['away-team'], f['score'][0], f['score'][1]] for f in self.fixtures.values() if f['score'] is not None]
+
+    def remaining(self):
+        """
+        Get the fixtures still to be played.
+
+        Returns:
+            list: Fixtures without score
+        """
+        return [fixture for fixture in self.fixtures.values() if fixture['score'] is None]
+
+    def remaining_predictions(self):
+        """
+        Get the fixtures still to be played with their odds, in the format of matches_to_generate_predicd.
+
+        Returns:
+            list: Dictionaries with keys 'home-team', 'away-team', 'wprob', 'dprob', 'lprob'
+        """
+        return [{'home-team': f['home-team'], 'away-team': f['away-team'], 'wprob': f['wprob'], 'dprob': f['dprob'], 'lprob': f['lprob']}
+                for f in self.remaining()]
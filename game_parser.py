@@ -1,64 +1,62 @@
 #This script parses the file wiki_matches.txt and creates a new file called wiki_matches_parsed.xml and stats.xml
 
+#Only light modules are imported here, numpy, matplotlib, requests and BeautifulSoup are imported by the
+#subcommands that need them, so that the table and the queries on saved results start quickly
+
 from statistics_and_rankings import MakeStatistics, MakeRanking
-from fetch_predictions import fetch_predicd_win_probabilities
-from wiki_parser import fetch_champions_league_matches
-from random_generators import ModelGame, get_random_result
+from random_generators import ModelGame, SAMPLING_MODES
+from fixture_store import FixtureStore
+from name_resolution import resolve_team_names, load_alias_cache, save_alias_cache, ALIAS_CACHE_FILE, LOW_CONFIDENCE
+from instrumentation import start_run, stage, RUN_REPORT_FILE
 
+import argparse
 import csv
+import json
+import math
+import signal
+import sys
 import time
-from difflib import SequenceMatcher
-import matplotlib.pyplot as plt
-import numpy as np
-import random
 import os
+import re
 
-def string_similarity(a, b):
+def parse_wiki_matches(path="wiki_matches.csv"):
     """
-    Calculate similarity ratio between two strings.
+    Parse matches from wiki_matches.csv file.
 
     Args:
-        a (str): First string
-        b (str): Second string
+        path (str): Path of the csv file
 
     Returns:
-        float: Similarity ratio between 0 and 1
-    """
-    return SequenceMatcher(None, a, b).ratio()
-
-def parse_wiki_matches():
-    """
-    Parse matches from wiki_matches.csv file.
+        FixtureStore: Fixtures of the league, with the scores of the completed matches
 
-    Returns:
-        tuple: (matches_list, matches_to_generate, set_teams_from_wiki) where:
-            - matches_list: List of completed matches with scores
-            - matches_to_generate: List of future matches without scores
-            - set_teams_from_wiki: Set of all team names from Wikipedia
+    Raises:
+        ValueError: If a fixture appears twice in the file
     """
-    matches_list = []
-    matches_to_generate = []
-    set_teams_from_wiki = set()
+    store = FixtureStore()
 
     #parse wiki_matches.csv
-    with open("wiki_matches.csv", "r", encoding='utf-8') as file:
+    with open(path, "r", encoding='utf-8') as file:
         reader = csv.reader(file, delimiter=';')
         next(reader) # skip delimiter line
         next(reader) # Skip header
         for row in reader:
-            set_teams_from_wiki.add(row[1])
-            set_teams_from_wiki.add(row[2])
-            if row[0] == "v":
-                matches_to_generate.append((row[1], row[2]))
-            else:
-                matches_list.append([row[1], row[2]] + [int(a) for a in row[0].split('–')])
+            try:
+                if row[0] == "v":
+                    store.add_fixture(row[1], row[2])
+                else:
+                    store.add_fixture(row[1], row[2], tuple(int(a) for a in row[0].split('–')))
+            except ValueError as error:
+                raise ValueError(f"{path}: {error}")
 
-    return matches_list, matches_to_generate, set_teams_from_wiki
+    return store
 
-def parse_predicd_odds():
+def parse_predicd_odds(path="predicd_odds.csv"):
     """
     Parse match odds from predicd_odds.csv file.
 
+    Args:
+        path (str): Path of the csv file
+
     Returns:
         tuple: (match_prediction_from_predicd, set_teams_from_predicd) where:
             - match_prediction_from_predicd: List of match predictions with probabilities
@@ -66,7 +64,7 @@ def parse_predicd_odds():
     """
     set_teams_from_predicd = set()
     match_predition_from_predicd = []
-    with open("predicd_odds.csv", "r", encoding='utf-8') as file:
+    with open(path, "r", encoding='utf-8') as file:
         reader = csv.reader(file, delimiter=';')
         next(reader) # skip delimiter line
         next(reader) # Skip header
@@ -104,291 +102,640 @@ def print_ranks(ranks):
     for index, rank in enumerate(ranks):
         print(f"pos = {1 + index} :: {rank['name']}, pt: {rank['points']}, gd: {rank['goals_difference']}, gf: {rank['goals_for']}, ga: {rank['goals_for_away']}")
 
-def correct_missmatched_names(set_teams_from_wiki, set_teams_from_predicd):
+def correct_missmatched_names(set_teams_from_wiki, set_teams_from_predicd, alias_cache=ALIAS_CACHE_FILE):
     """
     Match team names between Wikipedia and Predicd data using string similarity.
 
+    Known names are read from the alias cache, the other names are matched with an optimal assignment
+    of their similarities. Confident new matches are added to the cache, low confidence matches are reported.
+
     Args:
         set_teams_from_wiki (set): Set of team names from Wikipedia
         set_teams_from_predicd (set): Set of team names from Predicd
+        alias_cache (str): Path of the alias cache
 
     Returns:
         dict: Mapping of Predicd team names to Wikipedia team names
     """
-    #Generate a missmatch matrix
-    missmatch_score = {}
-    for team_wiki in set_teams_from_wiki:
-        missmatch_score[team_wiki] = {}
-        for team_predicd in set_teams_from_predicd:
-            missmatch_score[team_wiki][team_predicd] = string_similarity(team_wiki, team_predicd)
-    match_predicd_to_wiki = {}
-    
-    #Find lexicographically best matching using a greedy algorithm
-    while len(missmatch_score) > 0:
-        max_key_wiki, max_key_predicd, max_score = "", "", 0
-        for team_wiki in missmatch_score:
-            for team_predicd in missmatch_score[team_wiki]:
-                if missmatch_score[team_wiki][team_predicd] > max_score:
-                    max_score = missmatch_score[team_wiki][team_predicd]
-                    max_key_wiki = team_wiki
-                    max_key_predicd = team_predicd
-        match_predicd_to_wiki[max_key_predicd] = max_key_wiki
-        del missmatch_score[max_key_wiki]
-        for team_wiki in missmatch_score:
-            del missmatch_score[team_wiki][max_key_predicd]
-            if len(missmatch_score[team_wiki]) == 0:
-                del missmatch_score[team_wiki]
-    
+    aliases = load_alias_cache(alias_cache)
+    match_predicd_to_wiki, scores = resolve_team_names(set_teams_from_predicd, set_teams_from_wiki, aliases)
+
+    new_aliases = {}
+    for team_predicd, team_wiki in sorted(match_predicd_to_wiki.items()):
+        if scores[team_predicd] < LOW_CONFIDENCE:
+            print(f"Low confidence name match: {team_predicd} -> {team_wiki} ({scores[team_predicd]:.2f})")
+        elif aliases.get(team_predicd) != team_wiki:
+            new_aliases[team_predicd] = team_wiki
+    if new_aliases:
+        save_alias_cache({**aliases, **new_aliases}, alias_cache)
     return match_predicd_to_wiki
 
-def missing_matches(matches_to_generate, match_predition_from_predicd, team_stats):
+def missing_matches(store, team_stats):
     """
     Generate predictions for matches missing from Predicd data.
 
     Args:
-        matches_to_generate (list): List of matches needing predictions
-        match_predition_from_predicd (list): List of existing match predictions
+        store (FixtureStore): Fixtures of the league, with the Predicd odds already recorded
+        team_stats (dict): Statistics of the completed matches as generated by MakeStatistics()
+    """
+    for game in store.remaining():
+        if game['source'] is None:
+            probabilities = ModelGame(team_stats[game['home-team']], team_stats[game['away-team']])
+            store.set_odds(game['home-team'], game['away-team'], probabilities['wprob'], probabilities['dprob'], probabilities['lprob'], 'model')
 
-    Returns:
-        list: Complete list of match predictions including generated ones
-    """
-    matches_to_generate_predicd = []
-    for game in matches_to_generate:
-        game_found = False
-        for probabilities in match_predition_from_predicd:
-            if probabilities['home-team'] == game[0] and probabilities['away-team'] == game[1]:
-                matches_to_generate_predicd.append(probabilities)
-                game_found = True
-                break
-        if not game_found:
-            probabilities = ModelGame(team_stats[game[0]], team_stats[game[1]])
-            matches_to_generate_predicd.append(probabilities)
-    return matches_to_generate_predicd
-
-def create_matches_list(print_current_stats=False):
+def create_fixture_store(print_current_stats=False, wiki_path="wiki_matches.csv", predicd_path="predicd_odds.csv", alias_cache=ALIAS_CACHE_FILE):
     """
-    Create a complete list of matches combining Wikipedia and Predicd data.
+    Create the fixture store combining Wikipedia and Predicd data.
 
     Args:
         print_current_stats (bool): Whether to print current statistics
+        wiki_path (str): Path of the Wikipedia matches csv file
+        predicd_path (str): Path of the Predicd odds csv file
+        alias_cache (str): Path of the alias cache of the team names of this league
 
     Returns:
-        tuple: (matches_list, matches_to_generate_predicd) where:
-            - matches_list: List of completed matches
-            - matches_to_generate_predicd: List of future matches with predictions
+        FixtureStore: Fixtures of the league, every remaining fixture has odds
     """
     #parse wiki file
-    matches_list, matches_to_generate, set_teams_from_wiki = parse_wiki_matches()
-    stats = MakeStatistics(matches_list)
+    with stage("parse_wiki_csv"):
+        store = parse_wiki_matches(wiki_path)
+    stats = MakeStatistics(store.played())
 
     if print_current_stats:
         ranks = MakeRanking(stats)
         print_ranks(ranks)
     
     #parse predicd file
-    match_predition_from_predicd, set_teams_from_predicd = parse_predicd_odds()
+    with stage("parse_predicd_csv"):
+        match_predition_from_predicd, set_teams_from_predicd = parse_predicd_odds(predicd_path)
 
     #deal with name missmatch
-    match_predicd_to_wiki = correct_missmatched_names(set_teams_from_wiki, set_teams_from_predicd)
+    with stage("name_matching"):
+        match_predicd_to_wiki = correct_missmatched_names(store.teams(), set_teams_from_predicd, alias_cache)
     for game in match_predition_from_predicd:
-        game['home-team'] = match_predicd_to_wiki[game['home-team']]
-        game['away-team'] = match_predicd_to_wiki[game['away-team']]
+        key = (match_predicd_to_wiki[game['home-team']], match_predicd_to_wiki[game['away-team']])
+        if key in store and store[key]['score'] is None:
+            store.set_odds(*key, game['wprob'], game['dprob'], game['lprob'], 'predicd')
 
     #get missing matches
-    matches_to_generate_predicd = missing_matches(matches_to_generate, match_predition_from_predicd, stats)
+    with stage("missing_matches"):
+        missing_matches(store, stats)
 
-    return matches_list, matches_to_generate_predicd
+    return store
 
-def create_rank_statistics(results_list):
-    stats_tracked = {}
-    ranks = get_ranks(results_list)
-    for index, rank in enumerate(ranks):
-        stats_tracked[rank['name'] + "_points"] = rank['points']
-        stats_tracked[rank['name'] + "_goaldifference"] = rank['goals_difference']
-        stats_tracked[rank['name'] + "_position"] = index + 1
-    for i in range(1, len(ranks)+1):
-        stats_tracked[str(i) + "_position_points"] = ranks[i-1]['points']
-        stats_tracked[str(i) + "_position_goaldifference"] = ranks[i-1]['goals_difference']
-    return stats_tracked
+def create_matches_list(print_current_stats=False, wiki_path="wiki_matches.csv", predicd_path="predicd_odds.csv", alias_cache=ALIAS_CACHE_FILE):
+    """
+    Create a complete list of matches combining Wikipedia and Predicd data.
 
-def write_stats_to_file(statistics_to_track):
+    Args:
+        print_current_stats (bool): Whether to print current statistics
+        wiki_path (str): Path of the Wikipedia matches csv file
+        predicd_path (str): Path of the Predicd odds csv file
+        alias_cache (str): Path of the alias cache of the team names of this league
+
+    Returns:
+        tuple: (matches_list, matches_to_generate_predicd) where:
+            - matches_list: List of completed matches
+            - matches_to_generate_predicd: List of future matches with predictions
     """
-    Write statistics to a CSV file.
+    store = create_fixture_store(print_current_stats, wiki_path, predicd_path, alias_cache)
+    return store.played(), store.remaining_predictions()
+
+INPUT_FILES = ["wiki_matches.csv", "predicd_odds.csv"]
+HISTOGRAMS_FILE = "histograms.npz"
+SUMMARY_FILE = "summary.json"
+CHECKPOINT_FILE = "checkpoint.npz"
+#seconds of simulation between two checkpoints
+CHECKPOINT_INTERVAL = 60
+SUMMARY_LABELS = {'first': '1st', 'top_8': 'top 8', 'top_24': 'top 24', 'last': 'last'}
+
+def results_summary(histograms, seed=None, sampling='plain', variance_reduction=None):
     """
-    with open("statistics.csv", "w", encoding='utf-8') as file:
-        writer = csv.writer(file, delimiter=';')
-        writer.writerow(statistics_to_track[0].keys())
-        for stat in statistics_to_track:
-            writer.writerow(stat.values())
-    return
+    Convert the histograms of the trials into a summary that can be saved as json and queried without numpy.
 
-def save_plot_pictures(statistics_to_track):
+    Args:
+        histograms (TrialHistograms): Histograms of the trials
+        seed (int, optional): Seed of the run
+        sampling (str): Sampling mode of the trials
+        variance_reduction (dict, optional): Measured variance reduction, as returned by
+            aggregation.ReplicateVariance.variance_reduction
+
+    Returns:
+        dict: 'trials', 'seed', 'sampling', 'confidence_z', 'team_names', 'mean_points' of each team,
+            'position_counts' the number of trials each team finished at each position and 'variance_reduction'
+            the pooled and per team reduction of each tracked probability, None where it is not measured
     """
-    Save plot pictures of statistics using matplotlib.
+    import numpy as np
+    from aggregation import CONFIDENCE_Z
+    mean_points = histograms.team_points @ np.arange(histograms.team_points.shape[1]) / histograms.trials
+    if variance_reduction is not None:
+        #nan is not valid json
+        variance_reduction = {key: {'pooled': _finite_or_none(value['pooled']), 'teams': [_finite_or_none(x) for x in value['teams'].tolist()]}
+                              for key, value in variance_reduction.items()}
+    return {'trials': int(histograms.trials), 'seed': seed, 'sampling': sampling, 'confidence_z': CONFIDENCE_Z, 'team_names': list(histograms.team_names),
+            'mean_points': mean_points.tolist(), 'position_counts': histograms.position.tolist(), 'variance_reduction': variance_reduction}
+
+def _finite_or_none(value):
+    return value if math.isfinite(value) else None
+
+def print_variance_reduction(summary):
     """
+    Print the measured variance reduction of the sampling mode against plain Monte Carlo, pooled over the teams.
 
-    #get list of classifications
-    
-    teams = [key.split('_')[0] for key in statistics_to_track[0].keys() if key.endswith('_position')]
-    classifications = set()
-    for team in teams:
-        for stat in statistics_to_track:
-            classifications.add(stat[f'{team}_position'])
-    classifications = sorted(list(classifications))
-    
-    plot_position_distribution(statistics_to_track, classifications, teams)
-    plot_8th_and_24th_position_distribution(statistics_to_track)
-    plot_probability_first_position(statistics_to_track, teams)
-    plot_probability_last_position(statistics_to_track, teams)
-    return
-
-def plot_probability_first_position(statistics_to_track, teams):
-    # Create figure and axis
-    plt.figure(figsize=(12, 8))
-    positions = {team: [stat[f'{team}_position'] for stat in statistics_to_track] for team in teams}
-    position_distributions = {team:positions[team].count(1)/len(positions[team]) for team in teams}
-    # Create bar chart
-    plt.bar(position_distributions.keys(), position_distributions.values())
-    
-    # Customize the plot
-    plt.title('Probability of Teams Finishing in First Position')
-    plt.xlabel('Teams')
-    plt.ylabel('Probability')
-    
-    # Rotate x-axis labels for better readability
-    plt.xticks(rotation=45, ha='right')
-    
-    # Adjust layout to prevent label cutoff
-    plt.tight_layout()
-    
-    # Save the plot
-    plt.savefig('first_position_probability.png', bbox_inches='tight', dpi=900)
-    plt.close()
-    return
-
-def plot_probability_last_position(statistics_to_track, teams):
-    # Create figure and axis
-    plt.figure(figsize=(12, 8))
-    positions = {team: [stat[f'{team}_position'] for stat in statistics_to_track] for team in teams}
-    position_distributions = {team:positions[team].count(36)/len(positions[team]) for team in teams}
-    # Create bar chart
-    plt.bar(position_distributions.keys(), position_distributions.values())
-    
-    # Customize the plot
-    plt.title('Probability of Teams Finishing in Last Position')
-    plt.xlabel('Teams')
-    plt.ylabel('Probability')
-    
-    # Rotate x-axis labels for better readability
-    plt.xticks(rotation=45, ha='right')
-    
-    # Adjust layout to prevent label cutoff
-    plt.tight_layout()
-    
-    # Save the plot
-    plt.savefig('last_position_probability.png', bbox_inches='tight', dpi=900)
-    plt.close()
-    return
-
-def plot_position_distribution(statistics_to_track, classifications, all_teams):
-    # Create figure and axis
-    plt.figure(figsize=(12, 8))
-
-    teams = random.sample(all_teams, 8)
-    positions = {team: [stat[f'{team}_position'] for stat in statistics_to_track] for team in teams}
-    position_distributions = {team:[positions[team].count(i)/len(positions[team]) for i in classifications] for team in teams}
-    
+    Args:
+        summary (dict): Summary as returned by results_summary
+    """
+    reduction = summary.get('variance_reduction')
+    if not reduction or summary.get('sampling', 'plain') == 'plain':
+        return
+    values = [f"{SUMMARY_LABELS[key]}: x{value['pooled']:.2f}" if value['pooled'] is not None else f"{SUMMARY_LABELS[key]}: -"
+              for key, value in reduction.items()]
+    print(f"Variance reduction of {summary['sampling']} sampling against plain Monte Carlo: " + ", ".join(values))
+
+def summary_probabilities(summary, first, last):
+    """
+    Get the probability of each team to finish between two positions, with the half width of its Wilson
+    confidence interval, computed as aggregation.wilson_half_width.
 
-    x = np.arange(len(classifications))  # the label locations
-    width = 1/(len(teams) + 1)  # the width of the bars
-    multiplier = 0
-
-    fig, ax = plt.subplots(layout='constrained')
-
-    for attribute, measurement in position_distributions.items():
-        offset = width * multiplier
-        rects = ax.bar(x + offset, measurement, width, label=attribute)
-        #ax.bar_label(rects, padding=3)
-        multiplier += 1
-
-    # Add some text for labels, title and custom x-axis tick labels, etc.
-    ax.set_ylabel('Probability')
-    ax.set_xlabel('Classification', fontsize=8)
-    ax.set_title('Classification of teams in champions league\n Distribution of classification of teams over Monte Carlo trials', fontsize=10, y=1.05)
-    ax.set_xticks(x + width, classifications, fontsize=4)
-    ax.legend(loc='upper left', ncols=4, fontsize=7)
-    ax.set_ylim(0, 1)
-
-    # Add vertical lines at 8.5 and 24.5
-    ax.axvline(x=8.5, color='black', linestyle='-', linewidth=1)
-    ax.axvline(x=24.5, color='black', linestyle='-', linewidth=1)
-    
-    # Save the bar plot
-    plt.savefig('position_distribution.png', bbox_inches='tight', dpi=900)
-    plt.close()
-    return
-
-def plot_8th_and_24th_position_distribution(statistics_to_track):
-    # Create figure and axis
-    plt.figure(figsize=(12, 8))
+    Args:
+        summary (dict): Summary as returned by results_summary
+        first (int): Best position, 1 is first
+        last (int): Worst position
+
+    Returns:
+        list: (probability, error) of each team
+    """
+    n, z = summary['trials'], summary['confidence_z']
+    values = []
+    for counts in summary['position_counts']:
+        p = sum(counts[first - 1:last]) / n
+        values.append((p, z / (1 + z**2 / n) * math.sqrt(p * (1 - p) / n + z**2 / (4 * n**2))))
+    return values
+
+def summary_columns(summary, positions=(), tops=()):
+    """
+    Get the probabilities printed for each team: first, top 8, top 24 and last, and any other positions or top N.
+
+    Args:
+        summary (dict): Summary as returned by results_summary
+        positions (list): Positions whose probability is added
+        tops (list): N of the top N probabilities that are added
+
+    Returns:
+        dict: (probability, error) of each team, by column label
+    """
+    teams = len(summary['team_names'])
+    columns = {SUMMARY_LABELS['first']: summary_probabilities(summary, 1, 1),
+               SUMMARY_LABELS['top_8']: summary_probabilities(summary, 1, 8),
+               SUMMARY_LABELS['top_24']: summary_probabilities(summary, 1, 24),
+               SUMMARY_LABELS['last']: summary_probabilities(summary, teams, teams)}
+    for position in positions:
+        columns[f"pos {position}"] = summary_probabilities(summary, position, position)
+    for top in tops:
+        columns[f"top {top}"] = summary_probabilities(summary, 1, top)
+    return columns
+
+def print_summary(summary, teams=None, positions=(), tops=()):
+    """
+    Print the probability of each team to finish first, in the top 8, in the top 24 and last.
+
+    Args:
+        summary (dict): Summary as returned by results_summary
+        teams (list, optional): Teams to print, all teams if not given
+        positions (list): Positions whose probability is also printed
+        tops (list): N of the top N probabilities that are also printed
+    """
+    columns = summary_columns(summary, positions, tops)
+    names = summary['team_names']
+    print(f"{summary['trials']} trials, 95% confidence intervals")
+    for i in sorted(range(len(names)), key=lambda i: -summary['mean_points'][i]):
+        if teams is None or names[i] in teams:
+            values = [f"{label}: {column[i][0]:.3f} ± {column[i][1]:.3f}" for label, column in columns.items()]
+            print(f"{names[i]}: pt: {summary['mean_points'][i]:.2f}, " + ", ".join(values))
+
+def summary_rows(summary, teams=None, positions=(), tops=(), change=None):
+    """
+    Get the probabilities of some teams as a json document.
+
+    Args:
+        summary (dict): Summary as returned by results_summary
+        teams (list, optional): Teams of the rows, all teams if not given
+        positions (list): Positions whose probability is added
+        tops (list): N of the top N probabilities that are added
+        change (dict, optional): Comparison of a scenario as returned by scenarios.WarmTrials.compare
+
+    Returns:
+        dict: 'trials', 'seed' and 'teams' the row of each team, with the change of a scenario if given
+    """
+    columns = summary_columns(summary, positions, tops)
+    rows = [{'team': name, 'mean_points': summary['mean_points'][i],
+             **{label: {'probability': column[i][0], 'error': column[i][1]} for label, column in columns.items()}}
+            for i, name in enumerate(summary['team_names']) if teams is None or name in teams]
+    result = {'trials': summary['trials'], 'seed': summary['seed'], 'teams': rows}
+    if change is not None:
+        for row in rows:
+            i = summary['team_names'].index(row['team'])
+            row['change'] = {SUMMARY_LABELS[key]: {'difference': float(value['difference'][i]), 'error': float(value['error'][i])}
+                             for key, value in change.items()}
+        result['common_random_numbers_variance_reduction'] = {SUMMARY_LABELS[key]: _finite_or_none(value['pooled']) for key, value in change.items()}
+    return result
+
+def print_scenario_change(change, team_names, teams=None):
+    """
+    Print the change of the tracked probabilities of a scenario against the trials without pins, for the teams
+    whose probabilities change, and the variance reduction of measuring it on the same trials.
+
+    Args:
+        change (dict): Comparison as returned by scenarios.WarmTrials.compare
+        team_names (list): Team names
+        teams (list, optional): Teams to print, all teams if not given
+    """
+    values = [f"{SUMMARY_LABELS[key]}: x{value['pooled']:.1f}" for key, value in change.items() if math.isfinite(value['pooled'])]
+    print("Change against the trials without pins" + (", variance reduction of the common random numbers against independent runs: " + ", ".join(values) if values else ""))
+    for i, name in enumerate(team_names):
+        if (teams is None or name in teams) and any(value['difference'][i] != 0 for value in change.values()):
+            print(f"{name}: " + ", ".join(f"{SUMMARY_LABELS[key]}: {value['difference'][i]:+.3f} ± {value['error'][i]:.3f}" for key, value in change.items()))
+
+def find_team(name, team_names):
+    """
+    Find a team from its exact name or from a case insensitive part of its name.
+
+    Args:
+        name (str): Name or part of the name
+        team_names (list): Team names
+
+    Returns:
+        str: Team name
+
+    Raises:
+        ValueError: If no team or several teams match
+    """
+    if name in team_names:
+        return name
+    found = [team for team in team_names if name.lower() in team.lower()]
+    if len(found) != 1:
+        raise ValueError(f"{name} matches {len(found)} teams" + (f": {', '.join(found)}" if found else ""))
+    return found[0]
+
+def parse_pins(pins, team_names, fixtures):
+    """
+    Parse the pinned results of a what-if scenario.
+
+    Args:
+        pins (list): Pins HOME:AWAY=RESULT, where the teams are names or parts of names and the result is W, D, L,
+            in any case, or a score such as 2-1
+        team_names (list): Team names
+        fixtures (list): Remaining fixtures (hometeam, awayteam), the only fixtures that can be pinned
+
+    Returns:
+        dict: Result of each pinned fixture (hometeam, awayteam), as for scenarios.WarmTrials.evaluate
+
+    Raises:
+        ValueError: If a pin is malformed, a team is not found or the fixture is not a remaining fixture
+    """
+    from scenarios import OUTCOMES
+    remaining = set(fixtures)
+    parsed = {}
+    for pin in pins:
+        if "=" not in pin or ":" not in pin.rsplit("=", 1)[0]:
+            raise ValueError(f"Malformed pin {pin}, expected HOME:AWAY=RESULT")
+        fixture, result = pin.rsplit("=", 1)
+        home, away = fixture.split(":", 1)
+        fixture = (find_team(home, team_names), find_team(away, team_names))
+        if fixture not in remaining:
+            reverse = f", {fixture[1]}:{fixture[0]} is" if fixture[::-1] in remaining else ""
+            raise ValueError(f"{fixture[0]}:{fixture[1]} is not a remaining fixture, it was played or does not exist{reverse}")
+        score = re.fullmatch(r"\s*(\d+)\s*-\s*(\d+)\s*", result)
+        if score is not None:
+            parsed[fixture] = (int(score[1]), int(score[2]))
+        elif result.strip().upper() in OUTCOMES:
+            parsed[fixture] = result.strip().upper()
+        else:
+            raise ValueError(f"Malformed result {result} of the pin {pin}, expected one of {', '.join(OUTCOMES)} or a score such as 2-1")
+    return parsed
+
+def fetch_inputs(ttl=None, refresh=False, files=INPUT_FILES):
+    """
+    Fetch the input files that are missing, or all of them if refresh is set, both pages at once.
+
+    Args:
+        ttl (float, optional): Age in seconds under which a fetched page is reused without any request
+        refresh (bool): Fetch the files even if they exist, revalidating the cached pages even if they are younger than ttl
+        files (list): Input files needed
+    """
+    fetched = [path for path in files if refresh or not os.path.isfile(path)]
+    if not fetched:
+        return
+    from datasets import run_fetches
+    from http_cache import DEFAULT_TTL
+    ttl = DEFAULT_TTL if ttl is None else ttl
+    fetches = {}
+    if "wiki_matches.csv" in fetched:
+        from wiki_parser import fetch_champions_league_matches
+        fetches["wiki_matches.csv"] = lambda: fetch_champions_league_matches(ttl, refresh)
+    if "predicd_odds.csv" in fetched:
+        from fetch_predictions import fetch_predicd_win_probabilities
+        fetches["predicd_odds.csv"] = lambda: fetch_predicd_win_probabilities(ttl, refresh)
+    run_fetches(fetches)
+
+def command_fetch(args):
+    #fetch both pages, the http cache only downloads the pages that changed
+    with stage("fetch"):
+        fetch_inputs(args.ttl, refresh=True)
+
+def command_table(args):
+    fetch_inputs(args.ttl, args.refresh, ["wiki_matches.csv"])
+    print_ranks(get_ranks(parse_wiki_matches().played()))
+
+def command_simulate(args, report):
+    """
+    Simulate the remaining matches, save the trial store, the histograms and their summary and print the summary.
+
+    Args:
+        args (argparse.Namespace): Options of the simulate or run subcommand
+        report (RunReport): Report of the run
+
+    Returns:
+        TrialHistograms: Histograms of the trials
+    """
+    import numpy as np
+    from aggregation import TrialHistograms, ReplicateVariance
+    from checkpoint import save_checkpoint, load_checkpoint, remove_checkpoint
+    from result_cache import ResultCache, result_key, usable_trials
+    from simulation import simulate, get_team_names, REPLICATE_SIZE, BATCH_SIZE
+    from trial_store import resume_trial_store, open_trial_store, export_csv
+
+    with stage("fetch"):
+        fetch_inputs(args.ttl, args.refresh)
+    with stage("create_matches_list"):
+        matches_list, matches_to_generate_predicd = create_matches_list()
+
+    resumed = None
+    if args.resume:
+        resumed = load_checkpoint(args.checkpoint)
+        if resumed is None:
+            sys.exit(f"No checkpoint {args.checkpoint} to resume from")
+        #the settings of the interrupted run are restored, so that the resumed run ends where it would have ended
+        checkpoint_run = resumed[2]
+        args.trials, args.seed, args.sampling = checkpoint_run['trials'], checkpoint_run['seed'], checkpoint_run['sampling']
+        args.precision, args.time_budget = checkpoint_run['precision'], checkpoint_run['time_budget']
     
-    max_points = max([stat['8_position_points'] for stat in statistics_to_track])
-    min_points = min([stat['24_position_points'] for stat in statistics_to_track])
-
-    position_distributions = {"8th position points": [[stat['8_position_points'] for stat in statistics_to_track].count(i)/len(statistics_to_track) for i in range(min_points, max_points + 1)],
-                             "24th position points": [[stat['24_position_points'] for stat in statistics_to_track].count(i)/len(statistics_to_track) for i in range(min_points, max_points + 1)]}
-
-    x = np.arange(min_points, max_points+1)  # the label locations
-    width = 1/(2 + 1)  # the width of the bars
-    multiplier = 0
-
-    fig, ax = plt.subplots(layout='constrained')
-    for attribute, measurement in position_distributions.items():
-        offset = width * multiplier
-        rects = ax.bar([a + offset for a in x], measurement, width, label=attribute)
-        #ax.bar_label(rects, padding=3)
-        multiplier += 1
-
-    # Add some text for labels, title and custom x-axis tick labels, etc.
-    ax.set_ylabel('Probability')
-    ax.set_xlabel('Number of points of team at given position', fontsize=12)
-    ax.set_title('Distribution of number of points of teams at 8th and 24th position over Monte Carlo trials', fontsize=10, y=1.05)
-    ax.set_xticks(x + width, x, fontsize=10)
-    ax.legend(loc='upper left')
-    ax.set_ylim(0, 1)
+    if args.exact:
+        from exact import points_distributions, print_exact_analysis, compare_with_histograms
+        with stage("exact"):
+            exact_team_names, exact_pmf = points_distributions(matches_list, matches_to_generate_predicd)
+            print_exact_analysis(exact_team_names, exact_pmf)
+
+    adaptive = args.precision is not None or args.time_budget is not None
+    TRIAL_NUMBER = args.trials if args.trials is not None or adaptive else 10000
+    seed = args.seed if args.seed is not None else np.random.SeedSequence().entropy
+    print("Seed: ", seed)
     
-    # Save the bar plot
-    plt.savefig('8th_and_24th_position_distribution.png', bbox_inches='tight', dpi=900)
-    plt.close()
-    return
+    team_names = get_team_names(matches_list, matches_to_generate_predicd)
+    histograms = TrialHistograms(team_names)
+    #the variance between replicates of the trials measures the variance reduction of the sampling mode
+    replicates = ReplicateVariance(team_names, REPLICATE_SIZE)
+
+    run_key = result_key(matches_list, matches_to_generate_predicd, seed, sampling=args.sampling)
+    simulation_seconds = 0.0
+
+    #Seeded runs with a fixed number of trials are cached, a cached run with fewer trials is topped up
+    use_cache = args.seed is not None and not adaptive and not args.no_cache
+    first_trial = 0
+    if use_cache:
+        cache = ResultCache()
+        cache_key = run_key
+    if resumed is not None:
+        if checkpoint_run['key'] != run_key:
+            sys.exit(f"The matches or the odds changed since the checkpoint {args.checkpoint} was saved, it cannot be resumed")
+        histograms, replicates = resumed[0], resumed[1]
+        first_trial = histograms.trials
+        simulation_seconds = checkpoint_run['simulation_seconds']
+        print(f"Resuming from the checkpoint at {first_trial} trials")
+    elif use_cache:
+        cached = cache.get(cache_key)
+        first_trial = usable_trials(cached, TRIAL_NUMBER)
+        if first_trial > 0:
+            histograms = cached
+            print(f"{first_trial} trials from the cache")
+
+    store_written = False
+    if TRIAL_NUMBER is None or first_trial < TRIAL_NUMBER:
+        #Save statistics to the trial store while the trials run, only the histograms are kept in memory
+        store = resume_trial_store("statistics", team_names, seed, INPUT_FILES, first_trial, run_key)
+        if store is None:
+            print(f"The trial store statistics does not hold the trials {'of the checkpoint' if resumed is not None else 'from the cache'}, it is not updated")
+        #an interrupted run saves a checkpoint after its current batch, the workers leave the interrupts to this process
+        interrupted, stopped = [], False
+        handlers = {signum: signal.signal(signum, lambda signum, frame: interrupted.append(signum)) for signum in (signal.SIGINT, signal.SIGTERM)}
+        with stage("simulation"):
+            #the time budget counts the simulation time before the checkpoint
+            simulation_begin_time = time.time() - simulation_seconds
+            checkpoint_time = time.time()
+            batches = simulate(matches_list, matches_to_generate_predicd, TRIAL_NUMBER, seed, workers=args.workers,
+                               first_trial=first_trial, sampling=args.sampling)
+            batch_begin_time = time.perf_counter()
+            try:
+                for batch in batches:
+                    if store is not None:
+                        store_begin_time = time.perf_counter()
+                        store.append(batch)
+                        report.add_time("trial_store_write", time.perf_counter() - store_begin_time)
+                    histograms.update(batch)
+                    replicates.update(batch)
+                    report.record_batch(len(batch['position']), time.perf_counter() - batch_begin_time)
+                    batch_begin_time = time.perf_counter()
+                    #in adaptive mode, stop as soon as the target precision or the time budget is reached
+                    if args.precision is not None and histograms.max_error() <= args.precision:
+                        break
+                    if args.time_budget is not None and time.time() - simulation_begin_time >= args.time_budget:
+                        break
+                    #nothing is left to resume after the last batch
+                    if TRIAL_NUMBER is not None and histograms.trials >= TRIAL_NUMBER:
+                        break
+                    if interrupted or (args.checkpoint_interval > 0 and time.time() - checkpoint_time >= args.checkpoint_interval):
+                        with stage("checkpoint"):
+                            save_checkpoint(args.checkpoint, histograms, replicates, {
+                                'key': run_key, 'seed': int(seed), 'trials': TRIAL_NUMBER, 'sampling': args.sampling,
+                                'precision': args.precision, 'time_budget': args.time_budget, 'batch_size': BATCH_SIZE,
+                                'next_block': histograms.trials // BATCH_SIZE, 'simulation_seconds': time.time() - simulation_begin_time})
+                        checkpoint_time = time.time()
+                    if interrupted:
+                        stopped = True
+                        break
+            finally:
+                batches.close()
+                if store is not None:
+                    store.close()
+                for signum, handler in handlers.items():
+                    signal.signal(signum, handler)
+        if stopped:
+            sys.exit(f"Interrupted at {histograms.trials} trials, the checkpoint {args.checkpoint} is saved, continue with --resume")
+        remove_checkpoint(args.checkpoint)
+        store_written = store is not None
+        if use_cache:
+            with stage("cache_write"):
+                cache.put(cache_key, histograms)
+    if args.csv and not store_written:
+        #the store on disk may be from another run, with another seed or other inputs
+        print("The trial store statistics was not written by this run, it is not exported, run with --no-cache to write it")
+    elif args.csv:
+        with stage("csv_export"):
+            export_csv(open_trial_store("statistics"), "statistics.csv")
+
+    #save the results for the plot and query subcommands
+    summary = results_summary(histograms, int(seed), args.sampling, replicates.variance_reduction())
+    histograms.save(HISTOGRAMS_FILE)
+    with open(SUMMARY_FILE + ".tmp", "w", encoding='utf-8') as file:
+        json.dump(summary, file)
+    os.replace(SUMMARY_FILE + ".tmp", SUMMARY_FILE)
+
+    print_summary(summary)
+    print_variance_reduction(summary)
+    if args.exact:
+        distances = compare_with_histograms(exact_pmf, histograms)
+        print("Total variation distance between exact and Monte Carlo distributions: " + ", ".join(f"{key}: {value:.4f}" for key, value in distances.items()))
+    return histograms
+
+def command_plot(args, histograms=None):
+    """
+    Create and save the plot pictures.
+
+    Args:
+        args (argparse.Namespace): Options of the plot or run subcommand
+        histograms (TrialHistograms, optional): Histograms of the trials, read from the histograms file if not given
+    """
+    from plots import save_plot_pictures, DEFAULT_DPI, PREVIEW_DPI
+    if histograms is None:
+        from aggregation import TrialHistograms
+        histograms = TrialHistograms.load(HISTOGRAMS_FILE)
+    dpi = args.dpi if args.dpi is not None else (PREVIEW_DPI if args.preview else DEFAULT_DPI)
+    with stage("plots"):
+        save_plot_pictures(histograms, dpi=dpi, image_format=args.format)
+
+def command_query(args):
+    """
+    Print the probabilities of some teams from the saved summary, or from a what-if scenario if results are pinned.
+
+    Args:
+        args (argparse.Namespace): Options of the query subcommand
+    """
+    summary, change = None, None
+    if os.path.isfile(SUMMARY_FILE):
+        with open(SUMMARY_FILE, "r", encoding='utf-8') as file:
+            summary = json.load(file)
+    if args.pin:
+        #what-if scenarios run the trials again, with the seed and number of trials of the saved results by default
+        from scenarios import WarmTrials
+        matches_list, matches_to_generate_predicd = create_matches_list()
+        from simulation import get_team_names
+        team_names = get_team_names(matches_list, matches_to_generate_predicd)
+        seed = args.seed if args.seed is not None else (summary['seed'] if summary else 0)
+        trials = args.trials if args.trials is not None else (summary['trials'] if summary else 10000)
+        sampling = args.sampling or (summary.get('sampling', 'plain') if summary else 'plain')
+        try:
+            pins = parse_pins(args.pin, team_names, [(game['home-team'], game['away-team']) for game in matches_to_generate_predicd])
+        except ValueError as error:
+            sys.exit(str(error))
+        warm_trials = WarmTrials(matches_list, matches_to_generate_predicd, trials, seed, sampling=sampling)
+        summary = results_summary(warm_trials.evaluate(pins), seed, sampling)
+        #the change against the unpinned scenario is measured on the same trials
+        change = warm_trials.compare(pins)
+    if summary is None:
+        sys.exit(f"No saved results in {SUMMARY_FILE}, run the simulate subcommand first")
+    teams = [find_team(name, summary['team_names']) for name in args.teams] if args.teams else None
+    if not args.json:
+        print_summary(summary, teams, args.position, args.top)
+        if change is not None:
+            print_scenario_change(change, summary['team_names'], teams)
+        return
+    print(json.dumps(summary_rows(summary, teams, args.position, args.top, change), indent=1))
+
+SUBCOMMANDS = ('run', 'fetch', 'table', 'simulate', 'plot', 'query', 'serve')
+
+def build_parser():
+    """
+    Build the parser of the command line, with one subcommand per stage of the pipeline.
+
+    Returns:
+        argparse.ArgumentParser: Parser of the command line
+    """
+    fetch_options = argparse.ArgumentParser(add_help=False)
+    fetch_options.add_argument("--refresh", action="store_true", help="fetch the pages again, only changed pages are downloaded and parsed again")
+    fetch_options.add_argument("--ttl", type=float, default=None, help="age in seconds under which a fetched page is reused without any request, 15 minutes by default")
+
+    simulation_options = argparse.ArgumentParser(add_help=False)
+    simulation_options.add_argument("--trials", type=int, default=None, help="number of Monte Carlo trials, 10000 by default, at most this many trials in adaptive mode")
+    simulation_options.add_argument("--precision", type=float, default=None, help="adaptive mode, stop when every 95%% confidence interval of P(1st), P(top 8), P(top 24) and P(last) is within ± this value")
+    simulation_options.add_argument("--time-budget", type=float, default=None, help="adaptive mode, stop after this many seconds of simulation")
+    simulation_options.add_argument("--seed", type=int, default=None, help="seed of the random generator, random if not given")
+    simulation_options.add_argument("--workers", type=int, default=1, help="number of processes running the trials")
+    simulation_options.add_argument("--no-cache", action="store_true", help="do not read or write the cache of results of seeded runs")
+    simulation_options.add_argument("--exact", action="store_true", help="print the exact points analysis and compare it with the trials")
+    simulation_options.add_argument("--sampling", default="plain", choices=SAMPLING_MODES, help="variance reduction mode of the trials, sobol needs scipy, the measured variance reduction against plain Monte Carlo is printed")
+    simulation_options.add_argument("--checkpoint", default=CHECKPOINT_FILE, help="checkpoint of the run, saved periodically and when the run is interrupted, removed when the run ends")
+    simulation_options.add_argument("--checkpoint-interval", type=float, default=CHECKPOINT_INTERVAL, help="seconds of simulation between two checkpoints, 0 to only save a checkpoint when interrupted")
+    simulation_options.add_argument("--resume", action="store_true", help="continue the interrupted run of the checkpoint, with its seed, number of trials, sampling mode and adaptive settings, the results are the same as without interruption")
+    simulation_options.add_argument("--csv", action="store_true", help="also export the trials to statistics.csv")
+
+    plot_options = argparse.ArgumentParser(add_help=False)
+    plot_options.add_argument("--preview", action="store_true", help="render the plots quickly at a low resolution")
+    plot_options.add_argument("--dpi", type=int, default=None, help="resolution of the plots, 900 dpi by default")
+    plot_options.add_argument("--format", default="png", help="format of the plots, such as png, svg or pdf")
+
+    report_options = argparse.ArgumentParser(add_help=False)
+    report_options.add_argument("--profile", default=None, metavar="STAGE", help="save a cProfile profile of a stage of the run report, such as simulation or create_matches_list/name_matching, the work of the worker processes is not profiled")
+    report_options.add_argument("--trace-memory", action="store_true", help="measure the peak memory of each stage with tracemalloc, slower")
+
+    parser = argparse.ArgumentParser(description="Monte Carlo simulation of the champions league table, the run subcommand is the default")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("run", parents=[fetch_options, simulation_options, plot_options, report_options], help="fetch the missing inputs, simulate and plot")
+    subparsers.add_parser("fetch", parents=[fetch_options], help="fetch the matches and the odds")
+    subparsers.add_parser("table", parents=[fetch_options], help="print the table of the completed matches")
+    subparsers.add_parser("simulate", parents=[fetch_options, simulation_options, report_options], help="simulate and save the results without plotting")
+    subparsers.add_parser("plot", parents=[plot_options, report_options], help=f"plot the results saved in {HISTOGRAMS_FILE}")
+    query = subparsers.add_parser("query", help=f"print the probabilities of some teams from the results saved in {SUMMARY_FILE}")
+    query.add_argument("teams", nargs="*", help="teams to print, by name or part of the name, all teams if not given")
+    query.add_argument("--position", type=int, action="append", default=[], help="also print the probability to finish at this position")
+    query.add_argument("--top", type=int, action="append", default=[], help="also print the probability to finish in the top N")
+    query.add_argument("--pin", action="append", default=[], metavar="HOME:AWAY=RESULT", help="what-if scenario, fix the result of a remaining match to W, D, L or a score such as 2-1, runs the trials again")
+    query.add_argument("--seed", type=int, default=None, help="seed of the scenario trials, the seed of the saved results by default")
+    query.add_argument("--trials", type=int, default=None, help="number of scenario trials, the number of saved trials by default")
+    query.add_argument("--sampling", default=None, choices=SAMPLING_MODES, help="sampling mode of the scenario trials, the mode of the saved results by default")
+    query.add_argument("--json", action="store_true", help="print the probabilities as json")
+    serve = subparsers.add_parser("serve", help="keep the fixtures and warm trials in memory and answer json queries over a local port or unix socket, see service.py")
+    serve.add_argument("--port", type=int, default=8765, help="port of localhost")
+    serve.add_argument("--socket", default=None, help="path of a unix socket to serve on instead of the port")
+    serve.add_argument("--trials", type=int, default=10000, help="number of warm trials")
+    serve.add_argument("--seed", type=int, default=None, help="seed of the trials, random if not given")
+    serve.add_argument("--sampling", default="plain", choices=SAMPLING_MODES, help="sampling mode of the trials")
+    return parser
 
 if __name__ == "__main__":
-    begin_time = time.time()
-    generateNewMatches = False
-    if generateNewMatches or not os.path.isfile("wiki_matches.csv"):
-        fetch_champions_league_matches()
-    if generateNewMatches or not os.path.isfile("predicd_odds.csv"):
-        fetch_predicd_win_probabilities()
-    matches_list, matches_to_generate_predicd = create_matches_list()
-    
-    statistics_to_track = []
-    TRIAL_NUMBER = 10000
-    
-    for trial_number in range(TRIAL_NUMBER):
-        new_results = []
-        for game in matches_to_generate_predicd:
-            result = get_random_result(game['wprob'], game['dprob'], game['lprob'])
-            new_results.append([game['home-team'], game['away-team']] + [int(a) for a in result.split('-')])
-        stats_tracked = create_rank_statistics(matches_list + new_results)
-        stats_tracked["trial_number"] = trial_number + 1
-        statistics_to_track.append(stats_tracked)
-
-    #Save statistics to file
-    write_stats_to_file(statistics_to_track)
-    
-    #create and save plot pictures
-    save_plot_pictures(statistics_to_track)
-    
-    end_time = time.time()
-    print("Time elapsed: ", round(end_time - begin_time, 3), "seconds")
+    argv = sys.argv[1:]
+    #without a subcommand, the whole pipeline runs as before
+    if not argv or (argv[0] not in SUBCOMMANDS and argv[0] not in ("-h", "--help")):
+        argv = ["run"] + argv
+    args = build_parser().parse_args(argv)
 
+    begin_time = time.time()
+    if args.command == "fetch":
+        command_fetch(args)
+    elif args.command == "table":
+        command_table(args)
+    elif args.command == "query":
+        command_query(args)
+    elif args.command == "serve":
+        from service import serve
+        serve(args)
+    else:
+        report = start_run(args.profile, trace_memory=args.trace_memory)
+        histograms = None
+        if args.command in ("run", "simulate"):
+            histograms = command_simulate(args, report)
+        if args.command in ("run", "plot"):
+            command_plot(args, histograms)
+        report.save(RUN_REPORT_FILE)
+        
+        end_time = time.time()
+        print("Time elapsed: ", round(end_time - begin_time, 3), "seconds")
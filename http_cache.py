@@ -0,0 +1,156 @@
+#This file contains the fetch layer shared by the scrapers
+#Requests go through one pooled session, and responses are cached on disk with their ETag and Last-Modified
+#headers, so that a page fetched again is revalidated with a conditional request and only downloaded if it changed
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+HTTP_CACHE_DIR = ".http_cache"
+#cached responses younger than this are used without any request
+DEFAULT_TTL = 15 * 60
+#statuses worth retrying, the other errors are raised at once
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_session = None
+
+def get_session():
+    """
+    Get the pooled session shared by the scrapers.
+
+    Returns:
+        requests.Session: Session reusing its connections
+    """
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=8)
+        _session.mount("http://", adapter)
+        _session.mount("https://", adapter)
+    return _session
+
+def _entry_paths(cache_dir, url):
+    key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, key + ".json"), os.path.join(cache_dir, key + ".body")
+
+def _write_atomic(path, data):
+    #the temporary name is unique per thread, since concurrent fetches may share the cache directory
+    temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(data)
+    os.replace(temporary_path, path)
+
+def _get(session, url, headers, retries, backoff):
+    #retry connection errors and transient statuses, waiting backoff, 2 * backoff, 4 * backoff... seconds
+    for attempt in range(retries + 1):
+        try:
+            response = session.get(url, headers=headers, timeout=30)
+            if response.status_code not in RETRY_STATUSES or attempt == retries:
+                return response
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == retries:
+                raise
+        time.sleep(backoff * 2**attempt)
+
+def fetch(url, ttl=DEFAULT_TTL, refresh=False, cache_dir=HTTP_CACHE_DIR, session=None, retries=0, backoff=1.0):
+    """
+    Fetch a page through the on-disk cache.
+
+    Args:
+        url (str): Url of the page
+        ttl (float): Age in seconds under which a cached response is used without any request
+        refresh (bool): Revalidate the cached response even if it is younger than ttl
+        cache_dir (str): Directory of the cache
+        session (requests.Session, optional): Session to use, the shared pooled session by default
+        retries (int): Number of retries of connection errors, timeouts and transient statuses (429, 5xx)
+        backoff (float): Wait in seconds before the first retry, doubled at each retry
+
+    Returns:
+        tuple: (text, modified) where text is the page and modified is False when the cached page was used,
+            either because it was fresh or because the server answered 304 Not Modified
+
+    Raises:
+        requests.RequestException: If the request fails
+    """
+    meta_path, body_path = _entry_paths(cache_dir, url)
+    meta = None
+    if os.path.isfile(meta_path) and os.path.isfile(body_path):
+        with open(meta_path, "r", encoding='utf-8') as file:
+            meta = json.load(file)
+        if not refresh and time.time() - meta['fetched_at'] < ttl:
+            with open(body_path, "rb") as file:
+                return file.read().decode(meta['encoding']), False
+
+    headers = {}
+    if meta is not None:
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+    response = _get(session or get_session(), url, headers, retries, backoff)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    if response.status_code == 304 and meta is not None:
+        meta['fetched_at'] = time.time()
+        _write_atomic(meta_path, json.dumps(meta).encode('utf-8'))
+        with open(body_path, "rb") as file:
+            return file.read().decode(meta['encoding']), False
+
+    response.raise_for_status()
+    text = response.text
+    meta = {'url': url, 'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified'),
+            'fetched_at': time.time(), 'encoding': 'utf-8'}
+    _write_atomic(body_path, text.encode('utf-8'))
+    _write_atomic(meta_path, json.dumps(meta).encode('utf-8'))
+    return text, True
+
+if __name__ == "__main__":
+    #Check the cache offline against a local stand-in server answering conditional requests
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    import tempfile
+    import threading
+
+    PAGE = b"<html><body><table class='fevent'></table></body></html>"
+    ETAG = '"page-v1"'
+    statuses = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/flaky" and statuses.count(503) < 2:
+                statuses.append(503)
+                self.send_response(503)
+                self.end_headers()
+                return
+            if self.headers.get('If-None-Match') == ETAG:
+                statuses.append(304)
+                self.send_response(304)
+                self.end_headers()
+                return
+            statuses.append(200)
+            self.send_response(200)
+            self.send_header('ETag', ETAG)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(PAGE)))
+            self.end_headers()
+            self.wfile.write(PAGE)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/page"
+    with tempfile.TemporaryDirectory() as cache_dir:
+        assert fetch(url, cache_dir=cache_dir) == (PAGE.decode(), True)
+        assert fetch(url, cache_dir=cache_dir) == (PAGE.decode(), False)
+        assert fetch(url, ttl=0, cache_dir=cache_dir) == (PAGE.decode(), False)
+        assert statuses == [200, 304], statuses
+        assert fetch(url.replace("/page", "/flaky"), cache_dir=cache_dir, retries=2, backoff=0.01) == (PAGE.decode(), True)
+        assert statuses == [200, 304, 503, 503, 200], statuses
+    server.shutdown()
+    print("Conditional requests served from the cache, transient errors retried")
@@ -0,0 +1,209 @@
+#This file contains the instrumentation of a run: named stage timers, the throughput and per-trial latency of the
+#trial loop, the peak memory of each stage and an opt-in cProfile hook, all gathered in a json run report.
+#Stages can be timed from any module with instrumentation.stage(name), which does nothing when no report is active.
+
+import contextlib
+import cProfile
+import json
+import os
+import resource
+import signal
+import sys
+import time
+import tracemalloc
+
+RUN_REPORT_FILE = "run_report.json"
+LATENCY_PERCENTILES = (50, 90, 99)
+
+_active_report = None
+
+class RunReport:
+    """
+    Timings and memory of the stages of a run.
+
+    Args:
+        profile_stage (str, optional): Name of the stage to profile with cProfile, its profile is saved as
+            profile_<stage>.prof in profile_dir and can be read with pstats or snakeviz
+        profile_dir (str): Directory of the profile files
+        trace_memory (bool): Measure the peak memory of each stage with tracemalloc, which slows allocations down,
+            otherwise the peak resident memory of the process at the end of each stage is reported
+    """
+    def __init__(self, profile_stage=None, profile_dir='.', trace_memory=False):
+        self.profile_stage = profile_stage
+        self.profile_dir = profile_dir
+        self.trace_memory = trace_memory
+        self.begin_time = time.time()
+        self.stages = []
+        self.counters = {}
+        self.batch_trials = []
+        self.batch_seconds = []
+        self.profiles = []
+        self._stack = []
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Time a stage, stages can be nested and the name of a nested stage is prefixed by the names of its parents.
+
+        Args:
+            name (str): Name of the stage
+        """
+        full_name = "/".join([entry['name'] for entry in self._stack] + [name])
+        entry = {'name': full_name, 'peak_memory_bytes': 0}
+        if self.trace_memory:
+            #fold the peak so far into the enclosing stages before the peak is reset for this stage
+            peak = tracemalloc.get_traced_memory()[1]
+            for parent in self._stack:
+                parent['peak_memory_bytes'] = max(parent['peak_memory_bytes'], peak)
+            tracemalloc.reset_peak()
+        self._stack.append(entry)
+        self.stages.append(entry)
+        profiler = None
+        if self.profile_stage in (name, full_name):
+            profiler = cProfile.Profile()
+            profiler.enable()
+        begin, begin_cpu = time.perf_counter(), time.process_time()
+        try:
+            yield entry
+        finally:
+            entry['seconds'] = time.perf_counter() - begin
+            entry['cpu_seconds'] = time.process_time() - begin_cpu
+            if profiler is not None:
+                profiler.disable()
+                path = os.path.join(self.profile_dir, f"profile_{full_name.replace('/', '_')}.prof")
+                profiler.dump_stats(path)
+                self.profiles.append(path)
+            self._stack.pop()
+            if self.trace_memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                entry['peak_memory_bytes'] = max(entry['peak_memory_bytes'], peak)
+                for parent in self._stack:
+                    parent['peak_memory_bytes'] = max(parent['peak_memory_bytes'], peak)
+            else:
+                entry['peak_memory_bytes'] = _max_rss_bytes()
+
+    def add_time(self, name, seconds):
+        """
+        Add time to a counter, for work spread over many small calls such as the writes of the trial store.
+
+        Args:
+            name (str): Name of the counter
+            seconds (float): Time to add
+        """
+        self.counters[name] = self.counters.get(name, 0.0) + seconds
+
+    def record_batch(self, trials, seconds):
+        """
+        Record a batch of the trial loop.
+
+        Args:
+            trials (int): Number of trials of the batch
+            seconds (float): Time from the end of the previous batch to the end of this one
+        """
+        self.batch_trials.append(trials)
+        self.batch_seconds.append(seconds)
+
+    def simulation_summary(self):
+        """
+        Get the throughput of the trial loop and the percentiles of the latency per trial of its batches.
+
+        Returns:
+            dict: Trials, seconds, trials per second and latency percentiles in microseconds, None without batches
+        """
+        import numpy as np
+        if not self.batch_trials:
+            return None
+        trials = np.array(self.batch_trials)
+        seconds = np.array(self.batch_seconds)
+        latency = seconds / trials * 1e6
+        summary = {'batches': len(trials), 'trials': int(trials.sum()), 'seconds': float(seconds.sum()),
+                   'trials_per_second': float(trials.sum() / seconds.sum()) if seconds.sum() > 0 else None}
+        for percentile in LATENCY_PERCENTILES:
+            summary[f"trial_latency_p{percentile}_us"] = float(np.percentile(latency, percentile))
+        return summary
+
+    def to_dict(self):
+        """
+        Get the report.
+
+        Returns:
+            dict: Stages, counters, trial loop summary, profile files and run information
+        """
+        return {
+            'command': sys.argv,
+            'started': time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.begin_time)),
+            'seconds': time.time() - self.begin_time,
+            'memory': 'tracemalloc peak per stage' if self.trace_memory else 'process peak resident memory at the end of each stage',
+            'stages': self.stages,
+            'counters': self.counters,
+            'simulation': self.simulation_summary(),
+            'profiles': self.profiles,
+        }
+
+    def save(self, path=RUN_REPORT_FILE):
+        """
+        Save the report as json, written to a temporary file and renamed.
+
+        Args:
+            path (str): Path of the report
+        """
+        temporary_path = path + ".tmp"
+        with open(temporary_path, "w", encoding='utf-8') as file:
+            json.dump(self.to_dict(), file, indent=1)
+        os.replace(temporary_path, path)
+
+def _max_rss_bytes():
+    #ru_maxrss is in kilobytes on linux and in bytes on macos
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+def worker_initializer():
+    """
+    Initializer of the worker processes: forked workers inherit the memory tracing of the parent, which would
+    slow them down while only the parent reports memory, and the workers ignore ctrl-c so that the parent
+    can finish its batch and save a checkpoint.
+    """
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def start_run(profile_stage=None, profile_dir='.', trace_memory=False):
+    """
+    Start the report of a run, the stages timed with instrumentation.stage are added to it.
+
+    Args:
+        profile_stage (str, optional): Name of the stage to profile, see RunReport
+        profile_dir (str): Directory of the profile files
+        trace_memory (bool): Measure the peak memory of each stage with tracemalloc
+
+    Returns:
+        RunReport: Report of the run
+    """
+    global _active_report
+    _active_report = RunReport(profile_stage, profile_dir, trace_memory)
+    return _active_report
+
+def active_report():
+    """
+    Get the report of the current run.
+
+    Returns:
+        RunReport: Report of the run, None if no run was started
+    """
+    return _active_report
+
+@contextlib.contextmanager
+def stage(name):
+    """
+    Time a stage in the report of the current run, if any.
+
+    Args:
+        name (str): Name of the stage
+    """
+    if _active_report is None:
+        yield None
+    else:
+        with _active_report.stage(name) as entry:
+            yield entry
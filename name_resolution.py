@@ -0,0 +1,183 @@
+#This file matches the team names of two sources, such as predicd and Wikipedia
+#Known names are resolved from an alias cache on disk, candidate pairs are prefiltered with character trigrams
+#so that SequenceMatcher only runs on plausible pairs, and the leftovers are matched with an optimal assignment
+
+from difflib import SequenceMatcher
+import json
+import os
+import re
+import unicodedata
+
+ALIAS_CACHE_FILE = "team_aliases.json"
+#matches with a lower similarity are reported and not saved in the alias cache
+LOW_CONFIDENCE = 0.6
+#words that do not help telling clubs apart
+STOP_WORDS = {'fc', 'cf', 'ac', 'as', 'sc', 'sk', 'fk', 'afc', 'club', 'de', 'calcio', 'sv', 'bk', 'nk', 'gnk', 'cp', 'ssc', 'rb', 'rc', 'vfb', 'vfl', 'ogc'}
+
+def normalise_name(name):
+    """
+    Normalise a team name for comparison: accents removed, lower case, punctuation and stop words dropped.
+
+    Args:
+        name (str): Team name
+
+    Returns:
+        str: Normalised name
+    """
+    name = unicodedata.normalize('NFKD', name)
+    name = "".join(c for c in name if not unicodedata.combining(c)).lower()
+    tokens = re.findall(r"[a-z0-9]+", name)
+    kept = [token for token in tokens if token not in STOP_WORDS]
+    return " ".join(kept if kept else tokens)
+
+def _trigrams(name):
+    padded = f"  {name} "
+    return {padded[i:i+3] for i in range(len(padded) - 2)}
+
+def name_similarity(a, b):
+    """
+    Similarity ratio between two normalised names.
+
+    Args:
+        a (str): First normalised name
+        b (str): Second normalised name
+
+    Returns:
+        float: Similarity ratio between 0 and 1
+    """
+    if a == b:
+        return 1.0
+    return SequenceMatcher(None, a, b).ratio()
+
+def optimal_assignment(scores):
+    """
+    Find the assignment of rows to columns with the highest total score (Hungarian algorithm).
+
+    Args:
+        scores (list): Matrix of scores as a list of rows, with at most as many rows as columns
+
+    Returns:
+        list: Column assigned to each row
+    """
+    n = len(scores)
+    m = len(scores[0]) if n else 0
+    #potentials and matching of the shortest augmenting path formulation, minimising the negated scores
+    INF = float('inf')
+    u = [0.0] * (n + 1)
+    v = [0.0] * (m + 1)
+    row_of_column = [0] * (m + 1)
+    way = [0] * (m + 1)
+    for i in range(1, n + 1):
+        row_of_column[0] = i
+        j0 = 0
+        min_value = [INF] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[j0] = True
+            i0 = row_of_column[j0]
+            delta, j1 = INF, 0
+            for j in range(1, m + 1):
+                if not used[j]:
+                    current = -scores[i0 - 1][j - 1] - u[i0] - v[j]
+                    if current < min_value[j]:
+                        min_value[j] = current
+                        way[j] = j0
+                    if min_value[j] < delta:
+                        delta, j1 = min_value[j], j
+            for j in range(m + 1):
+                if used[j]:
+                    u[row_of_column[j]] += delta
+                    v[j] -= delta
+                else:
+                    min_value[j] -= delta
+            j0 = j1
+            if row_of_column[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            row_of_column[j0] = row_of_column[j1]
+            j0 = j1
+    assignment = [0] * n
+    for j in range(1, m + 1):
+        if row_of_column[j]:
+            assignment[row_of_column[j] - 1] = j - 1
+    return assignment
+
+def load_alias_cache(path=ALIAS_CACHE_FILE):
+    """
+    Load the alias cache.
+
+    Args:
+        path (str): Path of the cache
+
+    Returns:
+        dict: Target name of each known source name
+    """
+    if not os.path.isfile(path):
+        return {}
+    with open(path, "r", encoding='utf-8') as file:
+        return json.load(file)
+
+def save_alias_cache(aliases, path=ALIAS_CACHE_FILE):
+    """
+    Save the alias cache, written to a temporary file and renamed.
+
+    Args:
+        aliases (dict): Target name of each known source name
+        path (str): Path of the cache
+    """
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "w", encoding='utf-8') as file:
+        json.dump(aliases, file, indent=1, ensure_ascii=False, sort_keys=True)
+    os.replace(temporary_path, path)
+
+def resolve_team_names(source_names, target_names, aliases=None):
+    """
+    Match every source team name to a distinct target team name.
+
+    Args:
+        source_names (set): Team names to resolve, such as predicd names
+        target_names (set): Reference team names, such as Wikipedia names
+        aliases (dict, optional): Known matches from source to target names, used before any comparison
+
+    Returns:
+        tuple: (matches, scores) where matches maps source names to target names and scores gives
+            the similarity of each match, 1 for the names resolved from the aliases
+    """
+    matches, scores = {}, {}
+    aliases = aliases or {}
+    targets = set(target_names)
+    for source in sorted(source_names):
+        if aliases.get(source) in targets:
+            matches[source] = aliases[source]
+            scores[source] = 1.0
+            targets.discard(aliases[source])
+    sources = sorted(set(source_names) - set(matches))
+    targets = sorted(targets)
+    if not sources or not targets:
+        return matches, scores
+
+    #only compute SequenceMatcher ratios for pairs sharing a character trigram, other pairs score 0
+    normalised_sources = [normalise_name(name) for name in sources]
+    normalised_targets = [normalise_name(name) for name in targets]
+    target_index = {}
+    for j, name in enumerate(normalised_targets):
+        for trigram in _trigrams(name):
+            target_index.setdefault(trigram, set()).add(j)
+    similarity = [[0.0] * len(targets) for _ in sources]
+    for i, name in enumerate(normalised_sources):
+        candidates = set()
+        for trigram in _trigrams(name):
+            candidates |= target_index.get(trigram, set())
+        for j in candidates:
+            similarity[i][j] = name_similarity(name, normalised_targets[j])
+
+    if len(sources) <= len(targets):
+        assignment = list(enumerate(optimal_assignment(similarity)))
+    else:
+        transposed = [list(column) for column in zip(*similarity)]
+        assignment = [(i, j) for j, i in enumerate(optimal_assignment(transposed))]
+    for i, j in assignment:
+        matches[sources[i]] = targets[j]
+        scores[sources[i]] = similarity[i][j]
+    return matches, scores
@@ -0,0 +1,225 @@
+#This file contains the plots of the Monte Carlo results
+#The plots are drawn from the histograms of aggregation.TrialHistograms, and the figures are rendered
+#in separate processes with the non-interactive Agg backend
+
+from concurrent.futures import ProcessPoolExecutor
+import os
+import random
+import time
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+
+from aggregation import QUALIFICATION_POSITIONS
+from instrumentation import active_report, worker_initializer
+
+DEFAULT_DPI = 900
+PREVIEW_DPI = 100
+
+def plot_jobs(histograms, dpi=DEFAULT_DPI, image_format='png', output_dir='.'):
+    """
+    Get the plots of the histograms, to be rendered by save_plot_pictures or on a shared process pool.
+
+    Args:
+        histograms (TrialHistograms): Histograms of the trials
+        dpi (int): Resolution of the pictures
+        image_format (str): Format of the pictures
+        output_dir (str): Directory of the pictures
+
+    Returns:
+        list: (plot, args) pairs, the path of each picture is the second to last argument, the distribution of
+            points at the qualification positions is only plotted for leagues of at least 24 teams
+    """
+    teams = histograms.team_names
+    classifications = list(range(1, len(teams) + 1))
+
+    def path(name):
+        return os.path.join(output_dir, f"{name}.{image_format}")
+
+    jobs = [(plot_position_distribution, (histograms, classifications, teams, path('position_distribution'), dpi)),
+            (plot_position_heatmap, (histograms, classifications, teams, path('position_heatmap'), dpi))]
+    if len(teams) >= max(QUALIFICATION_POSITIONS):
+        jobs.append((plot_8th_and_24th_position_distribution, (histograms, path('8th_and_24th_position_distribution'), dpi)))
+    return jobs + [(plot_probability_first_position, (histograms, teams, path('first_position_probability'), dpi)),
+                   (plot_probability_last_position, (histograms, teams, path('last_position_probability'), dpi))]
+
+def save_plot_pictures(histograms, dpi=DEFAULT_DPI, image_format='png', output_dir='.', workers=None):
+    """
+    Save plot pictures of statistics using matplotlib.
+
+    Args:
+        histograms (TrialHistograms): Histograms of the trials
+        dpi (int): Resolution of the pictures, PREVIEW_DPI renders a fast preview
+        image_format (str): Format of the pictures, any format supported by matplotlib such as 'png', 'svg' or 'pdf'
+        output_dir (str): Directory of the pictures
+        workers (int, optional): Number of processes rendering the figures, one per figure if not given
+
+    Returns:
+        list: Paths of the saved pictures
+    """
+    jobs = plot_jobs(histograms, dpi, image_format, output_dir)
+
+    if workers is None:
+        workers = len(jobs)
+    if workers <= 1:
+        seconds = [_timed_plot(plot, *args) for plot, args in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs)), initializer=worker_initializer) as executor:
+            futures = [executor.submit(_timed_plot, plot, *args) for plot, args in jobs]
+            seconds = [future.result() for future in futures]
+    #the rendering time of each figure goes to the run report, if any
+    report = active_report()
+    if report is not None:
+        for (_, args), elapsed in zip(jobs, seconds):
+            report.add_time("plot/" + os.path.splitext(os.path.basename(args[-2]))[0], elapsed)
+    return [args[-2] for _, args in jobs]
+
+def _timed_plot(plot, *args):
+    begin = time.perf_counter()
+    plot(*args)
+    return time.perf_counter() - begin
+
+def plot_probability_first_position(histograms, teams, path='first_position_probability.png', dpi=DEFAULT_DPI):
+    # Create figure and axis
+    plt.figure(figsize=(12, 8))
+    probability = histograms.position_probability(1)
+    # Create bar chart with 95% confidence intervals
+    plt.bar(teams, probability, yerr=histograms.error(probability), capsize=2)
+
+    # Customize the plot
+    plt.title(f'Probability of Teams Finishing in First Position ({histograms.trials} trials, 95% confidence intervals)')
+    plt.xlabel('Teams')
+    plt.ylabel('Probability')
+
+    # Rotate x-axis labels for better readability
+    plt.xticks(rotation=45, ha='right')
+
+    # Adjust layout to prevent label cutoff
+    plt.tight_layout()
+
+    # Save the plot
+    plt.savefig(path, bbox_inches='tight', dpi=dpi)
+    plt.close()
+    return
+
+def plot_probability_last_position(histograms, teams, path='last_position_probability.png', dpi=DEFAULT_DPI):
+    # Create figure and axis
+    plt.figure(figsize=(12, 8))
+    probability = histograms.position_probability(len(teams))
+    # Create bar chart with 95% confidence intervals
+    plt.bar(teams, probability, yerr=histograms.error(probability), capsize=2)
+
+    # Customize the plot
+    plt.title(f'Probability of Teams Finishing in Last Position ({histograms.trials} trials, 95% confidence intervals)')
+    plt.xlabel('Teams')
+    plt.ylabel('Probability')
+
+    # Rotate x-axis labels for better readability
+    plt.xticks(rotation=45, ha='right')
+
+    # Adjust layout to prevent label cutoff
+    plt.tight_layout()
+
+    # Save the plot
+    plt.savefig(path, bbox_inches='tight', dpi=dpi)
+    plt.close()
+    return
+
+def plot_position_distribution(histograms, classifications, all_teams, path='position_distribution.png', dpi=DEFAULT_DPI):
+    teams = random.sample(all_teams, min(8, len(all_teams)))
+    position_distributions = {team: histograms.position[all_teams.index(team)] / histograms.trials for team in teams}
+
+
+    x = np.arange(len(classifications))  # the label locations
+    width = 1/(len(teams) + 1)  # the width of the bars
+    multiplier = 0
+
+    # Create figure and axis
+    fig, ax = plt.subplots(layout='constrained')
+
+    for attribute, measurement in position_distributions.items():
+        offset = width * multiplier
+        rects = ax.bar(x + offset, measurement, width, yerr=histograms.error(measurement), error_kw={'linewidth': 0.5}, label=attribute)
+        #ax.bar_label(rects, padding=3)
+        multiplier += 1
+
+    # Add some text for labels, title and custom x-axis tick labels, etc.
+    ax.set_ylabel('Probability')
+    ax.set_xlabel('Classification', fontsize=8)
+    ax.set_title('Classification of teams in champions league\n Distribution of classification of teams over Monte Carlo trials', fontsize=10, y=1.05)
+    ax.set_xticks(x + width, classifications, fontsize=4)
+    ax.legend(loc='upper left', ncols=4, fontsize=7)
+    ax.set_ylim(0, 1)
+
+    # Add vertical lines at 8.5 and 24.5, if the league has these positions
+    for position in QUALIFICATION_POSITIONS:
+        if position < len(classifications):
+            ax.axvline(x=position + 0.5, color='black', linestyle='-', linewidth=1)
+
+    # Save the bar plot
+    plt.savefig(path, bbox_inches='tight', dpi=dpi)
+    plt.close(fig)
+    return
+
+def plot_position_heatmap(histograms, classifications, teams, path='position_heatmap.png', dpi=DEFAULT_DPI):
+    # Sort the teams by expected position, the favourites on top
+    probabilities = histograms.position / histograms.trials
+    expected_position = probabilities @ np.arange(1, len(classifications) + 1)
+    order = np.argsort(expected_position, kind='stable')
+
+    # Create figure and axis
+    fig, ax = plt.subplots(figsize=(12, 10), layout='constrained')
+    image = ax.imshow(probabilities[order], aspect='auto', cmap='viridis', interpolation='nearest')
+    fig.colorbar(image, ax=ax, label='Probability')
+
+    # Add some text for labels, title and custom axis tick labels
+    ax.set_xlabel('Classification')
+    ax.set_title('Distribution of classification of every team over Monte Carlo trials')
+    ax.set_xticks(np.arange(len(classifications)), classifications, fontsize=6)
+    ax.set_yticks(np.arange(len(teams)), [teams[i] for i in order], fontsize=6)
+
+    # Add vertical lines between 8th and 9th and between 24th and 25th positions, if the league has these positions
+    for position in QUALIFICATION_POSITIONS:
+        if position < len(classifications):
+            ax.axvline(x=position - 0.5, color='white', linestyle='-', linewidth=1)
+
+    # Save the heatmap
+    plt.savefig(path, bbox_inches='tight', dpi=dpi)
+    plt.close(fig)
+    return
+
+def plot_8th_and_24th_position_distribution(histograms, path='8th_and_24th_position_distribution.png', dpi=DEFAULT_DPI):
+    points_8th = histograms.position_points[8 - 1]
+    points_24th = histograms.position_points[24 - 1]
+    max_points = int(np.nonzero(points_8th)[0].max())
+    min_points = int(np.nonzero(points_24th)[0].min())
+
+    position_distributions = {"8th position points": points_8th[min_points:max_points + 1] / histograms.trials,
+                             "24th position points": points_24th[min_points:max_points + 1] / histograms.trials}
+
+    x = np.arange(min_points, max_points+1)  # the label locations
+    width = 1/(2 + 1)  # the width of the bars
+    multiplier = 0
+
+    # Create figure and axis
+    fig, ax = plt.subplots(layout='constrained')
+    for attribute, measurement in position_distributions.items():
+        offset = width * multiplier
+        rects = ax.bar([a + offset for a in x], measurement, width, label=attribute)
+        #ax.bar_label(rects, padding=3)
+        multiplier += 1
+
+    # Add some text for labels, title and custom x-axis tick labels, etc.
+    ax.set_ylabel('Probability')
+    ax.set_xlabel('Number of points of team at given position', fontsize=12)
+    ax.set_title('Distribution of number of points of teams at 8th and 24th position over Monte Carlo trials', fontsize=10, y=1.05)
+    ax.set_xticks(x + width, x, fontsize=10)
+    ax.legend(loc='upper left')
+    ax.set_ylim(0, 1)
+
+    # Save the bar plot
+    plt.savefig(path, bbox_inches='tight', dpi=dpi)
+    plt.close(fig)
+    return
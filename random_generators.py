@@ -1,19 +1,22 @@
+import importlib.util
 import random
 import math
+import warnings
 
-def geometric(p):
+def geometric(p, rng=random):
     """
     Generate a random number following geometric distribution.
 
     Args:
         p (float): Success probability parameter
+        rng (random.Random, optional): Random generator, defaults to the module-level random
 
     Returns:
         int: Random number following geometric distribution with parameter p
     """
     if p == 1:
         return 0
-    rand = random.random()
+    rand = rng.random()
     return math.floor(math.log(rand, 1-p))
 
 def ModelGame(stats_home, stats_away):
@@ -44,7 +47,58 @@ def ModelGame(stats_home, stats_away):
     probabilities['lprob'] = away_power / total_power
     return probabilities
 
-def get_random_result(win_prob, draw_prob, loss_prob):
+#The scoreline of a match only depends on its outcome: the losing team (either team for a draw) scores
+#geometric(LOW_SCORE_P) goals and the winner wins by geometric(MARGIN_P) + 1 goals. The joint distribution of
+#(low score, margin) is truncated where the tails are below TRUNCATION_TAIL and sampled with an alias table,
+#one uniform per scoreline, a draw keeps the low score and drops the margin.
+LOW_SCORE_P = 0.3
+MARGIN_P = 0.5
+TRUNCATION_TAIL = 1e-12
+
+def _geometric_pmf(p):
+    #probabilities of 0, 1, 2... up to the value whose tail is below TRUNCATION_TAIL, renormalised
+    size = math.ceil(math.log(TRUNCATION_TAIL) / math.log(1 - p))
+    pmf = [p * (1 - p)**k for k in range(size)]
+    total = sum(pmf)
+    return [value / total for value in pmf]
+
+def alias_table(pmf):
+    """
+    Build the alias table of a discrete distribution (Vose's method).
+
+    Args:
+        pmf (list): Probability of each value 0, 1, 2...
+
+    Returns:
+        tuple: (threshold, alias) lists, value i is kept if the uniform fraction is below threshold[i],
+            otherwise alias[i] is drawn
+    """
+    n = len(pmf)
+    scaled = [value * n for value in pmf]
+    threshold, alias = [1.0] * n, list(range(n))
+    small = [i for i, value in enumerate(scaled) if value < 1]
+    large = [i for i, value in enumerate(scaled) if value >= 1]
+    while small and large:
+        i, j = small.pop(), large.pop()
+        threshold[i], alias[i] = scaled[i], j
+        scaled[j] -= 1 - scaled[i]
+        (small if scaled[j] < 1 else large).append(j)
+    return threshold, alias
+
+_scoreline_cache = None
+
+def _scoreline_table():
+    #(low score, margin) pairs with their probabilities and alias table, built once
+    global _scoreline_cache
+    if _scoreline_cache is None:
+        low_pmf = _geometric_pmf(LOW_SCORE_P)
+        margin_pmf = _geometric_pmf(MARGIN_P)
+        values = [(low, margin + 1) for low in range(len(low_pmf)) for margin in range(len(margin_pmf))]
+        pmf = [low_pmf[low] * margin_pmf[margin - 1] for low, margin in values]
+        _scoreline_cache = (values, pmf, *alias_table(pmf))
+    return _scoreline_cache
+
+def get_random_result(win_prob, draw_prob, loss_prob, rng=random):
     """
     Generate a random match result based on given probabilities.
 
@@ -52,19 +106,193 @@ def get_random_result(win_prob, draw_prob, loss_prob):
         win_prob (float): Probability of home team winning
         draw_prob (float): Probability of draw
         loss_prob (float): Probability of away team winning
+        rng (random.Random, optional): Random generator, defaults to the module-level random
 
     Returns:
-        str: Match result in format "home_score-away_score"
+        tuple: (home_score, away_score) integers
     """
-    rand = random.random()
+    values, _, threshold, alias = _scoreline_table()
+    rand = rng.random()
+    #one uniform gives both the column of the alias table (integer part) and the coin (fractional part)
+    scaled = rng.random() * len(values)
+    i = int(scaled)
+    low, margin = values[i] if scaled - i < threshold[i] else values[alias[i]]
     if rand < win_prob:
-        n = geometric(0.3)
-        m = geometric(0.5) + n + 1
-        return f"{m}-{n}"
+        return low + margin, low
     elif rand < win_prob + draw_prob:
-        n = geometric(0.3)
-        return f"{n}-{n}"
+        return low, low
+    else:
+        return low, low + margin
+
+#Uniforms of the batch samplers. The plain mode draws independent uniforms, the other modes reduce the variance
+#of the estimates by balancing the uniforms of each fixture within groups of trials: antithetic pairs u and 1 - u,
+#stratified (Latin hypercube) draws one uniform in each of the n equal strata of [0, 1) in a random order, and
+#sobol draws a scrambled Sobol sequence, only when scipy is installed. Groups are independent of each other.
+SOBOL_AVAILABLE = importlib.util.find_spec("scipy") is not None
+SAMPLING_MODES = ('plain', 'antithetic', 'stratified') + (('sobol',) if SOBOL_AVAILABLE else ())
+
+def sample_uniforms(sampling, size, columns, rng, group_size=None):
+    """
+    Sample uniforms in [0, 1) for a number of trials with a sampling mode.
+
+    Args:
+        sampling (str): Sampling mode of SAMPLING_MODES
+        size (int): Number of trials
+        columns (int): Number of uniforms of each trial
+        rng (numpy.random.Generator): Random generator
+        group_size (int, optional): Number of consecutive trials balanced together, all of them if not given
+
+    Returns:
+        numpy.ndarray: Uniforms of shape (size, columns)
+
+    Raises:
+        ValueError: If the sampling mode is unknown or not available
+    """
+    import numpy as np
+    if sampling not in SAMPLING_MODES:
+        raise ValueError(f"Unknown sampling mode {sampling}, expected one of {SAMPLING_MODES}")
+    if sampling == 'plain':
+        return rng.random((size, columns))
+    group_size = group_size or size
+    groups = []
+    for start in range(0, size, group_size):
+        n = min(group_size, size - start)
+        if sampling == 'antithetic':
+            half = rng.random(((n + 1) // 2, columns))
+            group = np.concatenate([half, 1 - half])[:n]
+        elif sampling == 'stratified':
+            strata = rng.random((n, columns)).argsort(axis=0)
+            group = (strata + rng.random((n, columns))) / n
+        else:
+            from scipy.stats import qmc
+            with warnings.catch_warnings():
+                #the balance properties of Sobol points only hold for powers of 2, the estimates stay unbiased
+                warnings.simplefilter("ignore", UserWarning)
+                group = qmc.Sobol(columns, scramble=True, seed=rng).random(n)
+        groups.append(group)
+    #1 - u and the rounding of the strata can reach 1, which is outside of the alias table
+    return np.minimum(np.concatenate(groups), np.nextafter(1.0, 0.0))
+
+_scoreline_arrays = None
+
+def sample_results(win_prob, draw_prob, size, rng, sampling='plain', group_size=None):
+    """
+    Sample match results for arrays of fixtures, with the distribution of get_random_result.
+
+    Args:
+        win_prob (numpy.ndarray): Probability of home team winning of each fixture
+        draw_prob (numpy.ndarray): Probability of draw of each fixture, of the same shape
+        size (int): Number of results of each fixture
+        rng (numpy.random.Generator): Random generator
+        sampling (str): Sampling mode of SAMPLING_MODES, see sample_uniforms
+        group_size (int, optional): Number of consecutive results balanced together by the sampling mode
+
+    Returns:
+        tuple: (home_goals, away_goals) int32 arrays of shape (size,) + win_prob.shape
+    """
+    import numpy as np
+    global _scoreline_arrays
+    if _scoreline_arrays is None:
+        #pairs are coded as low << margin_bits | margin, for the kept value and for the alias of each column
+        values, _, threshold, alias = _scoreline_table()
+        margin_bits = max(margin for _, margin in values).bit_length()
+        codes = np.array([low << margin_bits | margin for low, margin in values], dtype=np.int32)
+        _scoreline_arrays = (np.array(threshold), codes, codes[np.array(alias)], margin_bits)
+    threshold, codes, alias_codes, margin_bits = _scoreline_arrays
+
+    shape = (size,) + np.shape(win_prob)
+    if sampling == 'plain':
+        rand = rng.random(shape)
+        scaled = rng.random(shape)
     else:
-        n = geometric(0.3)
-        m = geometric(0.5) + n + 1
-        return f"{n}-{m}"
+        #the outcome and the scoreline of a fixture are two columns of the balanced uniforms
+        fixtures = int(np.prod(np.shape(win_prob)))
+        uniforms = sample_uniforms(sampling, size, 2 * fixtures, rng, group_size)
+        rand = uniforms[:, :fixtures].reshape(shape)
+        scaled = uniforms[:, fixtures:].reshape(shape)
+    win = rand < win_prob
+    draw = ~win & (rand < win_prob + draw_prob)
+    scaled *= len(codes)
+    i = scaled.astype(np.intp)
+    scaled -= i
+    code = np.where(scaled < threshold[i], codes[i], alias_codes[i])
+    low = code >> margin_bits
+    margin = code & ((1 << margin_bits) - 1)
+    margin[draw] = 0
+    return low + np.where(win, margin, 0), low + np.where(win, 0, margin)
+
+def scoreline_pmf(outcome):
+    """
+    Get the truncated distribution of the scorelines of an outcome.
+
+    Args:
+        outcome (str): 'W' (home team wins), 'D' or 'L' (away team wins)
+
+    Returns:
+        dict: Probability of each (home_score, away_score)
+    """
+    values, pmf, _, _ = _scoreline_table()
+    distribution = {}
+    for (low, margin), p in zip(values, pmf):
+        scoreline = {'W': (low + margin, low), 'D': (low, low), 'L': (low, low + margin)}[outcome]
+        distribution[scoreline] = distribution.get(scoreline, 0) + p
+    return distribution
+
+if __name__ == "__main__":
+    #Check statistically that the alias table samplers match the geometric construction, with chi-square
+    #tests of the sampled scorelines against the exact distributions
+    import numpy as np
+
+    def legacy_result(win_prob, draw_prob, rng):
+        #the former construction: outcome, then geometric goals of the losing team and margin
+        rand = rng.random()
+        n = geometric(LOW_SCORE_P, rng)
+        if rand < win_prob:
+            return geometric(MARGIN_P, rng) + n + 1, n
+        elif rand < win_prob + draw_prob:
+            return n, n
+        return n, geometric(MARGIN_P, rng) + n + 1
+
+    def chi_square(samples, expected_pmf):
+        #cells with fewer than 5 expected samples are pooled into one cell
+        counts = {}
+        for sample in samples:
+            counts[sample] = counts.get(sample, 0) + 1
+        n = len(samples)
+        statistic, pooled_expected, pooled_observed, cells = 0.0, 0.0, 0, 0
+        for value, p in expected_pmf.items():
+            if n * p >= 5:
+                statistic += (counts.get(value, 0) - n * p)**2 / (n * p)
+                cells += 1
+            else:
+                pooled_expected += n * p
+                pooled_observed += counts.get(value, 0)
+        pooled_observed += sum(count for value, count in counts.items() if value not in expected_pmf)
+        if pooled_expected > 0:
+            statistic += (pooled_observed - pooled_expected)**2 / pooled_expected
+            cells += 1
+        return statistic, cells - 1
+
+    def check(name, samples, expected_pmf):
+        statistic, degrees = chi_square(samples, expected_pmf)
+        #upper 0.1% quantile of the chi-square distribution, Wilson-Hilferty approximation
+        critical = degrees * (1 - 2 / (9 * degrees) + 3.09 * math.sqrt(2 / (9 * degrees)))**3
+        print(f"{name}: chi2 = {statistic:.1f}, {degrees} degrees of freedom, 0.1% critical value {critical:.1f}")
+        assert statistic < critical, name
+
+    win_prob, draw_prob, loss_prob = 0.45, 0.25, 0.30
+    expected = {}
+    for outcome, p in (('W', win_prob), ('D', draw_prob), ('L', loss_prob)):
+        for scoreline, q in scoreline_pmf(outcome).items():
+            expected[scoreline] = expected.get(scoreline, 0) + p * q
+    n = 200000
+    rng = random.Random(1)
+    check("legacy construction", [legacy_result(win_prob, draw_prob, rng) for _ in range(n)], expected)
+    check("get_random_result", [get_random_result(win_prob, draw_prob, loss_prob, rng) for _ in range(n)], expected)
+    home, away = sample_results(np.array([win_prob]), np.array([draw_prob]), n, np.random.default_rng(1))
+    check("sample_results", list(zip(home[:, 0].tolist(), away[:, 0].tolist())), expected)
+    for sampling in SAMPLING_MODES[1:]:
+        home, away = sample_results(np.array([win_prob]), np.array([draw_prob]), n, np.random.default_rng(1), sampling, 1000)
+        check(f"sample_results {sampling}", list(zip(home[:, 0].tolist(), away[:, 0].tolist())), expected)
+    assert abs(sum(expected.values()) - 1) < 1e-9
+    print("Alias table samplers match the geometric scorelines")
@@ -0,0 +1,146 @@
+#This file contains an on-disk cache of simulation results
+#Results are the histograms of the trials, keyed by a hash of the fixtures, the odds, the seed, the batch size,
+#the sampling mode and the version of the score sampler.
+#A cached run with fewer trials than requested is topped up instead of simulated again, and a run with fewer trials
+#than the cached run does not replace it.
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from aggregation import TrialHistograms
+from simulation import BATCH_SIZE
+
+CACHE_DIR = ".simulation_cache"
+#version of the score sampler of random_generators, the same seed gives other scores when it changes
+SAMPLER_VERSION = 2
+#least recently used entries are removed above this size
+CACHE_MAX_BYTES = 200 * 2**20
+
+def result_key(matches_list, matches_to_generate_predicd, seed, batch_size=BATCH_SIZE, sampling='plain'):
+    """
+    Compute the cache key of a simulation.
+
+    The completed matches are sorted since their order does not change the results, the remaining fixtures keep
+    their order since each one has its own column of random numbers.
+
+    Args:
+        matches_list (list): List of completed matches with scores
+        matches_to_generate_predicd (list): List of future matches with predictions
+        seed (int): Seed of the run
+        batch_size (int): Number of trials of each random stream block
+        sampling (str): Sampling mode of random_generators.SAMPLING_MODES
+
+    Returns:
+        str: Hexadecimal sha256 key
+    """
+    normalised = {
+        'played': sorted([str(match[0]), str(match[1]), int(match[2]), int(match[3])] for match in matches_list),
+        'remaining': [[game['home-team'], game['away-team'], round(game['wprob'], 9), round(game['dprob'], 9), round(game['lprob'], 9)]
+                      for game in matches_to_generate_predicd],
+        'seed': seed,
+        'batch_size': batch_size,
+        'sampling': sampling,
+        'sampler': SAMPLER_VERSION,
+    }
+    return hashlib.sha256(json.dumps(normalised, sort_keys=True).encode('utf-8')).hexdigest()
+
+class ResultCache:
+    """
+    Directory of cached histograms with least recently used eviction.
+
+    Args:
+        path (str): Directory of the cache
+        max_bytes (int): Size above which the least recently used entries are removed
+    """
+    def __init__(self, path=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, key + ".npz")
+
+    def get(self, key):
+        """
+        Get the cached histograms of a key.
+
+        Args:
+            key (str): Key returned by result_key
+
+        Returns:
+            TrialHistograms: Cached histograms, None if the key is not cached
+        """
+        path = self._entry_path(key)
+        if not os.path.isfile(path):
+            return None
+        #the modification time records the last use for the eviction
+        os.utime(path)
+        return TrialHistograms.load(path)
+
+    def put(self, key, histograms):
+        """
+        Store the histograms of a key, replacing a smaller entry, and evict old entries.
+
+        Args:
+            key (str): Key returned by result_key
+            histograms (TrialHistograms): Histograms to store
+
+        Returns:
+            bool: Whether the histograms were stored, an entry with more trials is kept instead
+        """
+        os.makedirs(self.path, exist_ok=True)
+        path = self._entry_path(key)
+        if os.path.isfile(path):
+            with np.load(path) as data:
+                if int(data['trials']) > histograms.trials:
+                    return False
+        temporary_path = path + ".tmp"
+        histograms.save(temporary_path)
+        os.replace(temporary_path, path)
+        self.evict()
+        return True
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache fits in max_bytes.
+        """
+        entries = []
+        for name in os.listdir(self.path):
+            if name.endswith(".npz"):
+                stat = os.stat(os.path.join(self.path, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in entries[:-1]:
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.path, name))
+            total -= size
+
+def usable_trials(cached, trials, batch_size=BATCH_SIZE):
+    """
+    Get the number of cached trials a run can start from.
+
+    A cached run with more trials than requested is not used: the histograms only hold the totals of the trials,
+    the histograms of the first trials cannot be taken from them, and the results of a seed would then depend on
+    the content of the cache.
+
+    Args:
+        cached (TrialHistograms): Cached histograms, or None
+        trials (int): Number of trials requested
+        batch_size (int): Number of trials of each random stream block
+
+    Returns:
+        int: trials if the cache already has the requested run, the cached trials if the run can be topped up
+            from them, 0 otherwise
+    """
+    if cached is None:
+        return 0
+    if cached.trials == trials:
+        return trials
+    #a run can only continue at a block boundary, where the random streams of a fresh run would be
+    if cached.trials < trials and cached.trials % batch_size == 0:
+        return cached.trials
+    return 0
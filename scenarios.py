@@ -0,0 +1,149 @@
+#This file contains what-if queries on the remaining matches, such as "what if team X beats team Y"
+#The scores of every trial are kept in memory, and a scenario only recomputes the pinned fixtures on top of
+#the tables of the trials, so answers take milliseconds once the trials are warm
+#Scenarios are evaluated on the same trials, so their comparisons share their random numbers (common random numbers)
+#and the variance of the differences is much lower than between independent runs
+
+import numpy as np
+
+from random_generators import MARGIN_P
+from simulation import make_baseline, sample_scores, block_rng, BATCH_SIZE
+from statistics_and_rankings import Standings, UpdateStandings, MakeBatchRanking, FixtureContributions, RANKING_FIELDS, RANKING_KEYS
+from aggregation import TrialHistograms, tracked_indicators, CONFIDENCE_Z
+
+OUTCOMES = ('W', 'D', 'L')
+
+class WarmTrials:
+    """
+    Sampled scores and final tables of a set of trials, kept in memory to answer scenario queries.
+
+    With the same seed, the trials are the same as the ones of simulation.simulate.
+
+    Args:
+        matches_list (list): List of completed matches with scores
+        matches_to_generate_predicd (list): List of future matches with predictions
+        trials (int): Number of trials
+        seed (int): Seed of the run
+        batch_size (int): Number of trials sampled at once
+        sampling (str): Sampling mode of random_generators.SAMPLING_MODES
+    """
+    def __init__(self, matches_list, matches_to_generate_predicd, trials, seed, batch_size=BATCH_SIZE, sampling='plain'):
+        self.seed = seed
+        self.baseline = make_baseline(matches_list, matches_to_generate_predicd)
+        self.fixtures = [(game['home-team'], game['away-team']) for game in matches_to_generate_predicd]
+        self.fixture_index = {fixture: k for k, fixture in enumerate(self.fixtures)}
+        home_goals, away_goals = [], []
+        for block, start in enumerate(range(0, trials, batch_size)):
+            home, away = sample_scores(matches_to_generate_predicd, min(batch_size, trials - start), block_rng(seed, block), sampling)
+            home_goals.append(home.astype(np.int16))
+            away_goals.append(away.astype(np.int16))
+        self.home_goals = np.concatenate(home_goals)
+        self.away_goals = np.concatenate(away_goals)
+        self.tables = UpdateStandings(self.baseline, self.fixtures, self.home_goals, self.away_goals, RANKING_FIELDS)
+
+    @property
+    def trials(self):
+        return len(self.home_goals)
+
+    def _pinned_scores(self, fixture, result):
+        #scores of every trial for a pinned fixture, result is a (home, away) score or an outcome of OUTCOMES
+        k = self.fixture_index[fixture]
+        if not isinstance(result, str):
+            return np.full(self.trials, result[0]), np.full(self.trials, result[1])
+        if result not in OUTCOMES:
+            raise ValueError(f"Unknown outcome {result}, expected one of {OUTCOMES} or a score")
+        #Reuse the sampled goals of the losing team and the sampled margin, so that scenarios on the same trials
+        #share their random numbers. Trials sampled as a draw get a geometric(MARGIN_P) + 1 margin, as in
+        #random_generators, from a generator dedicated to the fixture.
+        home, away = self.home_goals[:, k].astype(int), self.away_goals[:, k].astype(int)
+        low_score = np.minimum(home, away)
+        margin = np.abs(home - away)
+        if result == 'D':
+            return low_score, low_score
+        rng = np.random.default_rng(np.random.SeedSequence(self.seed, spawn_key=(2**32 - 1, k)))
+        fresh_margin = np.floor(np.log1p(-rng.random(self.trials)) / np.log(1 - MARGIN_P)).astype(int) + 1
+        margin = np.where(margin > 0, margin, fresh_margin)
+        if result == 'W':
+            return low_score + margin, low_score
+        return low_score, low_score + margin
+
+    def _tables(self, pins):
+        #tables of the trials with the pinned results
+        fields = {field: self.tables.fields[field].copy() for field in RANKING_FIELDS}
+        for fixture, result in pins.items():
+            #only the columns of the two teams of a pinned fixture change, by the difference
+            #between the contributions of the pinned and the sampled results
+            k = self.fixture_index[fixture]
+            home, away = self.baseline.index[fixture[0]], self.baseline.index[fixture[1]]
+            new = FixtureContributions(*self._pinned_scores(fixture, result))
+            old = FixtureContributions(self.home_goals[:, k].astype(int), self.away_goals[:, k].astype(int))
+            for field in RANKING_FIELDS:
+                (new_home, new_away), (old_home, old_away) = new[field], old[field]
+                if new_home is not None:
+                    fields[field][:, home] += new_home.astype(int) - old_home
+                fields[field][:, away] += new_away.astype(int) - old_away
+        return Standings(self.baseline.names, fields, self.baseline.opponents)
+
+    def evaluate(self, pins):
+        """
+        Evaluate a scenario where some fixtures have a fixed result.
+
+        Args:
+            pins (dict): Result of each pinned fixture (hometeam, awayteam), either a score (home_goals, away_goals)
+                or an outcome 'W' (home team wins), 'D' or 'L' (away team wins)
+
+        Returns:
+            TrialHistograms: Histograms of the trials with the pinned results
+        """
+        tables = self._tables(pins)
+        histograms = TrialHistograms(self.baseline.names)
+        histograms.update({'position': MakeBatchRanking(*[tables[key] for key in RANKING_KEYS]),
+                           'points': tables['points'],
+                           'goals_difference': tables['goals_difference']})
+        return histograms
+
+    def compare(self, pins, other_pins=None, z=CONFIDENCE_Z):
+        """
+        Compare the tracked probabilities of two scenarios on the same trials.
+
+        The variance of a difference on the same trials is compared with the variance of the difference between
+        two independent runs of as many trials, p1 (1 - p1) / n + p2 (1 - p2) / n.
+
+        Args:
+            pins (dict): Pinned fixtures of the scenario, as for evaluate
+            other_pins (dict, optional): Pinned fixtures of the scenario it is compared with, no pins by default
+            z (float): Quantile of the normal distribution of the confidence level
+
+        Returns:
+            dict: For each tracked probability, 'difference' of each team, 'error' the half width of its confidence
+                interval, 'variance_reduction' of each team, nan where the difference is always 0, and 'pooled'
+                the variance reduction of the sums over the teams
+        """
+        indicators = [tracked_indicators(MakeBatchRanking(*[tables[key] for key in RANKING_KEYS]))
+                      for tables in (self._tables(pins), self._tables(other_pins or {}))]
+        comparison = {}
+        for key in indicators[0]:
+            first, second = indicators[0][key], indicators[1][key]
+            change = first.astype(np.int8) - second
+            variance = change.var(axis=0) / self.trials
+            p1, p2 = first.mean(axis=0), second.mean(axis=0)
+            independent_variance = (p1 * (1 - p1) + p2 * (1 - p2)) / self.trials
+            with np.errstate(divide='ignore', invalid='ignore'):
+                reduction = np.where(variance > 0, independent_variance / variance, np.nan)
+            comparison[key] = {'difference': p1 - p2, 'error': z * np.sqrt(variance), 'variance_reduction': reduction,
+                               'pooled': float(independent_variance.sum() / variance.sum()) if variance.sum() > 0 else float('nan')}
+        return comparison
+
+    def evaluate_outcomes(self, fixture, pins=None):
+        """
+        Evaluate every outcome of a fixture at once.
+
+        Args:
+            fixture (tuple): Fixture (hometeam, awayteam)
+            pins (dict, optional): Other pinned fixtures, as for evaluate
+
+        Returns:
+            dict: Histograms of the trials for each outcome of OUTCOMES
+        """
+        pins = dict(pins or {})
+        return {outcome: self.evaluate({**pins, fixture: outcome}) for outcome in OUTCOMES}
@@ -0,0 +1,43 @@
+#This file contains the parsing and writing helpers shared by the scrapers
+#Pages are parsed with a SoupStrainer so that only the elements the scrapers read are built into a tree,
+#with lxml when it is installed, and the csv files are written in one go to a temporary file and renamed
+
+import os
+
+from bs4 import BeautifulSoup
+
+try:
+    import lxml
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+def parse_html(text, parse_only=None, parser=None):
+    """
+    Parse a page, or only the parts of it matched by a strainer.
+
+    Args:
+        text (str): Html of the page
+        parse_only (bs4.SoupStrainer, optional): Elements to build, the whole page if not given
+        parser (str, optional): BeautifulSoup parser backend, lxml if installed and html.parser otherwise
+
+    Returns:
+        BeautifulSoup: Parsed elements
+    """
+    return BeautifulSoup(text, parser or HTML_PARSER, parse_only=parse_only)
+
+def write_csv_atomic(path, header, rows):
+    """
+    Write a semicolon separated csv file in one buffered write, to a temporary file renamed over the path,
+    so that a reader never sees a partial file.
+
+    Args:
+        path (str): Path of the csv file
+        header (list): Header lines, written as they are
+        rows (list): Rows of values, joined with semicolons
+    """
+    lines = list(header) + [";".join(str(value) for value in row) for row in rows]
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "w", encoding='utf-8') as file:
+        file.write("".join(line + "\n" for line in lines))
+    os.replace(temporary_path, path)
@@ -0,0 +1,358 @@
+#This file contains a long running service answering json queries on the league over a local http port or unix socket
+#The parsed fixtures, the resolved team names and a warm set of trials are kept in memory, the answers are cached,
+#and everything is loaded again when the modification time of an input csv file changes, inputs that fail to load
+#leave the previous state in service.
+#Usage: python3 game_parser.py serve --port 8765, or --socket /tmp/champions.sock
+#
+#Queries, the teams are names or case insensitive parts of names:
+#  /status                                  trials, seed, inputs and cache of the service
+#  /table                                   table of the completed matches, as print_ranks
+#  /probabilities?top=16&position=1         probabilities of every team, as query --json
+#  /team?name=Madrid                        position and points distributions of a team
+#  /threshold?position=8                    points distribution of the team finishing at a position
+#  /scenario?pin=Madrid:Liverpool=W         what-if scenario, with the change against the trials without pins
+
+from collections import OrderedDict
+import itertools
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import http.client
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from urllib.parse import urlsplit, parse_qs
+
+from game_parser import create_fixture_store, get_ranks, results_summary, summary_rows, find_team, parse_pins, INPUT_FILES
+from scenarios import WarmTrials
+
+DEFAULT_PORT = 8765
+#answers kept in the cache, least recently used answers are dropped above this number
+CACHE_ENTRIES = 1024
+POINTS_QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+class LeagueState:
+    """
+    Fixtures, table and warm trials of a version of the input files.
+
+    Args:
+        wiki_path (str): Path of the Wikipedia matches csv file
+        predicd_path (str): Path of the Predicd odds csv file
+        trials (int): Number of trials
+        seed (int): Seed of the trials
+        sampling (str): Sampling mode of random_generators.SAMPLING_MODES
+    """
+    def __init__(self, wiki_path, predicd_path, trials, seed, sampling='plain'):
+        self.input_mtimes = input_mtimes([wiki_path, predicd_path])
+        self.loaded = time.time()
+        store = create_fixture_store(False, wiki_path, predicd_path)
+        self.matches_list, self.matches_to_generate_predicd = store.played(), store.remaining_predictions()
+        self.ranks = get_ranks(self.matches_list)
+        self.trials = WarmTrials(self.matches_list, self.matches_to_generate_predicd, trials, seed, sampling=sampling)
+        self.histograms = self.trials.evaluate({})
+        self.summary = results_summary(self.histograms, seed, sampling)
+        self.team_names = self.summary['team_names']
+
+def input_mtimes(paths):
+    """
+    Get the modification times of the input files.
+
+    Args:
+        paths (list): Paths of the files
+
+    Returns:
+        dict: Modification time in nanoseconds of each file, None for a missing file
+    """
+    mtimes = {}
+    for path in paths:
+        try:
+            mtimes[path] = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            mtimes[path] = None
+    return mtimes
+
+class LeagueService:
+    """
+    Answers of the queries on the league, cached until the input files change.
+
+    Args:
+        wiki_path (str): Path of the Wikipedia matches csv file
+        predicd_path (str): Path of the Predicd odds csv file
+        trials (int): Number of warm trials
+        seed (int): Seed of the trials, kept when the inputs are loaded again
+        sampling (str): Sampling mode of random_generators.SAMPLING_MODES
+        cache_entries (int): Maximum number of cached answers
+    """
+    def __init__(self, wiki_path="wiki_matches.csv", predicd_path="predicd_odds.csv", trials=10000, seed=0, sampling='plain', cache_entries=CACHE_ENTRIES):
+        self.paths = [wiki_path, predicd_path]
+        self.trials = trials
+        self.seed = seed
+        self.sampling = sampling
+        self.cache_entries = cache_entries
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        #modification times of input files that failed to load and the error, the previous state is served meanwhile
+        self.failed_mtimes = None
+        self.load_error = None
+        self._cache_lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        #the answers are cached by version of the state, so that an answer computed on replaced inputs is never served
+        self._versions = itertools.count()
+        self.state = self._load()
+        self.routes = {'/status': self.status, '/table': self.table, '/probabilities': self.probabilities,
+                       '/team': self.team, '/threshold': self.threshold, '/scenario': self.scenario}
+
+    def _load(self):
+        state = LeagueState(*self.paths, self.trials, self.seed, self.sampling)
+        state.version = next(self._versions)
+        return state
+
+    def current_state(self):
+        """
+        Get the state of the current input files, loading the files again if they changed.
+
+        When the changed files fail to load, for example while they are being written, the previous state is kept
+        and served until the files change again.
+
+        Returns:
+            LeagueState: State of the input files
+
+        Raises:
+            Exception: The error of loading the changed input files, when they fail to load for the first time
+        """
+        state = self.state
+        mtimes = input_mtimes(self.paths)
+        if mtimes == state.input_mtimes or mtimes == self.failed_mtimes:
+            return state
+        with self._load_lock:
+            #another request may have loaded the new files while this one waited
+            mtimes = input_mtimes(self.paths)
+            if mtimes != self.state.input_mtimes and mtimes != self.failed_mtimes:
+                try:
+                    state = self._load()
+                except Exception as error:
+                    self.failed_mtimes, self.load_error = mtimes, f"{type(error).__name__}: {error}"
+                    raise
+                self.state, self.failed_mtimes, self.load_error = state, None, None
+                self.reloads += 1
+                with self._cache_lock:
+                    self.cache.clear()
+            return self.state
+
+    def answer(self, target):
+        """
+        Answer a query.
+
+        Args:
+            target (str): Path and query string of the request, such as /team?name=Madrid
+
+        Returns:
+            tuple: (status, body) http status code and json encoded answer, 503 if the changed input files fail to load
+        """
+        url = urlsplit(target)
+        params = parse_qs(url.query)
+        try:
+            state = self.current_state()
+        except Exception:
+            return 503, _encode({'error': f"The input files could not be loaded again, the previous inputs are served until they change: {self.load_error}"})
+        key = (state.version, url.path, tuple(sorted((name, tuple(values)) for name, values in params.items())))
+        with self._cache_lock:
+            if key in self.cache:
+                self.hits += 1
+                self.cache.move_to_end(key)
+                return self.cache[key]
+            self.misses += 1
+        route = self.routes.get(url.path)
+        if route is None:
+            return 404, _encode({'error': f"Unknown query {url.path}, expected one of {sorted(self.routes)}"})
+        try:
+            answer = 200, _encode(route(state, params))
+        except (ValueError, KeyError) as error:
+            return 400, _encode({'error': str(error).strip("'")})
+        if url.path != '/status':
+            with self._cache_lock:
+                self.cache[key] = answer
+                if len(self.cache) > self.cache_entries:
+                    self.cache.popitem(last=False)
+        return answer
+
+    def status(self, state, params):
+        return {'trials': state.summary['trials'], 'seed': self.seed, 'sampling': self.sampling,
+                'inputs': {path: mtime / 1e9 if mtime is not None else None for path, mtime in state.input_mtimes.items()},
+                'loaded': time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(state.loaded)), 'reloads': self.reloads, 'load_error': self.load_error,
+                'cache': {'entries': len(self.cache), 'hits': self.hits, 'misses': self.misses}}
+
+    def table(self, state, params):
+        return {'table': [{'position': index + 1, 'team': rank['name'], 'points': rank['points'], 'goals_difference': rank['goals_difference'],
+                           'goals_for': rank['goals_for'], 'goals_for_away': rank['goals_for_away']} for index, rank in enumerate(state.ranks)]}
+
+    def probabilities(self, state, params):
+        teams = [find_team(name, state.team_names) for name in params['name']] if 'name' in params else None
+        return summary_rows(state.summary, teams, _integers(params, 'position'), _integers(params, 'top'))
+
+    def team(self, state, params):
+        name = find_team(_single(params, 'name'), state.team_names)
+        i = state.team_names.index(name)
+        histograms = state.histograms
+        row = summary_rows(state.summary, [name], _integers(params, 'position'), _integers(params, 'top'))['teams'][0]
+        return {**row, 'trials': histograms.trials,
+                'position_distribution': (histograms.position[i] / histograms.trials).tolist(),
+                'points_distribution': _distribution(histograms.team_points[i], histograms.trials)}
+
+    def threshold(self, state, params):
+        position = int(_single(params, 'position'))
+        if not 1 <= position <= len(state.team_names):
+            raise ValueError(f"Position {position} is not between 1 and {len(state.team_names)}")
+        counts = state.histograms.position_points[position - 1]
+        trials = state.histograms.trials
+        cumulative, quantiles = 0, {}
+        for points, count in enumerate(counts.tolist()):
+            cumulative += count
+            for quantile in POINTS_QUANTILES:
+                if quantile not in quantiles and cumulative >= quantile * trials:
+                    quantiles[quantile] = points
+        return {'position': position, 'trials': trials,
+                'mean_points': float(sum(points * count for points, count in enumerate(counts.tolist())) / trials),
+                'quantiles': {str(quantile): points for quantile, points in quantiles.items()},
+                'points_distribution': _distribution(counts, trials)}
+
+    def scenario(self, state, params):
+        pins = parse_pins(params.get('pin', []), state.team_names, state.trials.fixtures)
+        if not pins:
+            raise ValueError("A scenario needs at least one pin=HOME:AWAY=RESULT")
+        teams = [find_team(name, state.team_names) for name in params['name']] if 'name' in params else None
+        summary = results_summary(state.trials.evaluate(pins), self.seed, self.sampling)
+        return summary_rows(summary, teams, _integers(params, 'position'), _integers(params, 'top'), state.trials.compare(pins))
+
+def _encode(document):
+    return json.dumps(document).encode('utf-8')
+
+def _single(params, name):
+    if name not in params:
+        raise ValueError(f"Missing parameter {name}")
+    return params[name][0]
+
+def _integers(params, name):
+    return [int(value) for value in params.get(name, [])]
+
+def _distribution(counts, trials):
+    #probability of each number of points, only for the numbers of points that happened
+    return {str(points): count / trials for points, count in enumerate(counts.tolist()) if count}
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """
+    Http handler of the queries, connections are kept alive so that a client pays the connection once.
+    """
+    protocol_version = "HTTP/1.1"
+    #the answer is written when the request is done instead of in small writes
+    wbufsize = -1
+
+    def setup(self):
+        super().setup()
+        #without Nagle's algorithm, the end of an answer does not wait for the delayed acknowledgement of the client
+        if self.connection.family != socket.AF_UNIX:
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, True)
+
+    def do_GET(self):
+        status, body = self.server.service.answer(self.path)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        #unix socket clients have no address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        pass
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def make_server(service, port=DEFAULT_PORT, socket_path=None):
+    """
+    Create the server of a service, on a port of localhost or on a unix socket.
+
+    Args:
+        service (LeagueService): Service answering the queries
+        port (int): Port of localhost, if no socket path is given
+        socket_path (str, optional): Path of the unix socket, an existing socket at this path is replaced
+
+    Returns:
+        socketserver.BaseServer: Server, to run with serve_forever
+    """
+    if socket_path is not None:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = ThreadingUnixHTTPServer(socket_path, QueryHandler)
+    else:
+        server = ThreadingHTTPServer(("127.0.0.1", port), QueryHandler)
+    server.service = service
+    return server
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """
+    Http connection over a unix socket.
+
+    Args:
+        socket_path (str): Path of the unix socket
+    """
+    def __init__(self, socket_path):
+        super().__init__("localhost")
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+def query(target, port=DEFAULT_PORT, socket_path=None, connection=None):
+    """
+    Send a query to a running service.
+
+    Args:
+        target (str): Path and query string, such as /team?name=Madrid
+        port (int): Port of the service on localhost, if no socket path is given
+        socket_path (str, optional): Path of the unix socket of the service
+        connection (http.client.HTTPConnection, optional): Open connection to reuse between queries
+
+    Returns:
+        dict: Answer of the service
+
+    Raises:
+        ValueError: If the service rejects the query
+    """
+    connection = connection or (UnixHTTPConnection(socket_path) if socket_path else http.client.HTTPConnection("127.0.0.1", port))
+    connection.request("GET", target)
+    response = connection.getresponse()
+    answer = json.loads(response.read())
+    if response.status != 200:
+        raise ValueError(answer['error'])
+    return answer
+
+def serve(args):
+    """
+    Load the inputs, simulate the warm trials and answer queries until interrupted.
+
+    Args:
+        args (argparse.Namespace): Options of the serve subcommand
+    """
+    import numpy as np
+    seed = args.seed if args.seed is not None else int(np.random.SeedSequence().entropy)
+    begin_time = time.time()
+    service = LeagueService(*INPUT_FILES, trials=args.trials, seed=seed, sampling=args.sampling)
+    server = make_server(service, args.port, args.socket)
+    where = args.socket if args.socket else f"http://127.0.0.1:{args.port}"
+    print(f"{service.state.summary['trials']} trials ready in {time.time() - begin_time:.3f} seconds, serving on {where}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
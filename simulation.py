@@ -0,0 +1,186 @@
+#This file contains a batched Monte Carlo engine that simulates the remaining matches of the league
+#for many trials at once using numpy arrays instead of one python loop per trial
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+
+import numpy as np
+
+from instrumentation import worker_initializer
+from random_generators import sample_results
+from statistics_and_rankings import MakeStandings, UpdateStandings, MakeBatchRanking, RANKING_FIELDS, RANKING_KEYS
+
+BATCH_SIZE = 10000
+#trials balanced together by the variance reduction modes, and replicates measuring their variance
+REPLICATE_SIZE = 1000
+
+def get_team_names(matches_list, matches_to_generate_predicd):
+    """
+    Get the sorted list of team names appearing in played and remaining matches.
+
+    Args:
+        matches_list (list): List of completed matches with scores
+        matches_to_generate_predicd (list): List of future matches with predictions
+
+    Returns:
+        list: Team names sorted alphabetically, the index of a team in this list is its team index
+    """
+    names = set()
+    for match in matches_list:
+        names.add(match[0])
+        names.add(match[1])
+    for game in matches_to_generate_predicd:
+        names.add(game['home-team'])
+        names.add(game['away-team'])
+    return sorted(names)
+
+def sample_scores(matches_to_generate_predicd, trials, rng, sampling='plain'):
+    """
+    Sample the scores of every remaining match for a batch of trials.
+
+    The scores follow the distribution of get_random_result, sampled with its alias tables.
+
+    Args:
+        matches_to_generate_predicd (list): List of future matches with predictions
+        trials (int): Number of trials to sample
+        rng (numpy.random.Generator): Random generator
+        sampling (str): Sampling mode of random_generators.SAMPLING_MODES, the trials are balanced in
+            groups of REPLICATE_SIZE
+
+    Returns:
+        tuple: (home_goals, away_goals) integer arrays of shape (trials, fixtures)
+    """
+    wprob = np.array([game['wprob'] for game in matches_to_generate_predicd])
+    dprob = np.array([game['dprob'] for game in matches_to_generate_predicd])
+    return sample_results(wprob, dprob, trials, rng, sampling, REPLICATE_SIZE)
+
+def make_baseline(matches_list, matches_to_generate_predicd):
+    """
+    Build the table of the completed matches shared by every trial.
+
+    Args:
+        matches_list (list): List of completed matches with scores
+        matches_to_generate_predicd (list): List of future matches with predictions
+
+    Returns:
+        Standings: Table of the completed matches, with the remaining fixtures scheduled
+    """
+    team_names = get_team_names(matches_list, matches_to_generate_predicd)
+    fixtures = [(game['home-team'], game['away-team']) for game in matches_to_generate_predicd]
+    return MakeStandings(matches_list, team_names, fixtures)
+
+def simulate_batch(baseline, matches_to_generate_predicd, trials, rng, sampling='plain'):
+    """
+    Simulate a batch of trials and rank the final tables.
+
+    Args:
+        baseline (Standings): Table of the completed matches as returned by make_baseline
+        matches_to_generate_predicd (list): List of future matches with predictions
+        trials (int): Number of trials to simulate
+        rng (numpy.random.Generator): Random generator
+        sampling (str): Sampling mode of random_generators.SAMPLING_MODES
+
+    Returns:
+        dict: Arrays of shape (trials, teams) indexed by team: 'position' (1 is first), 'points', 'goals_difference'
+    """
+    fixtures = [(game['home-team'], game['away-team']) for game in matches_to_generate_predicd]
+    home_goals, away_goals = sample_scores(matches_to_generate_predicd, trials, rng, sampling)
+    tables = UpdateStandings(baseline, fixtures, home_goals, away_goals, RANKING_FIELDS)
+    position = MakeBatchRanking(*[tables[key] for key in RANKING_KEYS])
+    return {'position': position, 'points': tables['points'], 'goals_difference': tables['goals_difference']}
+
+def block_rng(seed, block):
+    """
+    Get the random generator of a block of trials.
+
+    Every block of batch_size trials has its own independent stream derived from the seed and the block
+    index, so the results of a seed do not depend on how the blocks are distributed over workers.
+
+    Args:
+        seed (int): Seed of the run
+        block (int): Index of the block of trials
+
+    Returns:
+        numpy.random.Generator: Random generator of the block
+    """
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(block,)))
+
+def simulate_block(baseline, matches_to_generate_predicd, trials, seed, block, sampling='plain'):
+    """
+    Simulate a block of trials with the random generator of the block, this is the unit of work of the workers.
+
+    Args:
+        baseline (Standings): Table of the completed matches as returned by make_baseline
+        matches_to_generate_predicd (list): List of future matches with predictions
+        trials (int): Number of trials of the block
+        seed (int): Seed of the run
+        block (int): Index of the block of trials
+        sampling (str): Sampling mode of random_generators.SAMPLING_MODES
+
+    Returns:
+        dict: Results of the block as returned by simulate_batch
+    """
+    return simulate_batch(baseline, matches_to_generate_predicd, trials, block_rng(seed, block), sampling)
+
+def trial_blocks(trials, batch_size=BATCH_SIZE, first_trial=0):
+    """
+    Get the blocks of trials of a run.
+
+    Args:
+        trials (int): Total number of trials, None for an endless run
+        batch_size (int): Number of trials of each block
+        first_trial (int): Skip the trials before this one, to continue a run, it must be a multiple of batch_size
+
+    Yields:
+        tuple: (block, size) index and number of trials of each block
+
+    Raises:
+        ValueError: If first_trial is not a multiple of batch_size
+    """
+    if first_trial % batch_size != 0:
+        raise ValueError(f"first_trial {first_trial} is not a multiple of the batch size {batch_size}")
+    if trials is None:
+        for block in itertools.count(first_trial // batch_size):
+            yield block, batch_size
+    else:
+        for block in range(first_trial // batch_size, (trials + batch_size - 1) // batch_size):
+            yield block, min(batch_size, trials - block * batch_size)
+
+def simulate(matches_list, matches_to_generate_predicd, trials, seed, batch_size=BATCH_SIZE, workers=1, first_trial=0, sampling='plain'):
+    """
+    Simulate the remaining matches for a number of trials, batch by batch.
+
+    Args:
+        matches_list (list): List of completed matches with scores
+        matches_to_generate_predicd (list): List of future matches with predictions
+        trials (int): Total number of trials, None to simulate batches until the caller stops iterating
+        seed (int): Seed of the run
+        batch_size (int): Number of trials simulated at once
+        workers (int): Number of processes simulating batches in parallel
+        first_trial (int): Skip the trials before this one, to continue a run, it must be a multiple of batch_size
+        sampling (str): Sampling mode of random_generators.SAMPLING_MODES
+
+    Yields:
+        dict: Results of each batch as returned by simulate_batch, in the same order for any number of workers
+    """
+    baseline = make_baseline(matches_list, matches_to_generate_predicd)
+    blocks = trial_blocks(trials, batch_size, first_trial)
+
+    if workers <= 1:
+        for block, size in blocks:
+            yield simulate_block(baseline, matches_to_generate_predicd, size, seed, block, sampling)
+        return
+    #keep a bounded number of blocks in flight, so that the caller can stop at any batch
+    with ProcessPoolExecutor(max_workers=workers, initializer=worker_initializer) as executor:
+        pending = deque()
+        try:
+            for block, size in blocks:
+                pending.append(executor.submit(simulate_block, baseline, matches_to_generate_predicd, size, seed, block, sampling))
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
@@ -1,4 +1,5 @@
-#This file contains two methods that parse a list of matches and give stats and rankings, as long as the matches are correctly formatted
+#This file contains methods that parse a list of matches and give stats and rankings, as long as the matches are correctly formatted
+#numpy is imported by the array functions only, so that the table of the completed matches starts quickly
 
 def MakeStatistics(matches):
     """
@@ -148,3 +149,232 @@ def MakeRanking(statistics):
                                                         -x['league_opponents_goals_for'], 
                                                         x['name']))#In case of a tie, sort alphabetically, I'm not paid enough to do better
     return ranking
+
+#The following functions keep a league table as team-indexed integer arrays instead of dicts of dicts.
+#The table of the completed matches is built once, and simulated results are applied on top of it
+#for a whole batch of trials at once.
+
+STANDINGS_FIELDS = ('matches_played', 'matches_won', 'matches_drawn', 'matches_lost', 'points',
+                    'goals_for', 'goals_against', 'goals_difference', 'goals_for_away', 'matches_away_won')
+RANKING_FIELDS = ('points', 'goals_difference', 'goals_for', 'goals_for_away', 'matches_won', 'matches_away_won')
+
+class Standings:
+    """
+    League table stored as integer arrays indexed by team.
+
+    Attributes:
+        names (list): Team names sorted alphabetically, the index of a team in this list is its team index
+        index (dict): Team index of each team name
+        fields (dict): Array for each key of STANDINGS_FIELDS, of shape (teams,) for a single table
+            or (trials, teams) for a batch of tables
+        opponents (numpy.ndarray): Matrix of shape (teams, teams) counting the matches between two teams
+    """
+    def __init__(self, names, fields, opponents):
+        self.names = names
+        self.index = {name: i for i, name in enumerate(names)}
+        self.fields = fields
+        self.opponents = opponents
+
+    def __getitem__(self, field):
+        if field == 'league_opponents_points':
+            return self._OpponentsSum('points')
+        if field == 'league_opponents_goal_difference':
+            return self._OpponentsSum('goals_difference')
+        if field == 'league_opponents_goals_for':
+            return self._OpponentsSum('goals_for')
+        return self.fields[field]
+
+    def _OpponentsSum(self, field):
+        import numpy as np
+        #float products use BLAS and are exact for these small integers
+        return np.rint(self.fields[field] @ self.opponents.astype(float)).astype(np.int32)
+
+def FixtureContributions(home_scores, away_scores):
+    """
+    Get the contribution of match results to the fields of the home and away teams.
+
+    Args:
+        home_scores (numpy.ndarray): Home team scores
+        away_scores (numpy.ndarray): Away team scores, of the same shape
+
+    Returns:
+        dict: (home_values, away_values) for each key of STANDINGS_FIELDS, home_values is None for
+            the fields that only count away matches
+    """
+    import numpy as np
+    home_won = home_scores > away_scores
+    away_won = home_scores < away_scores
+    drawn = home_scores == away_scores
+    return {
+        'matches_played': (np.ones_like(home_scores), np.ones_like(away_scores)),
+        'matches_won': (home_won, away_won),
+        'matches_drawn': (drawn, drawn),
+        'matches_lost': (away_won, home_won),
+        'points': (3 * home_won + drawn, 3 * away_won + drawn),
+        'goals_for': (home_scores, away_scores),
+        'goals_against': (away_scores, home_scores),
+        'goals_difference': (home_scores - away_scores, away_scores - home_scores),
+        'goals_for_away': (None, away_scores),
+        'matches_away_won': (None, away_won),
+    }
+
+def _FixtureDeltas(index, fixtures, home_scores, away_scores, fields):
+    #Scatter the per-fixture contributions of home and away teams onto team columns
+    #with one-hot incidence matrices of shape (fixtures, teams)
+    import numpy as np
+    home_incidence = np.zeros((len(fixtures), len(index)))
+    away_incidence = np.zeros((len(fixtures), len(index)))
+    for k, (home_team, away_team) in enumerate(fixtures):
+        home_incidence[k, index[home_team]] = 1
+        away_incidence[k, index[away_team]] = 1
+
+    contributions = FixtureContributions(home_scores, away_scores)
+    deltas = {}
+    for field in fields:
+        home_values, away_values = contributions[field]
+        delta = away_values @ away_incidence
+        if home_values is not None:
+            delta = delta + home_values @ home_incidence
+        deltas[field] = np.rint(delta).astype(np.int32)
+    opponents = home_incidence.T @ away_incidence
+    opponents = np.rint(opponents + opponents.T).astype(np.int32)
+    return deltas, opponents
+
+def MakeStandings(matches, team_names, scheduled=()):
+    """
+    Generate the array table of a list of completed matches.
+
+    Args:
+        matches (list): List of matches where each match is [hometeam, awayteam, hometeam_score, awayteam_score]
+        team_names (list): Names of all the teams of the league, including teams without completed matches
+        scheduled (list): Fixtures (hometeam, awayteam) still to be played, their opponents are counted
+            in the league opponents aggregates of the tables produced by UpdateStandings
+
+    Returns:
+        Standings: Table of the completed matches
+    """
+    import numpy as np
+    names = sorted(team_names)
+    index = {name: i for i, name in enumerate(names)}
+    fixtures = [match[:2] for match in matches]
+    scores = np.array([match[2:4] for match in matches], dtype=np.int32).reshape(-1, 2)
+    fields, opponents = _FixtureDeltas(index, fixtures, scores[:, 0], scores[:, 1], STANDINGS_FIELDS)
+    if len(scheduled) > 0:
+        no_goals = np.zeros(len(scheduled), dtype=np.int32)
+        opponents = opponents + _FixtureDeltas(index, scheduled, no_goals, no_goals, ())[1]
+    return Standings(names, fields, opponents)
+
+def UpdateStandings(baseline, fixtures, home_scores, away_scores, fields=STANDINGS_FIELDS):
+    """
+    Apply the results of a batch of simulated trials to a table of completed matches.
+
+    Args:
+        baseline (Standings): Table of the completed matches as generated by MakeStandings()
+        fixtures (list): Simulated fixtures (hometeam, awayteam), they must be in the scheduled fixtures of the baseline
+        home_scores (numpy.ndarray): Home team scores of shape (trials, fixtures)
+        away_scores (numpy.ndarray): Away team scores of shape (trials, fixtures)
+        fields (tuple): Fields to update, RANKING_FIELDS is enough to rank the tables
+
+    Returns:
+        Standings: Batch of tables of shape (trials, teams)
+    """
+    deltas, _ = _FixtureDeltas(baseline.index, fixtures, home_scores, away_scores, fields)
+    return Standings(baseline.names, {field: baseline.fields[field] + deltas[field] for field in fields}, baseline.opponents)
+
+RANKING_KEYS = ('points', 'goals_difference', 'goals_for', 'goals_for_away', 'matches_won', 'matches_away_won',
+                'league_opponents_points', 'league_opponents_goal_difference', 'league_opponents_goals_for')
+
+def MakeBatchRanking(points, goals_difference, goals_for, goals_for_away, matches_won, matches_away_won,
+                     league_opponents_points, league_opponents_goal_difference, league_opponents_goals_for):
+    """
+    Generate the rankings of a batch of tables at once, with the same criteria as MakeRanking().
+
+    Every argument is an integer array of shape (trials, teams), with teams indexed in alphabetical order
+    as in Standings.names. The league opponents aggregates can be taken from a Standings batch,
+    which computes them from its opponent matrix.
+
+    Returns:
+        numpy.ndarray: Position of each team in each trial, of shape (trials, teams), 1 is first
+    """
+    import numpy as np
+    keys = [points, goals_difference, goals_for, goals_for_away, matches_won, matches_away_won,
+            league_opponents_points, league_opponents_goal_difference, league_opponents_goals_for]
+
+    #Pack the keys into as few int64 words as possible with a mixed radix, highest priority first.
+    #Each key is stored as (max - value) so that an ascending sort ranks the highest values first.
+    words = []
+    word, word_range = np.zeros(points.shape, dtype=np.int64), 1
+    for key in keys:
+        key_max = int(key.max())
+        key_range = key_max - int(key.min()) + 1
+        if word_range * key_range >= 2**62:
+            words.append(word)
+            word, word_range = np.zeros(points.shape, dtype=np.int64), 1
+        word *= key_range
+        word += key_max
+        word -= key
+        word_range *= key_range
+    words.append(word)
+
+    #Both sorts are stable, teams with equal keys stay in index order which is the alphabetical order
+    if len(words) == 1:
+        order = np.argsort(words[0], axis=1, kind='stable')
+    else:
+        order = np.lexsort(words[::-1], axis=-1)
+    positions = np.empty_like(order)
+    np.put_along_axis(positions, order, np.arange(1, order.shape[1] + 1), axis=1)
+    return positions
+
+def StandingsToStatistics(standings, trial=None):
+    """
+    Convert an array table into the dictionary format of MakeStatistics().
+
+    Args:
+        standings (Standings): Single table or batch of tables
+        trial (int, optional): Trial to convert when standings is a batch of tables
+
+    Returns:
+        dict: Dictionary containing statistics for each team with the keys of STANDINGS_FIELDS
+            and the league opponents aggregates
+    """
+    keys = STANDINGS_FIELDS + ('league_opponents_points', 'league_opponents_goal_difference', 'league_opponents_goals_for')
+    values = {key: standings[key] if trial is None else standings[key][trial] for key in keys}
+    statistics = {}
+    for i, name in enumerate(standings.names):
+        statistics[name] = {'name': name}
+        for key in keys:
+            statistics[name][key] = int(values[key][i])
+    return statistics
+
+if __name__ == "__main__":
+    #Check that the array tables match the reference MakeStatistics path on random leagues
+    import random
+    import numpy as np
+    rng = random.Random(0)
+    team_names = [f"Team {i}" for i in range(36)]
+    fields = ('matches_played', 'matches_won', 'matches_drawn', 'matches_lost', 'points',
+              'goals_for', 'goals_against', 'goals_difference', 'goals_for_away', 'matches_away_won',
+              'league_opponents_points', 'league_opponents_goal_difference', 'league_opponents_goals_for')
+    for league in range(20):
+        fixtures = [tuple(rng.sample(team_names, 2)) for _ in range(144)]
+        played = [[home, away, rng.randint(0, 5), rng.randint(0, 5)] for home, away in fixtures[:90]]
+        scheduled = fixtures[90:]
+        baseline = MakeStandings(played, team_names, scheduled)
+        home_scores = np.array([[rng.randint(0, 5) for _ in scheduled] for _ in range(10)])
+        away_scores = np.array([[rng.randint(0, 5) for _ in scheduled] for _ in range(10)])
+        batch = UpdateStandings(baseline, scheduled, home_scores, away_scores)
+        for trial in range(10):
+            results = [[home, away, int(home_scores[trial, k]), int(away_scores[trial, k])] for k, (home, away) in enumerate(scheduled)]
+            reference = MakeStatistics(played + results)
+            statistics = StandingsToStatistics(batch, trial)
+            for name in reference:
+                for field in fields:
+                    assert statistics[name][field] == reference[name][field], (league, trial, name, field)
+            ranking = [team['name'] for team in MakeRanking(reference)]
+            assert [team['name'] for team in MakeRanking(statistics)] == ranking
+            positions = MakeBatchRanking(*[batch[key] for key in RANKING_KEYS])[trial]
+            assert [batch.names[i] for i in np.argsort(positions)] == ranking
+    #Teams tied on every criterion are ranked alphabetically
+    tied = np.zeros((2, len(team_names)), dtype=np.int32)
+    assert (MakeBatchRanking(*[tied] * len(RANKING_KEYS)) == np.arange(1, len(team_names) + 1)).all()
+    print("Standings match MakeStatistics")
@@ -0,0 +1,304 @@
+#This file contains a query engine of joint probabilities over the trials of a trial store
+#A question is an expression over the final table of every trial, for example
+#  position['Madrid'] <= 8 and position['Liverpool'] <= 8      both teams finish in the top 8
+#  count(points[team] == points_at[8]) >= 3                    at least three teams have the points of the 8th
+#and a group-by gives the distribution of a value over the trials, such as team_at[24] the team finishing 24th.
+#The columns are transposed once into team-major and position-major copies stored next to them, so that the values
+#of a team or of a position are contiguous, and the mask of every predicate is kept as a bitset, so that and, or and not combine bitsets and
+#related questions do not read the trials again.
+#Usage: python3 trial_query.py statistics "position['Madrid'] <= 8 and position['Liverpool'] <= 8"
+#       python3 trial_query.py statistics --group-by "team_at[24]" --where "points['Madrid'] >= 12"
+#
+#Values of an expression, teams are names or case insensitive parts of names:
+#  position[team], points[team], goals_difference[team]     of a team
+#  team_at[p], points_at[p], goals_difference_at[p]         of the team finishing at position p
+#  count(condition)                                         number of teams meeting a condition on team,
+#                                                           such as count(position[team] <= 8 and points[team] < 12)
+#combined with + - and comparisons, and predicates with and, or, not.
+
+import argparse
+import ast
+import json
+import math
+import os
+
+import numpy as np
+
+from aggregation import wilson_half_width, CONFIDENCE_Z
+from game_parser import find_team
+from trial_store import open_trial_store
+
+#trials evaluated at once, a multiple of 8 so that the bitsets of the chunks are whole bytes
+CHUNK_TRIALS = 1 << 20
+TEAM_VALUES = ('position', 'points', 'goals_difference')
+POSITION_VALUES = {'team_at': None, 'points_at': 'points', 'goals_difference_at': 'goals_difference'}
+COMPARISONS = {ast.Lt: np.less, ast.LtE: np.less_equal, ast.Gt: np.greater, ast.GtE: np.greater_equal,
+               ast.Eq: np.equal, ast.NotEq: np.not_equal}
+#number of bits set in each byte
+_POPCOUNT = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.uint8)
+
+def column_copy(store, column):
+    """
+    Get a copy of a column of a store with the trials in the last dimension, created the first time and created
+    again when the store changed: the team-major copy of shape (teams, trials) of position, points and
+    goals_difference, and the position-major columns of shape (positions, trials) of team_at (index of the team
+    at each position), points_at and goals_difference_at.
+
+    Args:
+        store (TrialStore): Store of the trials
+        column (str): Column of TEAM_VALUES or POSITION_VALUES
+
+    Returns:
+        numpy.memmap: Column of shape (teams, trials)
+    """
+    teams = len(store.team_names)
+    dtype = np.dtype(store.columns[POSITION_VALUES[column] or 'position'] if column in POSITION_VALUES else store.columns[column])
+    path = os.path.join(store.path, column + (".by_team.bin" if column in TEAM_VALUES else ".by_position.bin"))
+    source_path = os.path.join(store.path, "position.bin")
+    stale = (not os.path.isfile(path) or os.path.getsize(path) != store.trials * teams * dtype.itemsize
+             or os.path.getmtime(path) < os.path.getmtime(source_path))
+    if store.trials == 0:
+        return np.zeros((teams, 0), dtype=dtype)
+    if stale:
+        temporary_path = path + ".tmp"
+        copy = np.memmap(temporary_path, dtype=dtype, mode='w+', shape=(teams, store.trials))
+        for start in range(0, store.trials, CHUNK_TRIALS):
+            stop = min(start + CHUNK_TRIALS, store.trials)
+            if column in TEAM_VALUES:
+                values = getattr(store, column)[start:stop]
+            else:
+                #inverse permutation of the positions of each trial
+                team_at = np.empty((stop - start, teams), dtype=np.intp)
+                np.put_along_axis(team_at, store.position[start:stop].astype(np.intp) - 1, np.arange(teams), axis=1)
+                values = team_at if POSITION_VALUES[column] is None else np.take_along_axis(getattr(store, POSITION_VALUES[column])[start:stop], team_at, axis=1)
+            copy[:, start:stop] = values.T
+        copy.flush()
+        del copy
+        os.replace(temporary_path, path)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(teams, store.trials))
+
+def _signed(values):
+    #unsigned positions would wrap around in differences
+    return values.astype(np.int16 if values.dtype.itemsize == 1 else np.int32) if values.dtype.kind == 'u' else values
+
+class TrialQuery:
+    """
+    Joint probabilities and distributions over the trials of a store.
+
+    Args:
+        store (TrialStore): Store of the trials
+        chunk_trials (int): Number of trials evaluated at once, a multiple of 8
+    """
+    def __init__(self, store, chunk_trials=CHUNK_TRIALS):
+        self.store = store
+        self.team_names = store.team_names
+        self.trials = store.trials
+        self.chunk_trials = chunk_trials
+        self.columns = {}
+        self.masks = {}
+
+    def _column(self, column):
+        if column not in self.columns:
+            self.columns[column] = column_copy(self.store, column)
+        return self.columns[column]
+
+    def _parse(self, expression):
+        if isinstance(expression, ast.AST):
+            return expression
+        try:
+            return ast.parse(expression, mode='eval').body
+        except SyntaxError as error:
+            raise ValueError(f"Invalid expression {expression}: {error.msg}") from None
+
+    def _value(self, node, start, stop, team_axis=False):
+        #value of an expression for the trials start to stop, arrays of shape (trials,) or (teams, trials)
+        #for the expressions over the team placeholder of count
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+            return node.value
+        if isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name):
+            name, index = node.value.id, node.slice
+            if name in TEAM_VALUES:
+                if isinstance(index, ast.Name) and index.id == 'team':
+                    if not team_axis:
+                        raise ValueError("team can only be used inside count()")
+                    return _signed(self._column(name)[:, start:stop])
+                if isinstance(index, ast.Constant) and isinstance(index.value, str):
+                    return _signed(self._column(name)[self.team_names.index(find_team(index.value, self.team_names)), start:stop])
+                raise ValueError(f"{name}[] needs a team name or team")
+            if name in POSITION_VALUES:
+                if not (isinstance(index, ast.Constant) and isinstance(index.value, int)) or not 1 <= index.value <= len(self.team_names):
+                    raise ValueError(f"{name}[] needs a position between 1 and {len(self.team_names)}")
+                return _signed(self._column(name)[index.value - 1, start:stop])
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == 'count' and len(node.args) == 1 and not node.keywords:
+            condition = self._value(node.args[0], start, stop, team_axis=True)
+            if np.ndim(condition) != 2 or condition.dtype != bool:
+                raise ValueError("count() needs a condition on team, such as count(position[team] <= 8)")
+            return condition.sum(axis=0, dtype=np.int32)
+        if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Add, ast.Sub)):
+            left, right = self._value(node.left, start, stop, team_axis), self._value(node.right, start, stop, team_axis)
+            return left + right if isinstance(node.op, ast.Add) else left - right
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            return -self._value(node.operand, start, stop, team_axis)
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            return ~self._boolean(node.operand, start, stop, team_axis)
+        if isinstance(node, ast.BoolOp):
+            values = [self._boolean(value, start, stop, team_axis) for value in node.values]
+            combined = values[0]
+            for value in values[1:]:
+                combined = (combined & value) if isinstance(node.op, ast.And) else (combined | value)
+            return combined
+        if isinstance(node, ast.Compare):
+            #chained comparisons such as 8 <= position['Madrid'] <= 24
+            left = self._value(node.left, start, stop, team_axis)
+            result = None
+            for operator, comparator in zip(node.ops, node.comparators):
+                if type(operator) not in COMPARISONS:
+                    raise ValueError(f"Unsupported comparison {type(operator).__name__}")
+                right = self._value(comparator, start, stop, team_axis)
+                compared = COMPARISONS[type(operator)](left, right)
+                result = compared if result is None else result & compared
+                left = right
+            return result
+        raise ValueError(f"Unsupported expression {ast.unparse(node)}")
+
+    def _boolean(self, node, start, stop, team_axis):
+        value = self._value(node, start, stop, team_axis)
+        if getattr(value, 'dtype', None) != bool:
+            raise ValueError(f"{ast.unparse(node)} is not a condition")
+        return value
+
+    def _chunks(self):
+        for start in range(0, self.trials, self.chunk_trials):
+            yield start, min(start + self.chunk_trials, self.trials)
+
+    def mask(self, expression):
+        """
+        Get the trials meeting a condition, as a bitset.
+
+        and, or and not combine the bitsets of their operands, and the bitset of every condition is cached.
+
+        Args:
+            expression (str or ast.AST): Condition
+
+        Returns:
+            numpy.ndarray: Bitset of the trials, packed with numpy.packbits
+
+        Raises:
+            ValueError: If the expression is not a valid condition
+        """
+        node = self._parse(expression)
+        key = ast.dump(node)
+        if key in self.masks:
+            return self.masks[key]
+        if isinstance(node, ast.BoolOp):
+            masks = [self.mask(value) for value in node.values]
+            bits = masks[0]
+            for other in masks[1:]:
+                bits = (bits & other) if isinstance(node.op, ast.And) else (bits | other)
+        elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            #the padding bits after the last trial stay cleared
+            bits = ~self.mask(node.operand) & np.packbits(np.ones(self.trials, dtype=bool))
+        else:
+            bits = np.concatenate([np.packbits(self._boolean(node, start, stop, False)) for start, stop in self._chunks()] or [np.zeros(0, dtype=np.uint8)])
+        self.masks[key] = bits
+        return bits
+
+    def count(self, expression):
+        """
+        Count the trials meeting a condition.
+
+        Args:
+            expression (str or ast.AST): Condition
+
+        Returns:
+            int: Number of trials
+        """
+        return int(_POPCOUNT[self.mask(expression)].sum(dtype=np.int64))
+
+    def probability(self, expression, given=None, z=CONFIDENCE_Z):
+        """
+        Get the probability of a condition, optionally conditional on another condition.
+
+        Args:
+            expression (str): Condition
+            given (str, optional): Condition of the trials counted, all trials if not given
+            z (float): Quantile of the normal distribution of the confidence level
+
+        Returns:
+            tuple: (probability, error, trials) probability, half width of its Wilson confidence interval and number
+                of trials it is estimated from, probability and error are nan without trials
+        """
+        if given is None:
+            hits, trials = self.count(expression), self.trials
+        else:
+            given_bits = self.mask(given)
+            hits = int(_POPCOUNT[self.mask(expression) & given_bits].sum(dtype=np.int64))
+            trials = int(_POPCOUNT[given_bits].sum(dtype=np.int64))
+        if trials == 0:
+            return float('nan'), float('nan'), 0
+        probability = hits / trials
+        return probability, float(wilson_half_width(probability, trials, z)), trials
+
+    def group_by(self, expression, where=None):
+        """
+        Get the distribution of a value over the trials, optionally among the trials meeting a condition.
+
+        Args:
+            expression (str): Value, such as team_at[24] or points['Madrid']
+            where (str, optional): Condition of the trials counted, all trials if not given
+
+        Returns:
+            dict: Number of trials of each value, with team names as values for team_at[]
+        """
+        node = self._parse(expression)
+        bits = self.mask(where) if where is not None else None
+        counts = {}
+        for start, stop in self._chunks():
+            values = self._value(node, start, stop)
+            if np.ndim(values) != 1 or values.dtype == bool:
+                raise ValueError(f"{expression} is not a value of each trial")
+            if bits is not None:
+                values = values[np.unpackbits(bits[start // 8:(stop + 7) // 8], count=stop - start).astype(bool)]
+            if len(values) == 0:
+                continue
+            #the values are small integers such as positions, points and goal differences
+            minimum = int(values.min())
+            for offset, count in enumerate(np.bincount(values - minimum).tolist()):
+                if count:
+                    counts[minimum + offset] = counts.get(minimum + offset, 0) + count
+        if isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name) and node.value.id == 'team_at':
+            return {self.team_names[value]: count for value, count in counts.items()}
+        return counts
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Joint probabilities and distributions over the trials of a trial store")
+    parser.add_argument("store", help="directory of the trial store, such as statistics")
+    parser.add_argument("conditions", nargs="*", help="conditions whose probability is printed, such as \"position['Madrid'] <= 8\"")
+    parser.add_argument("--where", default=None, help="only count the trials meeting this condition")
+    parser.add_argument("--group-by", default=None, help="print the distribution of this value, such as team_at[24]")
+    parser.add_argument("--json", action="store_true", help="print the answers as json")
+    args = parser.parse_intermixed_args()
+
+    engine = TrialQuery(open_trial_store(args.store))
+    answers = {'trials': engine.trials, 'where': args.where}
+    try:
+        answers['probabilities'] = {condition: dict(zip(('probability', 'error', 'trials'), engine.probability(condition, args.where)))
+                                    for condition in args.conditions}
+        if args.group_by is not None:
+            counts = engine.group_by(args.group_by, args.where)
+            total = sum(counts.values())
+            answers['group_by'] = {args.group_by: {str(value): count / total for value, count in sorted(counts.items(), key=lambda item: -item[1])}}
+    except ValueError as error:
+        parser.exit(1, f"{error}\n")
+    if args.json:
+        #the probability and the error of a condition without trials are nan, which is not valid json
+        for answer in answers['probabilities'].values():
+            answer.update({key: None for key in ('probability', 'error') if not math.isfinite(answer[key])})
+        print(json.dumps(answers, indent=1))
+    else:
+        for condition, answer in answers['probabilities'].items():
+            print(f"P({condition}{' | ' + args.where if args.where else ''}) = {answer['probability']:.4f} ± {answer['error']:.4f}, {answer['trials']} trials")
+        for value_expression, distribution in answers.get('group_by', {}).items():
+            print(f"{value_expression}{' | ' + args.where if args.where else ''}:")
+            for value, probability in distribution.items():
+                print(f"  {value}: {probability:.4f}")
@@ -0,0 +1,257 @@
+#This file contains a columnar binary store of the simulated trials
+#Each column (positions, points, goal differences) is a raw array of shape (trials, teams) written in chunks while
+#the trials run, with a small json header. The store is read back with memory maps and can be exported to csv.
+
+import csv
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+
+STORE_VERSION = 1
+HEADER_FILE = "header.json"
+
+def hash_file(path):
+    """
+    Compute the sha256 hash of a file.
+
+    Args:
+        path (str): Path of the file
+
+    Returns:
+        str: Hexadecimal digest
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def store_columns(teams):
+    """
+    Get the columns of a store and their dtypes.
+
+    Args:
+        teams (int): Number of teams
+
+    Returns:
+        dict: numpy dtype string of each column
+    """
+    return {'position': 'u1' if teams < 256 else '<u2', 'points': '<i2', 'goals_difference': '<i2'}
+
+def _write_header(path, header):
+    #write the header to a temporary file and rename it, so that a reader never sees a partial header
+    temporary_path = os.path.join(path, HEADER_FILE + ".tmp")
+    with open(temporary_path, "w", encoding='utf-8') as file:
+        json.dump(header, file, indent=1)
+    os.replace(temporary_path, os.path.join(path, HEADER_FILE))
+
+class TrialStoreWriter:
+    """
+    Write batches of trials to a columnar store directory.
+
+    Args:
+        path (str): Directory of the store, created if needed, existing columns are overwritten
+        team_names (list): Team names, in the order of the columns of the batches
+        seed (int, optional): Seed of the run
+        input_files (list, optional): Input files whose sha256 hashes are recorded in the header
+        append (bool): Continue an existing store of the same run instead of overwriting it
+        trials (int, optional): Number of trials of the existing store to keep when appending, all of them if not given
+        run_key (str, optional): Key of the run, result_cache.result_key, which covers the sampling mode, the batch
+            size and the version of the score sampler
+
+    Raises:
+        ValueError: If append is set and the existing store does not have the same teams, seed, input files and
+            run key, or fewer trials than the trials to keep
+    """
+    def __init__(self, path, team_names, seed=None, input_files=(), append=False, trials=None, run_key=None):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.columns = store_columns(len(team_names))
+        self.header = {
+            'version': STORE_VERSION,
+            'team_names': list(team_names),
+            'seed': seed,
+            'input_hashes': {os.path.basename(input_file): hash_file(input_file) for input_file in input_files},
+            'run_key': run_key,
+            'columns': self.columns,
+            'trials': 0,
+        }
+        if append:
+            existing = TrialStore(path)
+            if (existing.team_names, existing.seed, existing.input_hashes, existing.run_key) != (self.header['team_names'], seed, self.header['input_hashes'], run_key):
+                raise ValueError(f"The store {path} does not have the same teams, seed, input files and run key")
+            kept = existing.trials if trials is None else trials
+            if kept > existing.trials:
+                raise ValueError(f"The store {path} has {existing.trials} trials, fewer than {kept}")
+            self.header['trials'] = kept
+            #drop a partial row left by an interrupted run, and the trials after a checkpoint
+            for column, dtype in self.columns.items():
+                with open(os.path.join(path, column + ".bin"), "r+b") as file:
+                    file.truncate(kept * len(team_names) * np.dtype(dtype).itemsize)
+        _write_header(path, self.header)
+        self.files = {column: open(os.path.join(path, column + ".bin"), "ab" if append else "wb") for column in self.columns}
+
+    def append(self, batch):
+        """
+        Append a batch of trials to the store.
+
+        Args:
+            batch (dict): Arrays of shape (trials, teams) with keys 'position', 'points' and 'goals_difference',
+                as returned by simulation.simulate_batch
+        """
+        for column, dtype in self.columns.items():
+            self.files[column].write(np.ascontiguousarray(batch[column], dtype=dtype).tobytes())
+        self.header['trials'] += len(batch['position'])
+
+    def close(self):
+        """
+        Flush the columns and record the number of trials in the header.
+        """
+        for file in self.files.values():
+            file.close()
+        _write_header(self.path, self.header)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class TrialStore:
+    """
+    Read-only view of a columnar store, the columns are memory mapped and loaded lazily.
+
+    Attributes:
+        team_names (list): Team names, in the order of the columns
+        seed (int): Seed of the run
+        input_hashes (dict): sha256 hash of each input file
+        run_key (str): Key of the run, None if it was not recorded
+        trials (int): Number of trials
+        position, points, goals_difference (numpy.memmap): Arrays of shape (trials, teams) indexed by team
+    """
+    def __init__(self, path):
+        with open(os.path.join(path, HEADER_FILE), "r", encoding='utf-8') as file:
+            header = json.load(file)
+        self.path = path
+        self.team_names = header['team_names']
+        self.seed = header['seed']
+        self.input_hashes = header['input_hashes']
+        self.run_key = header.get('run_key')
+        self.columns = header['columns']
+        teams = len(self.team_names)
+        #the number of trials comes from the column sizes, so that a store interrupted before close() is readable
+        row_sizes = {column: np.dtype(dtype).itemsize * teams for column, dtype in self.columns.items()}
+        self.trials = min(os.path.getsize(self._column_path(column)) // size for column, size in row_sizes.items())
+
+    def _column_path(self, column):
+        return os.path.join(self.path, column + ".bin")
+
+    def __getattr__(self, column):
+        if column not in self.__dict__.get('columns', {}):
+            raise AttributeError(column)
+        if self.trials == 0:
+            return np.zeros((0, len(self.team_names)), dtype=self.columns[column])
+        array = np.memmap(self._column_path(column), dtype=self.columns[column], mode='r', shape=(self.trials, len(self.team_names)))
+        setattr(self, column, array)
+        return array
+
+def open_trial_store(path):
+    """
+    Open a columnar store for reading.
+
+    Args:
+        path (str): Directory of the store
+
+    Returns:
+        TrialStore: Memory mapped store
+    """
+    return TrialStore(path)
+
+def resume_trial_store(path, team_names, seed=None, input_files=(), first_trial=0, run_key=None):
+    """
+    Open a store for a run starting at a trial, a new store if the run starts at 0 and the existing store
+    otherwise, if it is a store of the same run holding the trials before first_trial, the trials after them
+    are dropped.
+
+    Args:
+        path (str): Directory of the store
+        team_names (list): Team names, in the order of the columns of the batches
+        seed (int, optional): Seed of the run
+        input_files (list, optional): Input files whose sha256 hashes are recorded in the header
+        first_trial (int): Number of trials the run starts from
+        run_key (str, optional): Key of the run, result_cache.result_key, the existing store is only continued
+            if it was written with the same key
+
+    Returns:
+        TrialStoreWriter: Writer of the store, None if the existing store cannot be continued
+    """
+    if first_trial == 0:
+        return TrialStoreWriter(path, team_names, seed, input_files, run_key=run_key)
+    try:
+        if open_trial_store(path).trials >= first_trial:
+            return TrialStoreWriter(path, team_names, seed, input_files, append=True, trials=first_trial, run_key=run_key)
+    except (OSError, ValueError):
+        pass
+    return None
+
+def csv_columns(team_names):
+    """
+    Get the names of the columns of the csv export, with the same keys as the csv of the original script.
+
+    Args:
+        team_names (list): Team names
+
+    Returns:
+        list: Column names
+    """
+    keys = []
+    for name in team_names:
+        keys += [name + "_points", name + "_goaldifference", name + "_position"]
+    for i in range(1, len(team_names)+1):
+        keys += [str(i) + "_position_points", str(i) + "_position_goaldifference"]
+    return keys + ["trial_number"]
+
+def csv_rows(batch, first_trial_number):
+    """
+    Convert a batch of trials into rows of the csv export.
+
+    Args:
+        batch (dict): Arrays of shape (trials, teams) with keys 'position', 'points' and 'goals_difference'
+        first_trial_number (int): Number of the first trial of the batch
+
+    Returns:
+        numpy.ndarray: One row per trial, in the order of csv_columns
+    """
+    position = np.asarray(batch['position'], dtype=np.int64)
+    points = np.asarray(batch['points'], dtype=np.int64)
+    goals_difference = np.asarray(batch['goals_difference'], dtype=np.int64)
+    order = position.argsort(axis=1)
+    position_points = np.take_along_axis(points, order, axis=1)
+    position_goaldifference = np.take_along_axis(goals_difference, order, axis=1)
+    team_values = np.stack([points, goals_difference, position], axis=2).reshape(len(order), -1)
+    position_values = np.stack([position_points, position_goaldifference], axis=2).reshape(len(order), -1)
+    trial_numbers = np.arange(first_trial_number, first_trial_number + len(order)).reshape(-1, 1)
+    return np.concatenate([team_values, position_values, trial_numbers], axis=1)
+
+def export_csv(store, csv_path, chunk_size=10000):
+    """
+    Export a store to a semicolon separated csv file, with the columns of the former statistics.csv.
+
+    Args:
+        store (TrialStore): Store to export
+        csv_path (str): Path of the csv file
+        chunk_size (int): Number of trials converted at once
+    """
+    with open(csv_path, "w", encoding='utf-8', newline='') as file:
+        writer = csv.writer(file, delimiter=';')
+        writer.writerow(csv_columns(store.team_names))
+        for start in range(0, store.trials, chunk_size):
+            chunk = {column: getattr(store, column)[start:start + chunk_size] for column in store.columns}
+            writer.writerows(csv_rows(chunk, start + 1).tolist())
+
+if __name__ == "__main__":
+    #Convert a store to csv: python3 trial_store.py statistics statistics.csv
+    export_csv(open_trial_store(sys.argv[1]), sys.argv[2])
@@ -1,58 +1,85 @@
+import os
+
 import requests
-from bs4 import BeautifulSoup
+from bs4 import SoupStrainer
+
+from competitions import wiki_url, CURRENT_SEASON
+from http_cache import fetch, DEFAULT_TTL
+from scraping import parse_html, write_csv_atomic
 
 #This script fetches the matches of the champions league from wikipedia
 #And writes them on a csv file called "wiki_matches.csv"
 
-def fetch_champions_league_matches():
+WIKI_MATCHES_HEADER = ["Sep=;", "score;home team;away team"]
+
+def fetch_champions_league_matches(ttl=DEFAULT_TTL, refresh=False, season=CURRENT_SEASON, competition='champions_league',
+                                   path="wiki_matches.csv", retries=0):
     """
     Fetch Champions League matches from Wikipedia and save them to a CSV file.
 
-    Scrapes match data from the Wikipedia page for the current Champions League season
-    and writes it to 'wiki_matches.csv' in the format:
+    Scrapes match data from the Wikipedia page of a season of the competition, the current Champions League
+    season by default, and writes it to path in the format:
     Sep=;
     score;home team;away team
 
+    The page goes through the http cache, the CSV file is only rewritten if the page changed.
+
+    Args:
+        ttl (float): Age in seconds under which the cached page is used without any request
+        refresh (bool): Revalidate the cached page even if it is younger than ttl
+        season (str): Season, such as "2024-25"
+        competition (str): Key of competitions.COMPETITIONS
+        path (str): Path of the csv file
+        retries (int): Number of retries of failed requests, see http_cache.fetch
+
+    Returns:
+        bool: True if the csv file is up to date, False if the page could not be fetched
+
     Raises:
         requests.RequestException: If there is an error fetching data from Wikipedia
     """
-    url = "https://en.wikipedia.org/wiki/2024%E2%80%9325_UEFA_Champions_League_league_phase"
+    url = wiki_url(competition, season)
     
     try:
         # Send GET request to the website and raise exception if request fails
-        response = requests.get(url)
-        response.raise_for_status()
-        
-        # Open file for writing matches
-        with open("wiki_matches.csv", "w", encoding='utf-8') as matches_file:
-            matches_file.write("Sep=;\n")
-            matches_file.write("score;home team;away team\n")
-            matches_file.close()
-        
-        # Parse the HTML content
-        soup = BeautifulSoup(response.text, 'html.parser')
+        text, modified = fetch(url, ttl, refresh, retries=retries)
+        if not modified and os.path.isfile(path):
+            return True
         
-        # Find all table elements with class="fevent"
-        match_tables = soup.find_all('table', class_='fevent')
-        for table in match_tables:
-
-            #Get th class="fscore" element containing the score, if it exists
-            score_element = table.find('th', class_='fscore')
-            if score_element:
-                score = score_element.contents[0]
-            else:
-                score = "N/A"
-                
-            # Find the team name spans
-            team_names = table.find_all('span', attrs={'itemprop': 'name'})
-            if len(team_names) >= 2:
-                home_team = team_names[0].get_text(strip=True)
-                away_team = team_names[1].get_text(strip=True)
-                with open("wiki_matches.csv", "a", encoding='utf-8') as matches_file:
-                    matches_file.write(f"{score};{home_team};{away_team}\n")
-                    matches_file.close()
+        write_csv_atomic(path, WIKI_MATCHES_HEADER, parse_champions_league_matches(text))
+        return True
     except requests.RequestException as e:
         print(f"Error fetching data: {e}")
+        return False
+
+def parse_champions_league_matches(text, parser=None):
+    """
+    Parse the matches of the Wikipedia page, only the tables with class="fevent" are built.
+
+    Args:
+        text (str): Html of the page
+        parser (str, optional): BeautifulSoup parser backend, see scraping.parse_html
+
+    Returns:
+        list: Rows [score, home team, away team], the score is "N/A" if the match was not played
+    """
+    rows = []
+    # Find all table elements with class="fevent"
+    match_tables = parse_html(text, SoupStrainer('table', class_='fevent'), parser).find_all('table', class_='fevent')
+    for table in match_tables:
+
+        #Get th class="fscore" element containing the score, if it exists
+        score_element = table.find('th', class_='fscore')
+        if score_element:
+            score = score_element.contents[0]
+        else:
+            score = "N/A"
+
+        # Find the team name spans
+        team_names = table.find_all('span', attrs={'itemprop': 'name'})
+        if len(team_names) >= 2:
+            rows.append([score, team_names[0].get_text(strip=True), team_names[1].get_text(strip=True)])
+    return rows
 
 if __name__ == "__main__":
     fetch_champions_league_matches()